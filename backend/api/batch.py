@@ -0,0 +1,201 @@
+"""
+Several API calls in one round-trip: ``POST /api/v1/batch/``.
+
+Each sub-request is resolved against the URLconf and its view called
+in-process. The middleware stack and the JWT decoding run once, for the
+batch: sub-requests are authenticated as the batch's user, without their own
+``Authorization`` header. Each sub-request is still throttled by its view, so
+a batch counts against the same rate limits as the separate calls would, and
+the batch itself has its own ``batch`` rate. Sub-requests inherit the batch's
+client address and may only set the ``ALLOWED_HEADERS``, so they cannot pose
+as another client (e.g. with ``X-Forwarded-For``) to the throttles.
+
+Sub-requests run in order, except that consecutive reads (GET/HEAD/OPTIONS)
+run at the same time on a small thread pool, each thread with its own
+database connection. A write waits for the reads before it and the reads
+after it wait for the write, so a batch can create something and read it
+back. When the batch runs inside a transaction (e.g. ``ATOMIC_REQUESTS``),
+other connections could not see its writes, so everything runs in order on
+the request thread. The batch as a whole is not atomic: a failed sub-request
+does not undo the ones before it.
+
+The combined response is assembled from the sub-responses' bytes, so JSON
+bodies are embedded without being parsed and encoded again.
+"""
+
+import contextvars
+import json
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import urlsplit
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import close_old_connections, connection
+from django.urls import Resolver404, resolve
+from rest_framework.permissions import SAFE_METHODS
+
+METHODS = ("GET", "HEAD", "OPTIONS", "POST", "PUT", "PATCH", "DELETE")
+
+# Request headers a sub-request does not inherit from the batch request
+DROPPED_HEADERS = (
+    "HTTP_AUTHORIZATION",
+    "HTTP_COOKIE",
+    "HTTP_ACCEPT_ENCODING",
+    "HTTP_IF_NONE_MATCH",
+    "HTTP_IF_MODIFIED_SINCE",
+    "CONTENT_TYPE",
+    "CONTENT_LENGTH",
+)
+
+# Request headers a sub-request may set itself
+ALLOWED_HEADERS = ("Accept", "Accept-Language", "If-None-Match", "If-Modified-Since")
+
+# Response headers left out of the sub-responses
+HIDDEN_HEADERS = {"content-length", "vary", "allow"}
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, "BATCH_CONCURRENCY", 4),
+            thread_name_prefix="buskalo-batch",
+        )
+    return _executor
+
+
+class SubRequestError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def resolve_view(path):
+    """``(view, args, kwargs)`` for an API path; raises SubRequestError."""
+    if not path.startswith("/api/"):
+        raise SubRequestError(400, "Only /api/ paths can be batched.")
+    try:
+        match = resolve(path)
+    except Resolver404:
+        raise SubRequestError(404, "Not found.")
+    if match.url_name == "batch":
+        raise SubRequestError(400, "Batches cannot be nested.")
+    return match.func, match.args, match.kwargs
+
+
+def build_request(parent, item):
+    """A ``WSGIRequest`` for one sub-request, authenticated as ``parent``'s user."""
+    url = urlsplit(item["path"])
+    body = b"" if item.get("body") is None else json.dumps(item["body"]).encode()
+    environ = {
+        key: value for key, value in parent.META.items() if key not in DROPPED_HEADERS
+    }
+    environ.update(
+        {
+            "REQUEST_METHOD": item["method"],
+            "SCRIPT_NAME": "",
+            "PATH_INFO": url.path,
+            "QUERY_STRING": url.query,
+            "wsgi.url_scheme": parent.scheme,
+            "wsgi.input": BytesIO(body),
+        }
+    )
+    if body:
+        environ["CONTENT_TYPE"] = "application/json"
+        environ["CONTENT_LENGTH"] = str(len(body))
+    allowed = {header.lower() for header in ALLOWED_HEADERS}
+    for header, value in (item.get("headers") or {}).items():
+        if header.lower() in allowed:
+            environ["HTTP_" + header.upper().replace("-", "_")] = str(value)
+    request = WSGIRequest(environ)
+    user = getattr(parent, "user", None)
+    if user is not None and user.is_authenticated:
+        # Picked up by rest_framework.request.Request in place of the authenticators.
+        request._force_auth_user = user
+        request._force_auth_token = parent.auth
+    return request
+
+
+def splice(status, headers, body):
+    """One entry of the ``responses`` list, with the ``body`` bytes spliced in as they are."""
+    head = json.dumps({"status": status, "headers": headers}).encode()
+    return head[:-1] + b', "body": ' + body + b"}"
+
+
+def error(status, message):
+    return splice(status, {}, json.dumps({"error": message}).encode())
+
+
+def encode(response):
+    headers = {
+        name: value for name, value in response.items() if name.lower() not in HIDDEN_HEADERS
+    }
+    if not response.content:
+        body = b"null"
+    elif response.get("Content-Type", "").startswith("application/json"):
+        body = response.content
+    else:
+        body = json.dumps(response.content.decode(response.charset, "replace")).encode()
+    return splice(response.status_code, headers, body)
+
+
+def call(parent, item):
+    try:
+        view, args, kwargs = resolve_view(urlsplit(item["path"]).path)
+    except SubRequestError as exc:
+        return error(exc.status, str(exc))
+    request = build_request(parent, item)
+    if iscoroutinefunction(view):
+        response = async_to_sync(view)(request, *args, **kwargs)
+    else:
+        response = view(request, *args, **kwargs)
+    if response.streaming:
+        response.close()
+        return error(400, "Streaming responses cannot be batched.")
+    if hasattr(response, "render"):
+        response.render()
+    return encode(response)
+
+
+def call_in_thread(parent, item):
+    close_old_connections()
+    try:
+        return call(parent, item)
+    finally:
+        close_old_connections()
+
+
+def run(parent, items):
+    """The sub-responses for ``items``, in the same order, as JSON bytes."""
+    results = [None] * len(items)
+    concurrent = not connection.in_atomic_block
+    reads = []
+
+    def flush():
+        if len(reads) == 1:
+            results[reads[0]] = call(parent, items[reads[0]])
+        elif reads:
+            executor = get_executor()
+            # Each in a copy of the context, e.g. for api.replicas to see the writes.
+            futures = {
+                i: executor.submit(
+                    contextvars.copy_context().run, call_in_thread, parent, items[i]
+                )
+                for i in reads
+            }
+            for i, future in futures.items():
+                results[i] = future.result()
+        reads.clear()
+
+    for i, item in enumerate(items):
+        if concurrent and item["method"] in SAFE_METHODS:
+            reads.append(i)
+            continue
+        flush()
+        results[i] = call(parent, item)
+    flush()
+    return results
@@ -0,0 +1,122 @@
+"""
+Helpers for the endpoint benchmarks (``manage.py benchmark_api``).
+
+Requests go through the Django test client, so the numbers cover the whole
+middleware/view/serializer/renderer stack but no network or WSGI server.
+"""
+
+import statistics
+import time
+from contextlib import contextmanager
+from unittest import mock
+
+from django.db import connections
+from django.test import Client
+from rest_framework.views import APIView
+
+
+class QueryCounter:
+    """``connection.execute_wrapper`` that counts queries; works with DEBUG off."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+@contextmanager
+def count_queries(using="default"):
+    counter = QueryCounter()
+    with connections[using].execute_wrapper(counter):
+        yield counter
+
+
+def percentile(values, pct):
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[pct - 1]
+
+
+def summarize(latencies, queries, sizes):
+    latencies_ms = [value * 1000 for value in latencies]
+    return {
+        "requests": len(latencies),
+        "p50_ms": round(percentile(latencies_ms, 50), 3),
+        "p95_ms": round(percentile(latencies_ms, 95), 3),
+        "p99_ms": round(percentile(latencies_ms, 99), 3),
+        "mean_ms": round(statistics.fmean(latencies_ms), 3),
+        "queries_per_request": round(statistics.fmean(queries), 2),
+        "bytes_per_response": round(statistics.fmean(sizes)),
+    }
+
+
+@contextmanager
+def throttling_disabled():
+    """Benchmarks would trip the anon/user rate limits within seconds."""
+    with mock.patch.object(APIView, "throttle_classes", []):
+        yield
+
+
+class Scenario:
+    def __init__(self, name, path, method="get", data=None, auth=False, iterations=None):
+        self.name = name
+        self.path = path
+        self.method = method
+        self.data = data
+        self.auth = auth
+        self.iterations = iterations
+
+
+def run_scenario(scenario, iterations, warmup=3, headers=None):
+    """Time ``scenario``; returns its summary plus the last status code."""
+    client = Client(HTTP_HOST="localhost", **(headers or {}))
+    request = getattr(client, scenario.method)
+    kwargs = {"secure": True}
+    if scenario.data is not None:
+        kwargs.update(data=scenario.data, content_type="application/json")
+
+    for _ in range(warmup):
+        request(scenario.path, **kwargs)
+
+    latencies, queries, sizes = [], [], []
+    status = None
+    for _ in range(scenario.iterations or iterations):
+        with count_queries() as counter:
+            start = time.perf_counter()
+            response = request(scenario.path, **kwargs)
+            content = (
+                b"".join(response.streaming_content)
+                if response.streaming
+                else response.content
+            )
+            latencies.append(time.perf_counter() - start)
+        queries.append(counter.count)
+        sizes.append(len(content))
+        status = response.status_code
+    return {"status": status, **summarize(latencies, queries, sizes)}
+
+
+def compare(previous, current):
+    """Per-scenario relative change of p50/p95 and absolute change of queries."""
+    rows = []
+    for name, result in current.items():
+        before = previous.get(name)
+        if not before:
+            continue
+        rows.append(
+            {
+                "scenario": name,
+                "p50_change": _ratio(before["p50_ms"], result["p50_ms"]),
+                "p95_change": _ratio(before["p95_ms"], result["p95_ms"]),
+                "queries_change": round(
+                    result["queries_per_request"] - before["queries_per_request"], 2
+                ),
+            }
+        )
+    return rows
+
+
+def _ratio(before, after):
+    return f"{(after - before) / before * 100:+.1f}%" if before else "n/a"
@@ -0,0 +1,284 @@
+"""
+Compiled serialization for read-only list endpoints.
+
+A ``ModelSerializer`` renders each row by building a model instance (and one
+per joined relation), then resolving every field through ``get_attribute()``
+and ``to_representation()``. For a list page that is the bulk of the CPU
+time. ``compile_plan()`` walks the serializer's fields once and turns them
+into a *row plan*: the ``.values()`` columns to select and, per field, how to
+turn a column into its JSON value. Plans are cached per serializer class and
+field set, so a request only binds the plan to its serializer (for the
+request-dependent URL fields) and runs one small function per field and row.
+
+The output is exactly the serializer's: field order, ``None`` handling,
+fields skipped when a nullable relation on their ``source`` is empty,
+decimals and datetimes (through the fields' own ``to_representation()``)
+and absolute file URLs. Serializers the plan cannot reproduce, e.g. with
+nested lists (``?expand=products``), related fields other than primary keys
+or method fields not listed in ``Meta.row_method_fields``, get no plan and
+keep the regular path.
+"""
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import fields as drf_fields
+from rest_framework import relations, serializers
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+_plans = {}
+_SKIP = object()
+
+# Fields whose to_representation() returns a value read by .values() as is.
+IDENTITY = {
+    drf_fields.ReadOnlyField.to_representation,
+    drf_fields.CharField.to_representation,
+    drf_fields.IntegerField.to_representation,
+    drf_fields.BooleanField.to_representation,
+}
+
+
+class Row(dict):
+    """A ``.values()`` row readable as attributes, for ``Meta.row_method_fields``."""
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+class Unsupported(Exception):
+    pass
+
+
+def _signature(serializer):
+    """Cache key: the serializer class and its (possibly trimmed/expanded) fields."""
+    parts = [type(serializer)]
+    for name, field in serializer.fields.items():
+        if isinstance(field, serializers.BaseSerializer) and hasattr(field, "fields"):
+            parts.append((name, _signature(field)))
+        else:
+            parts.append((name, type(field), field.source))
+    return tuple(parts)
+
+
+def _missing(field):
+    """What the serializer renders when a relation on ``field.source`` is empty."""
+    if field.default is not drf_fields.empty:
+        return ("default", None)
+    if field.allow_null:
+        return ("value", None)
+    if not field.required:
+        return ("skip", None)
+    raise Unsupported(field.field_name)
+
+
+def _compile(serializer, model, prefix, columns):
+    """One step per readable field: ``(name, kind, column, guards, extra)``."""
+    if type(serializer).to_representation is not serializers.Serializer.to_representation:
+        raise Unsupported(type(serializer).__name__)
+    method_fields = getattr(getattr(serializer, "Meta", None), "row_method_fields", ())
+    steps = []
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if isinstance(field, drf_fields.SerializerMethodField):
+            if name not in method_fields or prefix:
+                raise Unsupported(name)
+            steps.append((name, "method", None, (), field.method_name))
+            continue
+        if field.source == "*" or isinstance(
+            field, (serializers.ListSerializer, relations.ManyRelatedField)
+        ):
+            raise Unsupported(name)
+
+        current, path, guards = model, prefix, []
+        for position, attr in enumerate(field.source_attrs):
+            try:
+                model_field = current._meta.get_field(attr)
+            except FieldDoesNotExist:
+                raise Unsupported(name)
+            if not model_field.concrete:
+                raise Unsupported(name)  # reverse relations, generic relations
+            column = f"{path}{attr}"
+            if position == len(field.source_attrs) - 1:
+                break
+            if not model_field.is_relation:
+                raise Unsupported(name)
+            if model_field.null:
+                guards.append(column)
+            current, path = model_field.related_model, f"{column}__"
+
+        guards = tuple(guards)
+        missing = _missing(field) if guards else None
+        columns.add(column)
+        columns.update(guards)
+        if isinstance(field, serializers.BaseSerializer):
+            if not model_field.is_relation:
+                raise Unsupported(name)
+            nested = _compile(field, model_field.related_model, f"{column}__", columns)
+            steps.append((name, "nested", column, guards, (missing, nested)))
+        elif model_field.is_relation:
+            if not isinstance(field, relations.PrimaryKeyRelatedField) or field.pk_field:
+                raise Unsupported(name)
+            steps.append((name, "value", column, guards, missing))
+        elif isinstance(field, drf_fields.FileField):
+            use_url = getattr(field, "use_url", api_settings.UPLOADED_FILES_USE_URL)
+            steps.append((name, "file", column, guards, (missing, model_field.storage, use_url)))
+        elif type(field).to_representation in IDENTITY:
+            steps.append((name, "value", column, guards, missing))
+        else:
+            steps.append((name, "convert", column, guards, missing))
+    return steps
+
+
+class RowPlan:
+    def __init__(self, model, steps, columns):
+        self.model = model
+        self.steps = steps
+        self.columns = tuple(sorted(columns))
+
+    def project(self, queryset):
+        """``queryset`` as ``.values()`` rows with every column the plan reads."""
+        query = queryset.query
+        names = ["pk", *self.columns]
+        # Annotations and extra selects (search_rank, distance_km) stay
+        # selectable for ordering, cursors and method fields.
+        names.extend(name for name in query.annotations if name not in names)
+        names.extend(name for name in query.extra if name not in names)
+        for term in query.order_by:
+            field = str(term).lstrip("-")
+            if field not in names and "__" not in field:
+                try:
+                    self.model._meta.get_field(field)
+                    names.append(field)
+                except FieldDoesNotExist:
+                    pass
+        return queryset.prefetch_related(None).values(*names)
+
+    def bind(self, serializer):
+        """Per-request encoder: one ``(name, getter)`` pair per field."""
+        return [self._getter(step, serializer) for step in self.steps]
+
+    def _getter(self, step, serializer):
+        name, kind, column, guards, extra = step
+        field = serializer.fields[name]
+        if kind == "method":
+            method = getattr(serializer, extra)
+            return name, lambda row: method(Row(row))
+        if kind == "nested":
+            missing, nested = extra
+            getters = [self._getter(child, field) for child in nested]
+
+            def read(row):
+                if row[column] is None:  # the foreign key
+                    return None
+                return _encode_row(row, getters)
+
+        elif kind == "file":
+            missing, storage, use_url = extra
+            request = field.context.get("request")
+
+            def read(row):
+                value = row[column]
+                if not value:
+                    return None
+                if not use_url:
+                    return value
+                url = storage.url(value)
+                return request.build_absolute_uri(url) if request is not None else url
+
+        elif kind == "convert":
+            missing = extra
+            convert = field.to_representation
+
+            def read(row):
+                value = row[column]
+                return None if value is None else convert(value)
+
+        else:
+            missing = extra
+
+            def read(row):
+                return row[column]
+
+        if not guards:
+            return name, read
+        if missing[0] == "default":
+            default = field.get_default()
+            fallback = None if default is None else field.to_representation(default)
+        else:
+            fallback = _SKIP if missing[0] == "skip" else None
+
+        def guarded(row):
+            for guard in guards:
+                if row[guard] is None:
+                    return fallback
+            return read(row)
+
+        return name, guarded
+
+    def encode(self, rows, serializer):
+        getters = self.bind(serializer)
+        return [_encode_row(row, getters) for row in rows]
+
+
+def _encode_row(row, getters):
+    data = {}
+    for name, getter in getters:
+        value = getter(row)
+        if value is not _SKIP:
+            data[name] = value
+    return data
+
+
+def compile_plan(serializer):
+    """The cached ``RowPlan`` for ``serializer``, or None if it needs the regular path."""
+    key = _signature(serializer)
+    try:
+        return _plans[key]
+    except KeyError:
+        pass
+    model = serializer.Meta.model
+    columns = set()
+    try:
+        plan = RowPlan(model, _compile(serializer, model, "", columns), columns)
+    except Unsupported:
+        plan = None
+    _plans[key] = plan
+    return plan
+
+
+class FastListMixin:
+    """
+    Serves ``list`` (and ``alist`` on the async read path) from a row plan
+    of the list serializer when there is one. Must come before
+    ``AsyncReadMixin`` in the bases so ``alist`` is reached first.
+    """
+
+    def get_row_plan(self):
+        if not getattr(settings, "FAST_LIST_SERIALIZATION", True):
+            return None, None
+        serializer = self.get_serializer()
+        return compile_plan(serializer), serializer
+
+    def list(self, request, *args, **kwargs):
+        plan, serializer = self.get_row_plan()
+        if plan is None:
+            return super().list(request, *args, **kwargs)
+        queryset = plan.project(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(plan.encode(page, serializer))
+        return Response(plan.encode(queryset, serializer))
+
+    async def alist(self, request, *args, **kwargs):
+        plan, serializer = self.get_row_plan()
+        if plan is None:
+            return await super().alist(request, *args, **kwargs)
+        queryset = plan.project(self.read_queryset)
+        page = await self.apaginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(plan.encode(page, serializer))
+        return Response(plan.encode([row async for row in queryset], serializer))
@@ -0,0 +1,19 @@
+from django.core.files.storage import default_storage
+from rest_framework import serializers
+
+
+class ImageVariantsField(serializers.ReadOnlyField):
+    """
+    Renders an ``api.images`` variants map as absolute URLs, ready for a
+    ``srcset``: ``{"thumb": {"width": 200, "height": 150, "webp": url, "jpg": url}}``.
+    """
+
+    def to_representation(self, value):
+        request = self.context.get("request")
+        sizes = {}
+        for label, entry in (value or {}).get("sizes", {}).items():
+            sizes[label] = dict(entry)
+            for fmt in ("webp", "jpg"):
+                url = default_storage.url(entry[fmt])
+                sizes[label][fmt] = request.build_absolute_uri(url) if request else url
+        return sizes
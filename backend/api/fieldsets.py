@@ -0,0 +1,132 @@
+"""
+Sparse fieldsets (``?fields=id,name,price``) and opt-in expansion
+(``?expand=products``) for read requests.
+
+``SparseFieldsetMixin`` trims a serializer to the requested fields and adds
+the requested ``Meta.expandable_fields``. ``select_fields()`` then builds the
+queryset for exactly those fields: a join (``select_related``) only for the
+relations they traverse, a prefetch only for expanded nested lists, and,
+when ``?fields=`` is sent, ``.only()`` with the columns they read. Writes
+always get the full representation.
+"""
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.serializers import BaseSerializer, ListSerializer
+
+
+def parse_names(value):
+    return [name.strip() for name in (value or "").split(",") if name.strip()]
+
+
+def _check(param, names, allowed):
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise ValidationError(
+            {param: f"Unknown field '{unknown[0]}'. Use: {', '.join(allowed)}."}
+        )
+
+
+class SparseFieldsetMixin:
+    """
+    ``Meta.expandable_fields`` maps a field name to ``(serializer class,
+    kwargs)``; an expansion may replace a plain field (e.g. a primary key).
+    Only the top-level serializer of a read request is trimmed.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sparse = False
+        request = self.context.get("request")
+        if request is None or request.method not in SAFE_METHODS:
+            return
+        params = getattr(request, "query_params", request.GET)
+
+        expandable = getattr(self.Meta, "expandable_fields", {})
+        expand = parse_names(params.get("expand"))
+        _check("expand", expand, list(expandable))
+        for name in expand:
+            serializer_class, options = expandable[name]
+            self.fields[name] = serializer_class(read_only=True, **options)
+
+        names = parse_names(params.get("fields"))
+        if names:
+            _check("fields", names, list(self.fields))
+            for name in list(self.fields):
+                if name not in names:
+                    self.fields.pop(name)
+            self.sparse = True
+
+
+def _collect(model, serializer, prefix, known, plan):
+    """
+    Add the joins, columns and prefetches ``serializer`` needs to ``plan``;
+    returns False when a field reads something that is not a model field.
+    """
+    restrictable = True
+    for field in serializer.fields.values():
+        if field.write_only or field.source == "*":
+            continue  # "*": method fields, which read annotations or the object
+        if field.source_attrs[0] in known:
+            continue
+        current, path = model, prefix
+        for position, attr in enumerate(field.source_attrs):
+            last = position == len(field.source_attrs) - 1
+            try:
+                model_field = current._meta.get_field(attr)
+            except FieldDoesNotExist:
+                restrictable = False
+                break
+            name = f"{path}{attr}"
+            if model_field.one_to_many or model_field.many_to_many:
+                if last and isinstance(field, ListSerializer):
+                    plan["prefetch"].append((name, model_field, field.child))
+                    # The prefetch points each child back at this object, so
+                    # the child's reads through it need columns here.
+                    back_reference = model_field.remote_field.name
+                    for child_field in field.child.fields.values():
+                        attrs = child_field.source_attrs
+                        if attrs[:1] == [back_reference] and len(attrs) > 1:
+                            if len(attrs) > 2:
+                                restrictable = False
+                            plan["only"].add(f"{path}{attrs[1]}")
+                else:
+                    restrictable = False
+                break
+            plan["only"].add(name)
+            if model_field.is_relation and (not last or isinstance(field, BaseSerializer)):
+                plan["select"].add(name)
+                current, path = model_field.related_model, f"{name}__"
+                if last:
+                    restrictable &= _collect(current, field, path, (), plan)
+    return restrictable
+
+
+def select_fields(queryset, serializer, known=()):
+    """
+    Restrict ``queryset`` to what ``serializer`` renders. ``known`` names
+    source attributes filled in by other means (e.g. a prefetch's back
+    reference), which need neither a join nor a column.
+    """
+    model = queryset.model
+    plan = {"select": set(), "only": {"pk"}, "prefetch": []}
+    restrictable = _collect(model, serializer, "", known, plan)
+    if plan["select"]:
+        queryset = queryset.select_related(*sorted(plan["select"]))
+    for name, model_field, child in plan["prefetch"]:
+        back_reference = model_field.remote_field.name
+        nested = select_fields(model_field.related_model.objects.all(), child, {back_reference})
+        queryset = queryset.prefetch_related(models.Prefetch(name, queryset=nested))
+    if restrictable and getattr(serializer, "sparse", False):
+        # Sort keys are read back by keyset pagination cursors.
+        for term in queryset.query.order_by:
+            name = str(term).lstrip("-")
+            try:
+                model._meta.get_field(name)
+                plan["only"].add(name)
+            except FieldDoesNotExist:
+                pass  # annotations such as search_rank or distance_km
+        queryset = queryset.only(*sorted(plan["only"]))
+    return queryset
@@ -0,0 +1,100 @@
+"""
+Resized, re-encoded derivatives of uploaded images.
+
+Every upload gets a fixed set of sizes, each encoded as WebP plus a JPEG
+fallback. Derivatives are stored next to the original and recorded on the
+model in a JSON field::
+
+    {"source": "products/shop/name_ab12cd34.png",
+     "sizes": {"thumb": {"width": 200, "webp": "...", "jpg": "..."}, ...}}
+
+``source`` is the original the derivatives were made from, which is how a
+post_save hook notices that the image changed and the set must be rebuilt.
+"""
+
+import io
+import os
+
+from django.apps import apps
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+from .tasks import enqueue
+
+# Bounding box (px) of each derivative; originals are never upscaled.
+VARIANT_SIZES = {
+    "thumb": 200,
+    "medium": 600,
+    "large": 1200,
+}
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+
+
+def encode(image, fmt):
+    buffer = io.BytesIO()
+    if fmt == "webp":
+        image.save(buffer, "WEBP", quality=WEBP_QUALITY, method=4)
+    else:
+        if image.mode != "RGB":
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel("A") if "A" in image.mode else None)
+            image = background
+        image.save(buffer, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def render_variants(file):
+    """Create and store every derivative of ``file``; returns the ``sizes`` map."""
+    root = os.path.splitext(file.name)[0]
+    with file.open("rb") as handle:
+        original = ImageOps.exif_transpose(Image.open(handle))
+        original = original.convert("RGBA" if "A" in original.getbands() else "RGB")
+
+    sizes = {}
+    for label, box in VARIANT_SIZES.items():
+        image = original.copy()
+        image.thumbnail((box, box), Image.LANCZOS)
+        entry = {"width": image.width, "height": image.height}
+        for fmt in ("webp", "jpg"):
+            entry[fmt] = file.storage.save(
+                f"{root}_{label}.{fmt}", ContentFile(encode(image, fmt))
+            )
+        sizes[label] = entry
+    return sizes
+
+
+def delete_variants(storage, variants):
+    for entry in (variants or {}).get("sizes", {}).values():
+        for fmt in ("webp", "jpg"):
+            if entry.get(fmt):
+                storage.delete(entry[fmt])
+
+
+def generate_variants(label, pk, field, target, source):
+    """
+    Background job: build derivatives of ``<label pk>.<field>`` into
+    ``<target>``, unless the image changed again since it was scheduled.
+    """
+    model = apps.get_model(label)
+    instance = model._default_manager.filter(pk=pk).first()
+    if instance is None or (getattr(instance, field).name or "") != source:
+        return
+    file = getattr(instance, field)
+    previous = getattr(instance, target)
+    variants = {"source": source, "sizes": render_variants(file)} if source else {}
+
+    setattr(instance, target, variants)
+    update_fields = [target]
+    if any(f.name == "updated_at" for f in model._meta.concrete_fields):
+        update_fields.append("updated_at")
+    instance.save(update_fields=update_fields)
+    delete_variants(file.storage, previous)
+
+
+def sync_variants(instance, field="image", target="image_variants"):
+    """post_save hook: schedule derivatives when the stored image changed."""
+    source = getattr(instance, field).name or ""
+    if source == (getattr(instance, target) or {}).get("source", ""):
+        return
+    enqueue(generate_variants, instance._meta.label, instance.pk, field, target, source)
@@ -0,0 +1,187 @@
+"""
+HTTP load generator for ``manage.py benchmark_servers``.
+
+Starts the app under a real server (gunicorn/WSGI or uvicorn/ASGI) in a
+subprocess and drives it with N concurrent keep-alive clients written with
+plain asyncio streams, so the numbers include the server's own concurrency
+model. ``client_delay`` makes every client send its request headers in two
+parts with a pause in between, like a client on a slow network: a sync
+worker is tied up for the whole pause, an event loop is not.
+"""
+
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+from collections import Counter
+
+from django.conf import settings
+
+from .benchmark import percentile
+
+SERVERS = {
+    "wsgi": "gunicorn config.wsgi:application --bind 127.0.0.1:{port} --workers {workers}"
+    " --log-level warning",
+    "asgi": "uvicorn config.asgi:application --host 127.0.0.1 --port {port}"
+    " --workers {workers} --log-level warning --no-access-log",
+}
+# Local plain-HTTP runs: no HTTPS redirect, no rate limits, no profiling.
+SERVER_ENV = {
+    "SECURE_SSL_REDIRECT": "False",
+    "THROTTLING": "False",
+    "SERVER_TIMING_SAMPLE_RATE": "0",
+}
+REQUEST_TIMEOUT = 30
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class ServerProcess:
+    """Context manager running one of ``SERVERS`` until the block exits."""
+
+    def __init__(self, kind, workers, startup_timeout=30):
+        self.kind = kind
+        self.port = free_port()
+        args = SERVERS[kind].format(port=self.port, workers=workers).split()
+        self.command = [sys.executable, "-m", *args]
+        self.startup_timeout = startup_timeout
+
+    def __enter__(self):
+        self.process = subprocess.Popen(
+            self.command,
+            cwd=settings.BASE_DIR,
+            env={**os.environ, **SERVER_ENV},
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+        )
+        deadline = time.monotonic() + self.startup_timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                error = self.process.stderr.read().decode(errors="replace")
+                raise RuntimeError(f"{self.kind} server exited:\n{error}")
+            try:
+                socket.create_connection(("127.0.0.1", self.port), timeout=1).close()
+                return self
+            except OSError:
+                time.sleep(0.2)
+        self.__exit__()
+        raise RuntimeError(f"{self.kind} server did not start in {self.startup_timeout}s")
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+
+async def read_response(reader):
+    """Read one HTTP/1.1 response; returns ``(status, body size, keep_alive)``."""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("connection closed")
+    status = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    if "content-length" in headers:
+        size = len(await reader.readexactly(int(headers["content-length"])))
+    elif headers.get("transfer-encoding", "").lower() == "chunked":
+        size = 0
+        while True:
+            chunk_size = int((await reader.readline()).split(b";")[0], 16)
+            await reader.readexactly(chunk_size + 2)
+            size += chunk_size
+            if not chunk_size:
+                break
+    else:
+        size = len(await reader.read())
+        headers["connection"] = "close"
+    return status, size, headers.get("connection", "").lower() != "close"
+
+
+class LoadResult:
+    def __init__(self):
+        self.latencies = []
+        self.statuses = Counter()
+        self.errors = 0
+
+
+async def run_client(port, paths, offset, deadline, client_delay, result):
+    reader = writer = None
+    index = offset
+    while time.perf_counter() < deadline:
+        path = paths[index % len(paths)]
+        index += 1
+        start = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                sock = writer.get_extra_info("socket")
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            request = f"GET {path} HTTP/1.1\r\nHost: localhost\r\n"
+            if client_delay:
+                writer.write(request.encode())
+                await writer.drain()
+                await asyncio.sleep(client_delay)
+                request = ""
+            writer.write(f"{request}Accept: application/json\r\n\r\n".encode())
+            await writer.drain()
+            status, _, keep_alive = await asyncio.wait_for(
+                read_response(reader), REQUEST_TIMEOUT
+            )
+        except (OSError, ValueError, IndexError, asyncio.IncompleteReadError, TimeoutError):
+            result.errors += 1
+            keep_alive = False
+        else:
+            result.latencies.append(time.perf_counter() - start)
+            result.statuses[status] += 1
+        if not keep_alive and writer is not None:
+            writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def _run_load(port, paths, concurrency, duration, client_delay):
+    result = LoadResult()
+    deadline = time.perf_counter() + duration
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(
+            run_client(port, paths, offset, deadline, client_delay, result)
+            for offset in range(concurrency)
+        )
+    )
+    return result, time.perf_counter() - started
+
+
+def run_load(port, paths, concurrency, duration, client_delay=0):
+    """Drive ``paths`` round-robin with ``concurrency`` clients for ``duration`` seconds."""
+    result, elapsed = asyncio.run(
+        _run_load(port, paths, concurrency, duration, client_delay)
+    )
+    latencies_ms = [value * 1000 for value in result.latencies] or [0.0]
+    return {
+        "concurrency": concurrency,
+        "requests": len(result.latencies),
+        "errors": result.errors,
+        "requests_per_second": round(len(result.latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies_ms, 50), 3),
+        "p95_ms": round(percentile(latencies_ms, 95), 3),
+        "p99_ms": round(percentile(latencies_ms, 99), 3),
+        "max_ms": round(max(latencies_ms), 3),
+        "statuses": {str(code): count for code, count in sorted(result.statuses.items())},
+    }
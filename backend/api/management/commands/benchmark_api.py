@@ -0,0 +1,136 @@
+import json
+import platform
+import subprocess
+
+import django
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api.benchmark import Scenario, compare, run_scenario, throttling_disabled
+from shops.management.commands.generate_dataset import PASSWORD
+from shops.models import Category, Product, Shop
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks the /api/v1/market/* and /auth/* endpoints through the Django "
+        "test client: latency percentiles, queries and bytes per request"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=50)
+        parser.add_argument("--warmup", type=int, default=3)
+        parser.add_argument("--only", nargs="+", help="Run only these scenarios")
+        parser.add_argument("--output", help="Write the results as JSON to this file")
+        parser.add_argument("--compare", help="Previous JSON results to compare against")
+
+    def get_scenarios(self):
+        product = Product.objects.filter(shop__status="active").order_by("pk").first()
+        if product is None:
+            raise CommandError("No products to benchmark; run generate_dataset first")
+        # The biggest active shop is the worst case for the detail endpoints.
+        shop = Shop.objects.filter(status="active").order_by("-product_count", "pk").first()
+        term = product.name.split()[0]
+        market = "/api/v1/market"
+        return [
+            Scenario("products_list", f"{market}/products/"),
+            Scenario("products_list_cursor", f"{market}/products/?cursor="),
+            Scenario(
+                "products_list_sparse",
+                f"{market}/products/?fields=id,name,price,image_variants",
+            ),
+            Scenario("products_search", f"{market}/products/?search={term}"),
+            Scenario("products_by_shop", f"{market}/products/?shop_id={shop.pk}"),
+            Scenario("product_detail", f"{market}/products/{product.pk}/"),
+            Scenario("shops_list", f"{market}/shops/"),
+            Scenario("shop_detail", f"{market}/shops/{shop.pk}/"),
+            Scenario("shop_detail_expanded", f"{market}/shops/{shop.pk}/?expand=products"),
+            Scenario("shops_near", f"{market}/shops/?near=10.48,-66.90&radius_km=10"),
+            Scenario("categories", f"{market}/categories/"),
+            Scenario("profile", "/api/v1/auth/profile/", auth=True),
+            Scenario(
+                "login",
+                "/api/v1/auth/login/",
+                method="post",
+                # Password hashing dominates: a few iterations are enough.
+                iterations=5,
+            ),
+        ]
+
+    def get_user(self):
+        return (
+            User.objects.filter(username__startswith="demo_").order_by("pk").first()
+            or User.objects.order_by("pk").first()
+        )
+
+    def handle(self, *args, **options):
+        scenarios = self.get_scenarios()
+        if options["only"]:
+            scenarios = [s for s in scenarios if s.name in options["only"]]
+        user = self.get_user()
+
+        results = {}
+        with throttling_disabled():
+            for scenario in scenarios:
+                headers = {}
+                if (scenario.auth or scenario.method == "post") and user is None:
+                    self.stderr.write(f"Skipping {scenario.name}: no users")
+                    continue
+                if scenario.auth:
+                    headers["HTTP_AUTHORIZATION"] = f"Bearer {AccessToken.for_user(user)}"
+                if scenario.name == "login":
+                    scenario.data = {"username": user.username, "password": PASSWORD}
+                results[scenario.name] = run_scenario(
+                    scenario, options["iterations"], options["warmup"], headers
+                )
+                self.write_row(scenario.name, results[scenario.name])
+
+        report = {"meta": self.get_metadata(), "results": results}
+        if options["output"]:
+            with open(options["output"], "w") as fileobj:
+                json.dump(report, fileobj, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+        if options["compare"]:
+            with open(options["compare"]) as fileobj:
+                previous = json.load(fileobj)["results"]
+            for row in compare(previous, results):
+                self.stdout.write(
+                    f"{row['scenario']:<22} p50 {row['p50_change']:>8}  "
+                    f"p95 {row['p95_change']:>8}  queries {row['queries_change']:+}"
+                )
+
+    def write_row(self, name, result):
+        self.stdout.write(
+            f"{name:<22} {result['status']}  p50 {result['p50_ms']:>8.2f}ms  "
+            f"p95 {result['p95_ms']:>8.2f}ms  p99 {result['p99_ms']:>8.2f}ms  "
+            f"{result['queries_per_request']:>5} q  {result['bytes_per_response']:>8} B"
+        )
+
+    def get_metadata(self):
+        try:
+            commit = subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"],
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        return {
+            "commit": commit,
+            "timestamp": timezone.now().isoformat(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "dataset": {
+                "users": User.objects.count(),
+                "shops": Shop.objects.count(),
+                "products": Product.objects.count(),
+                "categories": Category.objects.count(),
+            },
+        }
@@ -0,0 +1,113 @@
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+
+from api import compression
+from api.benchmark import throttling_disabled
+from api.management.commands.benchmark_api import Command as ApiBenchmark
+
+# Brotli 10-11 take seconds per megabyte; pass --br-levels 11 to include them.
+DEFAULT_LEVELS = {"br": [1, 4, 6, 9], "gzip": [1, 6, 9]}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compresses real API list payloads with brotli and gzip at several "
+        "levels, the way CompressionMiddleware does (in one shot, or chunk by "
+        "chunk for streams): CPU time per response against bytes saved"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument("--br-levels", nargs="+", type=int, default=DEFAULT_LEVELS["br"])
+        parser.add_argument(
+            "--gzip-levels", nargs="+", type=int, default=DEFAULT_LEVELS["gzip"]
+        )
+        parser.add_argument("--only", nargs="+", help="Use only these scenarios")
+        parser.add_argument("--output", help="Write the results as JSON to this file")
+
+    def get_payloads(self, only):
+        market = "/api/v1/market"
+        scenarios = [
+            (s.name, s.path)
+            for s in ApiBenchmark().get_scenarios()
+            if s.method == "get" and not s.auth
+        ]
+        scenarios.append(("products_export", f"{market}/products/export/"))
+        if only:
+            scenarios = [(name, path) for name, path in scenarios if name in only]
+        if not scenarios:
+            raise CommandError("No scenarios selected")
+
+        client = Client(HTTP_HOST="localhost")
+        payloads = {}
+        with throttling_disabled():
+            for name, path in scenarios:
+                response = client.get(path, secure=True)
+                if response.status_code != 200:
+                    raise CommandError(f"{name}: GET {path} returned {response.status_code}")
+                # Streams keep their chunks: the middleware compresses them as they come.
+                payloads[name] = (
+                    [bytes(chunk) for chunk in response.streaming_content]
+                    if response.streaming
+                    else response.content
+                )
+        return payloads
+
+    def compress(self, encoding, level, payload):
+        if isinstance(payload, list):
+            return b"".join(compression.compress_stream(encoding, payload, level))
+        return compression.compress(encoding, payload, level)
+
+    def measure(self, encoding, level, payload, iterations):
+        body = b"".join(payload) if isinstance(payload, list) else payload
+        timings = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            compressed = self.compress(encoding, level, payload)
+            timings.append(time.perf_counter() - start)
+        ms = statistics.median(timings) * 1000
+        saved = len(body) - len(compressed)
+        return {
+            "encoding": encoding,
+            "level": level,
+            "streamed": isinstance(payload, list),
+            "bytes": len(compressed),
+            "ratio": round(len(compressed) / len(body), 3),
+            "compress_ms": round(ms, 3),
+            "mb_per_second": round(len(body) / 1e6 / (ms / 1000), 1) if ms else None,
+            # CPU spent per kB not sent: the number to compare levels by
+            "us_per_kb_saved": round(ms * 1000 / (saved / 1000), 1) if saved > 0 else None,
+        }
+
+    def handle(self, *args, **options):
+        payloads = self.get_payloads(options["only"])
+        levels = {"br": options["br_levels"], "gzip": options["gzip_levels"]}
+        results = {}
+        for name, payload in payloads.items():
+            size = sum(map(len, payload)) if isinstance(payload, list) else len(payload)
+            mode = f", streamed in {len(payload)} chunks" if isinstance(payload, list) else ""
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{name} ({size} B{mode})"))
+            results[name] = {"bytes": size, "codecs": []}
+            for encoding, encoding_levels in levels.items():
+                for level in encoding_levels:
+                    row = self.measure(encoding, level, payload, options["iterations"])
+                    results[name]["codecs"].append(row)
+                    self.write_row(row)
+
+        if options["output"]:
+            with open(options["output"], "w") as fileobj:
+                json.dump({"results": results}, fileobj, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def write_row(self, row):
+        per_kb = row["us_per_kb_saved"]
+        self.stdout.write(
+            f"  {row['encoding']:<4} {row['level']:>2}  {row['bytes']:>9} B  "
+            f"ratio {row['ratio']:.3f}  {row['compress_ms']:>8.3f}ms  "
+            f"{row['mb_per_second'] or 0:>7.1f} MB/s  "
+            f"{per_kb if per_kb is not None else '-':>7} µs/kB saved"
+        )
@@ -0,0 +1,89 @@
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api import fieldsets
+from api.fastpath import compile_plan
+from shops.models import Product, Shop
+from shops.serializers import ProductSerializer, ShopSerializer
+
+# name -> (queryset, serializer class, query string)
+SCENARIOS = {
+    "products": (lambda: Product.objects.order_by("-created_at", "-pk"), ProductSerializer, ""),
+    "products_sparse": (
+        lambda: Product.objects.order_by("-created_at", "-pk"),
+        ProductSerializer,
+        "fields=id,name,price,image_variants",
+    ),
+    "shops": (lambda: Shop.objects.order_by("-created_at", "-pk"), ShopSerializer, ""),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Rows per second of the DRF list serializers against the api.fastpath "
+        "row plans, fetching and rendering the same rows to JSON"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=500, help="Rows per batch")
+        parser.add_argument("--iterations", type=int, default=10)
+        parser.add_argument("--only", nargs="+", choices=list(SCENARIOS))
+        parser.add_argument("--output", help="Write the results as JSON to this file")
+
+    def handle(self, *args, **options):
+        renderer = JSONRenderer()
+        results = {}
+        for name in options["only"] or SCENARIOS:
+            make_queryset, serializer_class, query = SCENARIOS[name]
+            request = Request(APIRequestFactory().get(f"/?{query}", HTTP_HOST="localhost"))
+            serializer = serializer_class(context={"request": request})
+            plan = compile_plan(serializer)
+            if plan is None:
+                raise CommandError(f"{name}: {serializer_class.__name__} has no row plan")
+            queryset = fieldsets.select_fields(make_queryset(), serializer)[: options["rows"]]
+
+            def drf():
+                rows = list(queryset.all())
+                data = serializer_class(rows, many=True, context={"request": request}).data
+                return len(rows), renderer.render(data)
+
+            def fast():
+                rows = list(plan.project(queryset.all()))
+                return len(rows), renderer.render(plan.encode(rows, serializer))
+
+            count, expected = drf()
+            if not count:
+                raise CommandError("No rows; run manage.py generate_dataset first")
+            if fast()[1] != expected:
+                raise CommandError(f"{name}: the row plan renders different JSON")
+
+            results[name] = {"rows": count, "bytes": len(expected)}
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{name} ({count} rows)"))
+            for label, run in (("serializer", drf), ("fastpath", fast)):
+                timings = []
+                for _ in range(options["iterations"]):
+                    start = time.perf_counter()
+                    run()
+                    timings.append(time.perf_counter() - start)
+                seconds = statistics.median(timings)
+                results[name][label] = {
+                    "ms": round(seconds * 1000, 3),
+                    "rows_per_second": round(count / seconds),
+                }
+                self.stdout.write(
+                    f"  {label:<10} {seconds * 1000:>9.3f}ms  {count / seconds:>10.0f} rows/s"
+                )
+            speedup = results[name]["serializer"]["ms"] / results[name]["fastpath"]["ms"]
+            results[name]["speedup"] = round(speedup, 2)
+            self.stdout.write(f"  speedup    {speedup:.2f}x")
+
+        if options["output"]:
+            with open(options["output"], "w") as fileobj:
+                json.dump({"results": results}, fileobj, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
@@ -0,0 +1,84 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.loadtest import SERVERS, ServerProcess, run_load
+from api.management.commands.benchmark_api import Command as ApiBenchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-tests the catalog read endpoints under gunicorn (WSGI) and uvicorn "
+        "(ASGI, async views) at increasing concurrency: throughput and latency"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--servers", nargs="+", choices=sorted(SERVERS), default=["wsgi", "asgi"]
+        )
+        parser.add_argument("--workers", type=int, default=1, help="Processes per server")
+        parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 10, 50, 200])
+        parser.add_argument("--duration", type=float, default=10, help="Seconds per level")
+        parser.add_argument(
+            "--client-delay",
+            type=float,
+            default=0,
+            help="Seconds each client pauses mid-request, to simulate slow networks",
+        )
+        parser.add_argument("--only", nargs="+", help="Request only these scenarios")
+        parser.add_argument("--output", help="Write the results as JSON to this file")
+
+    def get_paths(self, only):
+        scenarios = [
+            s for s in ApiBenchmark().get_scenarios() if s.method == "get" and not s.auth
+        ]
+        if only:
+            scenarios = [s for s in scenarios if s.name in only]
+        if not scenarios:
+            raise CommandError("No scenarios selected")
+        return [s.path for s in scenarios]
+
+    def handle(self, *args, **options):
+        paths = self.get_paths(options["only"])
+        results = {}
+        for kind in options["servers"]:
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{kind} ({SERVERS[kind].split()[0]})"))
+            results[kind] = []
+            try:
+                with ServerProcess(kind, options["workers"]) as server:
+                    # Warm up imports, connections and caches in every worker.
+                    run_load(server.port, paths, options["workers"] * 2, 1)
+                    for concurrency in options["concurrency"]:
+                        row = run_load(
+                            server.port,
+                            paths,
+                            concurrency,
+                            options["duration"],
+                            options["client_delay"],
+                        )
+                        results[kind].append(row)
+                        self.write_row(row)
+            except RuntimeError as exc:
+                raise CommandError(str(exc))
+
+        report = {
+            "meta": {
+                "workers": options["workers"],
+                "duration": options["duration"],
+                "client_delay": options["client_delay"],
+                "paths": paths,
+            },
+            "results": results,
+        }
+        if options["output"]:
+            with open(options["output"], "w") as fileobj:
+                json.dump(report, fileobj, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def write_row(self, row):
+        statuses = " ".join(f"{code}:{count}" for code, count in row["statuses"].items())
+        self.stdout.write(
+            f"  c={row['concurrency']:<4} {row['requests_per_second']:>8.1f} req/s  "
+            f"p50 {row['p50_ms']:>8.2f}ms  p95 {row['p95_ms']:>8.2f}ms  "
+            f"p99 {row['p99_ms']:>8.2f}ms  errors {row['errors']}  [{statuses}]"
+        )
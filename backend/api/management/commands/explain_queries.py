@@ -0,0 +1,101 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api.benchmark import Scenario, throttling_disabled
+from api.queryplans import CapturingWrapper, explain, findings, plan_lines, table_sizes
+from shops.models import Shop
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs EXPLAIN on the queries of the market list endpoints for representative "
+        "filters and orderings, and flags sequential scans and sorts on large tables"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--only", nargs="+", help="Run only these scenarios")
+        parser.add_argument(
+            "--min-rows",
+            type=int,
+            default=10000,
+            help="Tables with fewer rows are not flagged",
+        )
+        parser.add_argument(
+            "--fail", action="store_true", help="Exit with an error when anything is flagged"
+        )
+
+    def get_scenarios(self):
+        # The biggest shop and its owner, the worst case for the per-shop lists.
+        shop = Shop.objects.order_by("-product_count", "pk").first()
+        if shop is None:
+            raise CommandError("No shops to explain; run generate_dataset first")
+        market = "/api/v1/market"
+        shops, products = f"{market}/shops/", f"{market}/products/"
+        return [
+            Scenario("shops", shops),
+            Scenario("shops_cursor", f"{shops}?cursor="),
+            Scenario("shops_by_name", f"{shops}?ordering=name"),
+            Scenario("shops_by_owner", f"{shops}?owner={shop.owner_id}"),
+            Scenario("shops_by_status", f"{shops}?status=active&ordering=-created_at"),
+            Scenario("shops_signed_in", shops, auth=True),
+            Scenario("shops_signed_in_drafts", f"{shops}?status=draft", auth=True),
+            Scenario("products", products),
+            Scenario("products_cursor", f"{products}?cursor="),
+            Scenario("products_by_price", f"{products}?ordering=price&cursor="),
+            Scenario("products_by_name", f"{products}?ordering=name&cursor="),
+            Scenario("products_by_shop", f"{products}?shop_id={shop.pk}"),
+            Scenario("products_by_shop_cursor", f"{products}?shop_id={shop.pk}&cursor="),
+            Scenario(
+                "products_by_shop_price", f"{products}?shop_id={shop.pk}&ordering=-price"
+            ),
+        ], shop.owner
+
+    def handle(self, *args, **options):
+        scenarios, owner = self.get_scenarios()
+        if options["only"]:
+            scenarios = [s for s in scenarios if s.name in options["only"]]
+        sizes = table_sizes()
+        vendor = connection.vendor
+        flagged = 0
+
+        for scenario in scenarios:
+            headers = {"HTTP_HOST": "localhost"}
+            if scenario.auth:
+                headers["HTTP_AUTHORIZATION"] = f"Bearer {AccessToken.for_user(owner)}"
+            wrapper = CapturingWrapper()
+            with throttling_disabled(), connection.execute_wrapper(wrapper):
+                response = Client(**headers).get(scenario.path, secure=True)
+            if response.status_code != 200:
+                raise CommandError(
+                    f"{scenario.name}: {scenario.path} returned {response.status_code}"
+                )
+
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{scenario.name}  {scenario.path}"))
+            found = 0
+            for sql, params in wrapper.queries:
+                plan = explain(sql, params)
+                problems = findings(plan, sizes, options["min_rows"], vendor)
+                found += len(problems)
+                if options["verbosity"] > 1 or problems:
+                    self.stdout.write(f"  {sql[:160]}")
+                    for line in plan_lines(plan):
+                        self.stdout.write(f"    {line}")
+                for problem in problems:
+                    tables = ", ".join(sorted(problem.tables))
+                    self.stdout.write(
+                        self.style.WARNING(f"    ! {problem.kind} on {tables}: {problem.detail}")
+                    )
+            if not found:
+                self.stdout.write(f"  {len(wrapper.queries)} queries, nothing flagged")
+            flagged += found
+
+        summary = f"{len(scenarios)} scenarios on {vendor}, {flagged} findings"
+        if flagged and options["fail"]:
+            raise CommandError(summary)
+        style = self.style.WARNING if flagged else self.style.SUCCESS
+        self.stdout.write(style(summary))
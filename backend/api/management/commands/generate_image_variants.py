@@ -0,0 +1,33 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from api.images import generate_variants
+
+# (model label, image field, variants field)
+IMAGE_FIELDS = [
+    ("shops.Shop", "image", "image_variants"),
+    ("shops.Product", "image", "image_variants"),
+    ("users.User", "avatar", "avatar_variants"),
+]
+
+
+class Command(BaseCommand):
+    help = "Generates missing or stale image derivatives (thumb/medium/large, WebP + JPEG)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force", action="store_true", help="Rebuild derivatives even if up to date"
+        )
+
+    def handle(self, *args, **options):
+        for label, field, target in IMAGE_FIELDS:
+            model = apps.get_model(label)
+            queryset = model._default_manager.exclude(**{f"{field}__isnull": True}).exclude(
+                **{field: ""}
+            )
+            count = 0
+            for pk, source, variants in queryset.values_list("pk", field, target).iterator():
+                if options["force"] or (variants or {}).get("source") != source:
+                    generate_variants(label, pk, field, target, source)
+                    count += 1
+            self.stdout.write(self.style.SUCCESS(f"{label}: generated variants for {count} images"))
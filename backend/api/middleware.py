@@ -0,0 +1,270 @@
+import json
+import logging
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.cache import patch_vary_headers
+from whitenoise.middleware import WhiteNoiseMiddleware as BaseWhiteNoiseMiddleware
+
+from . import compression, profiling, replicas
+
+logger = logging.getLogger("api.profiling")
+
+
+class ServerTimingMiddleware:
+    """
+    Profiles a sample of requests: SQL time and count, serializer, storage
+    URL generation and rendering. Results go to a ``Server-Timing`` header
+    and a JSON log line on the ``api.profiling`` logger.
+
+    ``SERVER_TIMING_SAMPLE_RATE`` is the fraction of requests profiled; at 0
+    the middleware removes itself, so it costs nothing when disabled.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        self.sample_rate = getattr(settings, "SERVER_TIMING_SAMPLE_RATE", 0)
+        if self.sample_rate <= 0:
+            raise MiddlewareNotUsed
+        profiling.install()
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+        profile = profiling.Profile()
+        token = profiling.current.set(profile)
+        try:
+            request._profile = profile
+            response = self.get_response(request)
+        finally:
+            profiling.current.reset(token)
+        return self.report(request, response, profile)
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+        profile = profiling.Profile()
+        token = profiling.current.set(profile)
+        try:
+            request._profile = profile
+            response = await self.get_response(request)
+        finally:
+            profiling.current.reset(token)
+        return self.report(request, response, profile)
+
+    def sampled(self):
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def report(self, request, response, profile):
+        render_started = getattr(request, "_render_started", None)
+        if render_started is not None:
+            profile.add("render", time.perf_counter() - render_started)
+        profile.add("total", time.perf_counter() - profile.started)
+
+        timings = profile.as_dict()
+        metrics = [f'db;dur={timings.get("db", 0)};desc="{profile.queries} queries"']
+        metrics += [f"{name};dur={ms}" for name, ms in timings.items() if name != "db"]
+        response["Server-Timing"] = ", ".join(metrics)
+        logger.info(
+            json.dumps(
+                {
+                    "event": "request_profile",
+                    "method": request.method,
+                    "path": request.path,
+                    "status": response.status_code,
+                    "queries": profile.queries,
+                    "timings_ms": timings,
+                }
+            )
+        )
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered right after the template-response hooks.
+        if hasattr(request, "_profile"):
+            request._render_started = time.perf_counter()
+        return response
+
+
+class ReplicaMiddleware:
+    """
+    Sends the reads of safe market/auth requests to a read replica, unless
+    the client wrote something in the last ``REPLICA_PIN_SECONDS``; requests
+    that write pin their client to the primary. See ``api.replicas``.
+
+    Without ``REPLICA_DATABASES`` the middleware removes itself.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        if not getattr(settings, "REPLICA_DATABASES", None):
+            raise MiddlewareNotUsed
+        self.pin_seconds = settings.REPLICA_PIN_SECONDS
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        routing = replicas.Routing()
+        if replicas.routed(request):
+            if not cache.get_many(replicas.pin_keys(request)):
+                routing.replica = replicas.choose()
+        token = replicas.current.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            replicas.current.reset(token)
+        if routing.wrote:
+            cache.set(replicas.pin_key(request), True, self.pin_seconds)
+        return response
+
+    async def __acall__(self, request):
+        routing = replicas.Routing()
+        if replicas.routed(request):
+            if not await cache.aget_many(replicas.pin_keys(request)):
+                routing.replica = replicas.choose()
+        token = replicas.current.set(routing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            replicas.current.reset(token)
+        if routing.wrote:
+            await cache.aset(replicas.pin_key(request), True, self.pin_seconds)
+        return response
+
+
+class WhiteNoiseMiddleware(BaseWhiteNoiseMiddleware):
+    """
+    WhiteNoise's middleware is sync-only, which would make Django run every
+    ASGI request below it through a thread. Under ASGI this one only leaves
+    the event loop to serve an actual static file.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
+
+
+class CompressionMiddleware:
+    """
+    Compresses API responses (JSON, NDJSON, CSV, plain text) with brotli or
+    gzip, whichever ``Accept-Encoding`` prefers. Bodies shorter than
+    ``COMPRESSION_MIN_SIZE`` bytes are sent as they are; streaming responses
+    are compressed in batches of chunks (``api.compression``).
+    ``COMPRESSION_LEVELS`` sets the level per encoding
+    (``manage.py benchmark_compression`` measures the trade-off).
+
+    HTML is never compressed: pages such as the admin put CSRF tokens next to
+    reflected input, which compression would expose to BREACH.
+    """
+
+    sync_capable = True
+    async_capable = True
+    content_types = {
+        "application/json",
+        "application/vnd.oai.openapi",
+        "application/vnd.oai.openapi+json",
+        "application/x-ndjson",
+        "text/csv",
+        "text/plain",
+    }
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        self.min_size = settings.COMPRESSION_MIN_SIZE
+        self.levels = settings.COMPRESSION_LEVELS
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.process_response(request, await self.get_response(request))
+
+    def compressible(self, response):
+        content_type = response.get("Content-Type", "").split(";")[0].strip().lower()
+        return (
+            content_type in self.content_types
+            and not response.has_header("Content-Encoding")
+            and "no-transform" not in response.get("Cache-Control", "")
+        )
+
+    def process_response(self, request, response):
+        if not self.compressible(response):
+            return response
+        patch_vary_headers(response, ("Accept-Encoding",))
+        encoding = compression.negotiate(request.headers.get("Accept-Encoding"))
+        if encoding is None:
+            return response
+        level = self.levels[encoding]
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = compression.acompress_stream(
+                    encoding, response.streaming_content, level
+                )
+            else:
+                response.streaming_content = compression.compress_stream(
+                    encoding, response.streaming_content, level
+                )
+            del response["Content-Length"]
+        else:
+            if len(response.content) < self.min_size:
+                return response
+            profile = profiling.current.get()
+            if profile is None:
+                compressed = compression.compress(encoding, response.content, level)
+            else:
+                with profile.phase("compress"):
+                    compressed = compression.compress(encoding, response.content, level)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response["Content-Length"] = str(len(compressed))
+
+        # The encoded body is no longer byte-for-byte the one a strong ETag names.
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = f"W/{etag}"
+        response["Content-Encoding"] = encoding
+        return response
@@ -0,0 +1,111 @@
+"""
+Per-request phase timings for ``ServerTimingMiddleware``.
+
+The active ``Profile`` lives in a context variable, so it follows a request
+into ``sync_to_async`` threads (async views run their queries there).
+``install()`` wraps the few library entry points whose cost we want to see
+(SQL execution, DRF serializer ``.data`` and storage ``url()``); outside a
+profiled request the wrappers cost one context-variable lookup. Phases
+overlap: ``serialize`` includes the ``storage`` and ``db`` time spent while
+serializing.
+"""
+
+import contextvars
+import functools
+import time
+from contextlib import contextmanager
+
+from django.core.files.storage import storages
+from django.db.backends.utils import CursorWrapper
+from rest_framework import serializers
+
+current = contextvars.ContextVar("buskalo_profile", default=None)
+
+_installed = False
+
+
+class Profile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.durations = {}
+        self.queries = 0
+        self._active = set()
+
+    def add(self, phase, seconds):
+        self.durations[phase] = self.durations.get(phase, 0.0) + seconds
+
+    def __call__(self, execute, sql, params, many, context):
+        """Execute-wrapper hook: time and count SQL."""
+        self.queries += 1
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.add("db", time.perf_counter() - start)
+
+    @contextmanager
+    def phase(self, name):
+        # Nested calls (a serializer inside a serializer) are counted once.
+        if name in self._active:
+            yield
+            return
+        self._active.add(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._active.discard(name)
+            self.add(name, time.perf_counter() - start)
+
+    def as_dict(self):
+        return {name: round(seconds * 1000, 3) for name, seconds in self.durations.items()}
+
+
+def _timed_property(prop, phase):
+    def getter(self):
+        profile = current.get()
+        if profile is None:
+            return prop.fget(self)
+        with profile.phase(phase):
+            return prop.fget(self)
+
+    return property(getter, prop.fset, prop.fdel, prop.__doc__)
+
+
+def _timed_method(method, phase):
+    def wrapper(*args, **kwargs):
+        profile = current.get()
+        if profile is None:
+            return method(*args, **kwargs)
+        with profile.phase(phase):
+            return method(*args, **kwargs)
+
+    wrapper.__wrapped__ = method
+    return wrapper
+
+
+def _profiled_execute(method):
+    # Same signature as a connection.execute_wrapper, on every connection.
+    def wrapper(self, sql, params, many, executor):
+        profile = current.get()
+        if profile is not None:
+            executor = functools.partial(profile, executor)
+        return method(self, sql, params, many, executor)
+
+    wrapper.__wrapped__ = method
+    return wrapper
+
+
+def install():
+    """Instrument SQL, serializers and the default storage; idempotent."""
+    global _installed
+    if _installed:
+        return
+    CursorWrapper._execute_with_wrappers = _profiled_execute(
+        CursorWrapper._execute_with_wrappers
+    )
+    for cls in (serializers.Serializer, serializers.ListSerializer):
+        cls.data = _timed_property(cls.__dict__["data"], "serialize")
+    storage_class = type(storages["default"])
+    storage_class.url = _timed_method(storage_class.url, "storage")
+    _installed = True
@@ -0,0 +1,128 @@
+"""
+Query plan audit helpers (``manage.py explain_queries``).
+
+The SELECTs an endpoint runs are captured while the request goes through the
+Django test client, so they are exactly the ones the views build, pagination
+and all, and each is then run again under ``EXPLAIN``. A plan is flagged
+when it reads a whole table (a sequential scan) or sorts rows (no index
+delivers the ``ORDER BY``) and one of the tables it touches is large.
+
+SQLite's ``EXPLAIN QUERY PLAN`` and PostgreSQL's ``EXPLAIN (FORMAT JSON)``
+are supported; other backends get their plan printed but never flagged.
+"""
+
+import json
+import re
+from collections import namedtuple
+
+from django.db import connections
+
+Finding = namedtuple("Finding", "kind tables detail")
+
+SQLITE_TABLE = re.compile(r"^(?:SCAN|SEARCH) (\S+)")
+
+
+class CapturingWrapper:
+    """``connection.execute_wrapper`` that keeps every SELECT and its parameters."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if not many and sql.lstrip().upper().startswith("SELECT"):
+            self.queries.append((sql, params))
+        return execute(sql, params, many, context)
+
+
+def explain(sql, params, using="default"):
+    """The plan of one query: SQLite detail lines, a PostgreSQL plan tree, or text lines."""
+    connection = connections[using]
+    vendor = connection.vendor
+    prefix = connection.ops.explain_query_prefix(format="json" if vendor == "postgresql" else None)
+    with connection.cursor() as cursor:
+        cursor.execute(f"{prefix} {sql}", params)
+        rows = cursor.fetchall()
+    if vendor == "postgresql":
+        plan = rows[0][0]
+        return (json.loads(plan) if isinstance(plan, str) else plan)[0]["Plan"]
+    if vendor == "sqlite":
+        return [row[-1] for row in rows]
+    return [" ".join(str(value) for value in row) for row in rows]
+
+
+def plan_lines(plan):
+    """The plan as indented text lines, for printing."""
+    if not isinstance(plan, dict):
+        return list(plan)
+    lines = []
+
+    def walk(node, depth):
+        relation = node.get("Relation Name") or node.get("Index Name")
+        label = node["Node Type"] + (f" on {relation}" if relation else "")
+        if node.get("Sort Key"):
+            label += f" ({', '.join(node['Sort Key'])})"
+        lines.append("  " * depth + label + f"  rows={node.get('Plan Rows')}")
+        for child in node.get("Plans", ()):
+            walk(child, depth + 1)
+
+    walk(plan, 0)
+    return lines
+
+
+def _sqlite_findings(lines):
+    tables = {m.group(1) for m in map(SQLITE_TABLE.match, lines) if m}
+    for line in lines:
+        if line.startswith("SCAN ") and " USING " not in line:
+            yield Finding("scan", {line.split()[1]}, line)
+        elif line.startswith("USE TEMP B-TREE FOR"):
+            yield Finding("sort", tables, line)
+
+
+def _postgresql_findings(node):
+    if node["Node Type"] == "Seq Scan":
+        yield Finding("scan", {node["Relation Name"]}, plan_lines(node)[0].strip())
+    elif node["Node Type"] == "Sort":
+        tables = set()
+        pending = list(node.get("Plans", ()))
+        while pending:
+            child = pending.pop()
+            if child.get("Relation Name"):
+                tables.add(child["Relation Name"])
+            pending.extend(child.get("Plans", ()))
+        yield Finding("sort", tables, plan_lines({**node, "Plans": []})[0].strip())
+    for child in node.get("Plans", ()):
+        yield from _postgresql_findings(child)
+
+
+def findings(plan, sizes, min_rows, vendor):
+    """Sequential scans and sorts in ``plan`` touching a table of ``min_rows`` or more."""
+    if vendor == "postgresql":
+        candidates = _postgresql_findings(plan)
+    elif vendor == "sqlite":
+        candidates = _sqlite_findings(plan)
+    else:
+        return []
+    return [
+        finding
+        for finding in candidates
+        if any(sizes.get(table, 0) >= min_rows for table in finding.tables)
+    ]
+
+
+def table_sizes(using="default"):
+    """``{table: rows}``: exact counts on SQLite, the planner's estimates on PostgreSQL."""
+    connection = connections[using]
+    tables = connection.introspection.table_names()
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute(
+                "SELECT relname, reltuples::bigint FROM pg_class "
+                "WHERE relkind = 'r' AND relname = ANY(%s)",
+                [tables],
+            )
+            return dict(cursor.fetchall())
+        sizes = {}
+        for table in tables:
+            cursor.execute(f"SELECT COUNT(*) FROM {connection.ops.quote_name(table)}")
+            sizes[table] = cursor.fetchone()[0]
+        return sizes
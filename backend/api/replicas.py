@@ -0,0 +1,130 @@
+"""
+Read replicas with read-your-writes.
+
+``DATABASE_REPLICA_URLS`` adds one database alias per replica of
+``default`` (``replica1``, ``replica2``, ...). ``api.middleware.ReplicaMiddleware``
+picks one at random for each safe (GET/HEAD/OPTIONS) request to the paths in
+``REPLICA_PATHS`` and ``ReplicaRouter`` sends that request's reads there.
+Everything else stays on ``default``: writes, reads inside a transaction
+(e.g. ``get_or_create()``, ``select_for_update()``), reads made while
+handling a POST, and all management commands and background tasks.
+
+Replicas lag behind, so a request that writes anything pins its client to
+``default`` for ``REPLICA_PIN_SECONDS``, to read what it just wrote. The
+router notices the writes (every write is routed through
+``db_for_write()``), so requests that only read, e.g. a read-only
+``/api/v1/batch/``, pin nothing. The pin is kept in the default cache, per
+user (the ``user_id`` claim of the bearer token) or per IP address for
+anonymous clients; reads check both, so a client that just registered
+anonymously and then signs in still reads its writes. Without ``REDIS_URL``
+the cache, and so the pin, is per process.
+"""
+
+import base64
+import contextvars
+import json
+import random
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.throttling import BaseThrottle
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+# The current request's Routing, set by the middleware
+current = contextvars.ContextVar("replica_routing", default=None)
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class Routing:
+    """
+    Where a request reads from (``replica``, None for the primary) and
+    whether it wrote. A mutable object, so writes made in ``sync_to_async``
+    threads (which run in a copy of the context) are still seen.
+    """
+
+    def __init__(self, replica=None):
+        self.replica = replica
+        self.wrote = False
+
+
+def choose():
+    return random.choice(settings.REPLICA_DATABASES)
+
+
+def routed(request):
+    """Whether ``request`` may read from a replica (unless its client is pinned)."""
+    return request.method in SAFE_METHODS and request.path.startswith(settings.REPLICA_PATHS)
+
+
+def token_user_id(request):
+    """
+    The user id claimed by the bearer token, unverified: it only decides
+    where the reads go, the view still authenticates the request.
+    """
+    header = request.headers.get("Authorization", "")
+    parts = header.split()
+    if len(parts) != 2 or parts[0] not in jwt_settings.AUTH_HEADER_TYPES:
+        return None
+    try:
+        payload = parts[1].split(".")[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        return claims[jwt_settings.USER_ID_CLAIM]
+    except (IndexError, ValueError, KeyError, TypeError):
+        return None
+
+
+def address_pin_key(request):
+    return f"replica-pin:ip-{BaseThrottle().get_ident(request)}"
+
+
+def pin_key(request, user_id=None):
+    """Cache key of the client's pin: per user when known, per IP address otherwise."""
+    if user_id is None:
+        user = getattr(request, "user", None)
+        if user is not None and user.is_authenticated:
+            user_id = user.pk
+    if user_id is not None:
+        return f"replica-pin:user-{user_id}"
+    return address_pin_key(request)
+
+
+def pin_keys(request):
+    """
+    The keys a pin of the client of ``request`` may be under: its address
+    (e.g. after an anonymous ``auth/register/``) and its token's user.
+    """
+    keys = [address_pin_key(request)]
+    user_id = token_user_id(request)
+    if user_id is not None:
+        keys.append(pin_key(request, user_id))
+    return keys
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        routing = current.get()
+        if routing is None or routing.replica is None:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return routing.replica
+
+    def db_for_write(self, model, **hints):
+        routing = current.get()
+        if routing is not None:
+            routing.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        databases = {DEFAULT_DB_ALIAS, *settings.REPLICA_DATABASES}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary.
+        if db in settings.REPLICA_DATABASES:
+            return False
+        return None
@@ -0,0 +1,53 @@
+"""
+Minimal in-process background execution.
+
+The project has no task queue, so work that must not hold up a request
+(image derivatives, bulk deletes) is handed to a small thread pool once the
+surrounding transaction commits. Jobs are lost if the worker process exits
+mid-flight; every job scheduled here must therefore be safe to re-run from
+its management command (``generate_image_variants``, ``resume_shop_resets``).
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, "BACKGROUND_TASK_WORKERS", 2),
+            thread_name_prefix="buskalo-task",
+        )
+    return _executor
+
+
+def run_task(func, *args, **kwargs):
+    try:
+        func(*args, **kwargs)
+    except Exception:
+        logger.exception("Background task %s failed", func.__qualname__)
+    finally:
+        if not getattr(settings, "BACKGROUND_TASKS_EAGER", False):
+            # Worker threads open their own connections; don't leak them.
+            connections.close_all()
+
+
+def submit(func, *args, **kwargs):
+    """Run ``func`` off the request thread now."""
+    if getattr(settings, "BACKGROUND_TASKS_EAGER", False):
+        run_task(func, *args, **kwargs)
+    else:
+        get_executor().submit(run_task, func, *args, **kwargs)
+
+
+def enqueue(func, *args, **kwargs):
+    """Run ``func`` off the request thread after the current transaction commits."""
+    transaction.on_commit(lambda: submit(func, *args, **kwargs))
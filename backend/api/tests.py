@@ -1,8 +1,35 @@
-from django.test import TestCase, override_settings
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from unittest import mock
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
+import gzip
+import hashlib
+import io
+import json
 import os
+import threading
+
+import brotli
+import urllib3
+from PIL import Image
+
+from api.benchmark import throttling_disabled
+from api.throttling import SlidingWindowThrottle
 
 class SecurityTestCase(TestCase):
     def test_debug_is_false(self):
@@ -27,3 +54,656 @@ class ApiVersioningTestCase(APITestCase):
         url = reverse('swagger-ui')
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, SERVER_TIMING_SAMPLE_RATE=1)
+class ServerTimingTestCase(APITestCase):
+    def test_profiled_request_reports_phases(self):
+        """Sampled requests get a Server-Timing header and a JSON log line."""
+        with self.assertLogs("api.profiling", level="INFO") as logs:
+            response = self.client.get("/api/v1/market/categories/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        metrics = {part.split(";")[0].strip() for part in response["Server-Timing"].split(",")}
+        self.assertTrue({"db", "serialize", "render", "total"} <= metrics)
+        self.assertIn('desc="', response["Server-Timing"])
+
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["path"], "/api/v1/market/categories/")
+        self.assertGreaterEqual(record["queries"], 1)
+
+    async def test_profiled_async_request(self):
+        """Under ASGI the SQL run in sync_to_async threads is still attributed."""
+        with self.assertLogs("api.profiling", level="INFO") as logs:
+            response = await self.async_client.get("/api/v1/market/categories/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("db;dur=", response["Server-Timing"])
+        self.assertGreaterEqual(json.loads(logs.records[0].getMessage())["queries"], 1)
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=0)
+    def test_disabled_by_default(self):
+        response = self.client.get("/api/v1/hello/")
+        self.assertNotIn("Server-Timing", response)
+
+
+class AsgiMiddlewareTestCase(TestCase):
+    def test_middleware_is_async_capable(self):
+        """One sync-only middleware would put every ASGI request on a thread."""
+        from django.conf import settings
+        from django.utils.module_loading import import_string
+
+        for path in settings.MIDDLEWARE:
+            with self.subTest(middleware=path):
+                self.assertTrue(getattr(import_string(path), "async_capable", False))
+
+
+RATES = {
+    "anon": "1/min",
+    "user": "1/min",
+    "login": ["2/min", "3/day"],
+    "catalog": "3/min",
+    "export": "1/hour",
+    "batch": "2/min",
+}
+
+
+@override_settings(
+    SECURE_SSL_REDIRECT=False,
+    REST_FRAMEWORK={**settings.REST_FRAMEWORK, "DEFAULT_THROTTLE_RATES": RATES},
+)
+class ThrottleTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+
+    def check(self, throttle, now):
+        request = RequestFactory().get("/")
+        request.user = AnonymousUser()
+        throttle.timer = lambda: now
+        return throttle.allow_request(request, SimpleNamespace(throttle_scope="catalog"))
+
+    def test_sliding_window(self):
+        throttle = SlidingWindowThrottle()
+        self.assertEqual([self.check(throttle, 60) for _ in range(4)], [True] * 3 + [False])
+        self.assertEqual(throttle.wait(), 60)
+        # Halfway through the next window half of the previous count remains.
+        results = [self.check(throttle, 150) for _ in range(3)]
+        self.assertEqual(results, [True, False, False])
+        self.assertAlmostEqual(throttle.wait(), 10)
+        self.assertTrue(self.check(throttle, 165))
+
+    def test_login_is_stricter(self):
+        codes = [
+            self.client.post("/api/v1/auth/login/", {"username": "x", "password": "y"}).status_code
+            for _ in range(3)
+        ]
+        self.assertEqual(codes, [401, 401, 429])
+
+    def test_batches_cannot_get_past_the_login_limit(self):
+        login = {
+            "method": "POST",
+            "path": "/api/v1/auth/login/",
+            "body": {"username": "x", "password": "y"},
+        }
+        spoofed = {**login, "headers": {"X-Forwarded-For": "198.51.100.1"}}
+        response = self.client.post("/api/v1/batch/", {"requests": [spoofed]}, format="json")
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post("/api/v1/batch/", {"requests": [login] * 3}, format="json")
+        statuses = [entry["status"] for entry in json.loads(response.content)["responses"]]
+        self.assertEqual(statuses, [401, 401, 429])
+        # Batches have a rate of their own too.
+        response = self.client.post("/api/v1/batch/", {"requests": [login]}, format="json")
+        self.assertEqual(response.status_code, 429)
+
+    def test_catalog_reads_use_their_own_rate(self):
+        codes = [self.client.get("/api/v1/market/categories/").status_code for _ in range(4)]
+        self.assertEqual(codes, [200] * 3 + [429])
+        codes = [self.client.get("/api/v1/hello/").status_code for _ in range(2)]
+        self.assertEqual(codes[1], 429)
+
+    def test_forwarded_for_cannot_be_rotated_behind_a_proxy(self):
+        url = "/api/v1/market/categories/"
+        rest_framework = {**settings.REST_FRAMEWORK, "DEFAULT_THROTTLE_RATES": RATES}
+        with override_settings(REST_FRAMEWORK={**rest_framework, "NUM_PROXIES": 1}):
+            codes = [
+                self.client.get(
+                    url, headers={"X-Forwarded-For": f"10.0.0.{i}, 203.0.113.7"}
+                ).status_code
+                for i in range(4)
+            ]
+        self.assertEqual(codes, [200] * 3 + [429])
+
+    def test_exports_use_their_own_rate(self):
+        url = "/api/v1/market/products/export/"
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(self.client.get(url).status_code, 429)
+        # Pages of the catalog are counted separately.
+        self.assertEqual(self.client.get("/api/v1/market/products/").status_code, 200)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class CompressionTestCase(APITestCase):
+    url = "/api/v1/market/products/"
+
+    @classmethod
+    def setUpTestData(cls):
+        from django.contrib.auth import get_user_model
+
+        from shops.models import Product, Shop
+
+        owner = get_user_model().objects.create_user(username="owner", password="pass1234")
+        shop = Shop.objects.create(owner=owner, name="Tienda", location="Caracas")
+        for i in range(10):
+            Product.objects.create(
+                shop=shop, name=f"Producto {i}", description="Descripción " * 30, price=10
+            )
+
+    def get(self, url, encoding, **kwargs):
+        with throttling_disabled():
+            return self.client.get(url, headers={"Accept-Encoding": encoding}, **kwargs)
+
+    def test_negotiates_brotli_then_gzip(self):
+        plain = self.get(self.url, "identity")
+        self.assertNotIn("Content-Encoding", plain)
+        self.assertIn("Accept-Encoding", plain["Vary"])
+
+        response = self.get(self.url, "gzip, deflate, br")
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertEqual(brotli.decompress(response.content), plain.content)
+        self.assertEqual(int(response["Content-Length"]), len(response.content))
+        self.assertLess(len(response.content), len(plain.content) / 3)
+
+        response = self.get(self.url, "br;q=0, gzip;q=0.8")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+
+    def test_small_html_and_streaming_responses(self):
+        self.assertNotIn("Content-Encoding", self.get("/api/v1/hello/", "br"))
+        self.assertNotIn("Content-Encoding", self.get("/admin/login/", "br"))
+
+        url = f"{self.url}export/"
+        plain = b"".join(self.get(url, "").streaming_content)
+        response = self.get(url, "gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertNotIn("Content-Length", response)
+        self.assertEqual(gzip.decompress(b"".join(response.streaming_content)), plain)
+
+    def test_streams_are_flushed_in_batches(self):
+        from api import compression
+
+        rows = [b'{"id": %d, "name": "Producto"}\n' % i for i in range(5000)]
+        for encoding, decompress in (("br", brotli.decompress), ("gzip", gzip.decompress)):
+            with self.subTest(encoding=encoding):
+                chunks = list(compression.compress_stream(encoding, rows, 4))
+                self.assertEqual(decompress(b"".join(chunks)), b"".join(rows))
+                # Flushed every FLUSH_BYTES of input, not after every row.
+                self.assertLess(len([chunk for chunk in chunks if chunk]), 10)
+                self.assertLess(
+                    len(b"".join(chunks)),
+                    len(compression.compress(encoding, b"".join(rows), 4)) * 1.1,
+                )
+
+        # A slow stream is still flushed every FLUSH_SECONDS.
+        compressor = compression.StreamCompressor("gzip", 6)
+        compressor.timer = lambda: compressor.flushed_at + compression.FLUSH_SECONDS
+        self.assertTrue(compressor.chunk(rows[0]))
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, BATCH_MAX_REQUESTS=5)
+class BatchTestCase(APITestCase):
+    url = "/api/v1/batch/"
+
+    def setUp(self):
+        from django.contrib.auth import get_user_model
+        from rest_framework_simplejwt.tokens import AccessToken
+
+        from shops.models import Category, Shop
+
+        self.user = get_user_model().objects.create_user(username="buyer", password="pass1234")
+        self.shop = Shop.objects.create(owner=self.user, name="Tienda", location="Caracas")
+        self.category = Category.objects.create(name="Hogar")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+
+    def batch(self, *items):
+        with throttling_disabled():
+            response = self.client.post(self.url, {"requests": list(items)}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return json.loads(response.content)["responses"]
+
+    def test_matches_separate_calls(self):
+        """Each entry carries the status, headers and body the plain call returns."""
+        paths = [
+            f"/api/v1/market/shops/{self.shop.pk}/",
+            "/api/v1/market/products/?ordering=name",
+            "/api/v1/market/categories/",
+            "/api/v1/auth/profile/",
+        ]
+        responses = self.batch(*({"method": "GET", "path": path} for path in paths))
+        for path, entry in zip(paths, responses):
+            with self.subTest(path=path), throttling_disabled():
+                expected = self.client.get(path)
+                self.assertEqual(entry["status"], expected.status_code)
+                self.assertEqual(entry["body"], json.loads(expected.content))
+                self.assertEqual(entry["headers"].get("ETag"), expected.get("ETag"))
+        self.assertEqual(responses[3]["body"]["username"], "buyer")
+
+    def test_writes_run_in_order(self):
+        responses = self.batch(
+            {
+                "method": "POST",
+                "path": "/api/v1/market/products/",
+                "body": {"shop": self.shop.pk, "name": "Lámpara", "price": "12.50"},
+            },
+            {"path": "/api/v1/market/products/"},
+            {"path": "/api/v1/market/unknown/"},
+            {"path": "/admin/"},
+            {"path": self.url},
+        )
+        self.assertEqual([entry["status"] for entry in responses], [201, 200, 404, 400, 400])
+        self.assertEqual(responses[1]["body"]["results"][0]["name"], "Lámpara")
+
+    def test_anonymous_and_invalid_batches(self):
+        self.client.credentials()
+        responses = self.batch({"path": "/api/v1/auth/profile/"})
+        self.assertEqual(responses[0]["status"], status.HTTP_401_UNAUTHORIZED)
+        for requests in ([], [{"path": "/api/v1/hello/"}] * 6, [{"method": "TRACE", "path": "/"}]):
+            with self.subTest(requests=requests):
+                response = self.client.post(self.url, {"requests": requests}, format="json")
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class BatchConcurrencyTestCase(TransactionTestCase):
+    def test_reads_run_on_the_pool(self):
+        """Outside a transaction consecutive reads run on the batch threads."""
+        from unittest import mock
+
+        from api import batch
+
+        paths = ["/api/v1/market/categories/", "/api/v1/hello/", "/api/v1/market/shops/"]
+        with mock.patch.object(batch, "call_in_thread", wraps=batch.call_in_thread) as threaded:
+            with throttling_disabled():
+                response = self.client.post(
+                    "/api/v1/batch/",
+                    {"requests": [{"path": path} for path in paths]},
+                    content_type="application/json",
+                )
+        self.assertEqual(threaded.call_count, 3)
+        statuses = [entry["status"] for entry in json.loads(response.content)["responses"]]
+        self.assertEqual(statuses, [200, 200, 200])
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class ExplainQueriesTestCase(TestCase):
+    def test_flags_scans_and_sorts_on_large_tables(self):
+        from api.queryplans import findings
+
+        sqlite_plan = [
+            "SCAN shops_shop",
+            "SEARCH shops_product USING INDEX product_shop_price_idx (shop_id=?)",
+            "USE TEMP B-TREE FOR ORDER BY",
+        ]
+        sizes = {"shops_shop": 50, "shops_product": 50000}
+        self.assertEqual(
+            [(f.kind, f.tables) for f in findings(sqlite_plan, sizes, 10000, "sqlite")],
+            [("sort", {"shops_shop", "shops_product"})],
+        )
+        postgresql_plan = {
+            "Node Type": "Limit",
+            "Plans": [
+                {
+                    "Node Type": "Sort",
+                    "Sort Key": ["created_at DESC"],
+                    "Plans": [{"Node Type": "Seq Scan", "Relation Name": "shops_product"}],
+                }
+            ],
+        }
+        self.assertEqual(
+            [f.kind for f in findings(postgresql_plan, sizes, 10000, "postgresql")],
+            ["sort", "scan"],
+        )
+        self.assertEqual(findings(postgresql_plan, sizes, 100000, "postgresql"), [])
+
+    def test_command_explains_every_scenario(self):
+        from io import StringIO
+
+        from django.contrib.auth import get_user_model
+        from django.core.management import call_command
+
+        from shops.models import Product, Shop
+
+        owner = get_user_model().objects.create_user(username="owner")
+        shop = Shop.objects.create(owner=owner, name="Tienda", location="Caracas")
+        Product.objects.create(shop=shop, name="Lámpara", price="12.50")
+        out = StringIO()
+        call_command("explain_queries", "--min-rows", "1000", "--fail", stdout=out)
+        self.assertIn("products_by_shop_price", out.getvalue())
+        self.assertIn("14 scenarios on sqlite, 0 findings", out.getvalue())
+
+
+@override_settings(REPLICA_DATABASES=["replica1", "replica2"])
+class ReplicaRouterTestCase(SimpleTestCase):
+    def test_reads_follow_the_request_and_writes_stay_on_the_primary(self):
+        from api import replicas
+        from shops.models import Product
+
+        router = replicas.ReplicaRouter()
+        self.assertEqual(router.db_for_read(Product), "default")
+        routing = replicas.Routing("replica2")
+        token = replicas.current.set(routing)
+        try:
+            self.assertEqual(router.db_for_read(Product), "replica2")
+            self.assertFalse(routing.wrote)
+            self.assertEqual(router.db_for_write(Product), "default")
+            self.assertTrue(routing.wrote)
+        finally:
+            replicas.current.reset(token)
+        self.assertFalse(router.allow_migrate("replica1", "shops"))
+        self.assertIsNone(router.allow_migrate("default", "shops"))
+
+    def test_pins_by_token_user_or_address(self):
+        from rest_framework_simplejwt.tokens import AccessToken
+
+        from api import replicas
+
+        token = AccessToken()
+        token["user_id"] = 42
+        request = RequestFactory().get("/", HTTP_AUTHORIZATION=f"Bearer {token}")
+        self.assertEqual(replicas.token_user_id(request), 42)
+        self.assertEqual(replicas.pin_key(request, 42), "replica-pin:user-42")
+        request = RequestFactory().get("/", HTTP_AUTHORIZATION="Bearer garbage")
+        self.assertIsNone(replicas.token_user_id(request))
+        request.user = AnonymousUser()
+        self.assertEqual(replicas.pin_key(request), "replica-pin:ip-127.0.0.1")
+        self.assertEqual(replicas.pin_keys(request), ["replica-pin:ip-127.0.0.1"])
+        request = RequestFactory().get("/", HTTP_AUTHORIZATION=f"Bearer {token}")
+        self.assertEqual(
+            replicas.pin_keys(request), ["replica-pin:ip-127.0.0.1", "replica-pin:user-42"]
+        )
+
+
+# Runs in a process configured with a primary and a replica SQLite file; the
+# replica is a copy taken before the category was created, i.e. lagging.
+REPLICA_SCRIPT = """
+import json, time
+from django.test import Client
+from shops.models import Category
+
+Category.objects.create(name="Solo en el primario")
+writer = Client(HTTP_HOST="localhost")
+other = Client(HTTP_HOST="localhost", REMOTE_ADDR="10.0.0.2")
+
+def names(client):
+    response = client.get("/api/v1/market/categories/")
+    return [row["name"] for row in response.json()["results"]]
+
+seen = {"before": names(writer)}
+writer.post("/api/v1/auth/register/", {"username": "ana", "password": "Clave-Segura-123"})
+seen["writer"] = names(writer)
+seen["other"] = names(other)
+# Signed in right after registering anonymously: the user is only on the primary.
+login = writer.post("/api/v1/auth/login/", {"username": "ana", "password": "Clave-Segura-123"})
+access = login.json()["access"]
+seen["profile"] = writer.get(
+    "/api/v1/auth/profile/", HTTP_AUTHORIZATION=f"Bearer {access}"
+).status_code
+time.sleep(3.2)
+seen["expired"] = names(writer)
+print(json.dumps(seen))
+"""
+
+
+class ReplicaRoutingTestCase(SimpleTestCase):
+    def test_read_your_writes_with_two_sqlite_files(self):
+        import shutil
+        import subprocess
+        import sys
+        import tempfile
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        env = {
+            **os.environ,
+            "SECRET_KEY": "replicas",
+            "SECURE_SSL_REDIRECT": "False",
+            "THROTTLING": "False",
+            "DATABASE_URL": f"sqlite:///{directory}/primary.sqlite3",
+            "DATABASE_REPLICA_URLS": f"sqlite:///{directory}/replica.sqlite3",
+            "REPLICA_PIN_SECONDS": "3",
+        }
+        manage = [sys.executable, str(settings.BASE_DIR / "manage.py")]
+        subprocess.run([*manage, "migrate", "-v0"], env=env, check=True)
+        shutil.copy(f"{directory}/primary.sqlite3", f"{directory}/replica.sqlite3")
+        output = subprocess.run(
+            [*manage, "shell", "-v0", "-c", REPLICA_SCRIPT],
+            env=env,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        seen = json.loads(output.strip().splitlines()[-1])
+        self.assertEqual(seen["before"], [])
+        self.assertEqual(seen["writer"], ["Solo en el primario"])
+        self.assertEqual(seen["other"], [])
+        self.assertEqual(seen["profile"], 200)
+        self.assertEqual(seen["expired"], [])
+
+
+class S3StubHandler(BaseHTTPRequestHandler):
+    """
+    Just enough of the S3 API for api.uploads and S3Storage: PUT (the
+    headers a presigned URL signs must be sent, the signature is not
+    checked), conditional copies, HEAD, ranged GET and DELETE of objects in
+    ``server.objects``.
+    """
+
+    def log_message(self, *args):
+        pass
+
+    def key(self):
+        return unquote(urlsplit(self.path).path.split("/", 2)[2])
+
+    def etag(self, key):
+        return f'"{hashlib.md5(self.server.objects[key][0]).hexdigest()}"'
+
+    def reply(self, status_code, body=b"", headers=()):
+        self.send_response(status_code)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def do_PUT(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        if self.headers.get("x-amz-copy-source"):
+            return self.copy()
+        signed = parse_qs(urlsplit(self.path).query).get("X-Amz-SignedHeaders", [""])[0]
+        if any(self.headers.get(name) is None for name in signed.split(";") if name):
+            return self.reply(403, b"SignatureDoesNotMatch")
+        self.server.objects[self.key()] = (body, self.headers.get("Content-Type", ""))
+        self.reply(200, headers=[("ETag", self.etag(self.key()))])
+
+    def copy(self):
+        source = unquote(self.headers["x-amz-copy-source"]).lstrip("/").split("/", 1)[1]
+        if source not in self.server.objects:
+            return self.reply(404, b"NoSuchKey")
+        if self.headers.get("x-amz-copy-source-if-match", self.etag(source)) != self.etag(source):
+            return self.reply(412, b"PreconditionFailed")
+        self.server.objects[self.key()] = self.server.objects[source]
+        result = (
+            f"<CopyObjectResult><ETag>{self.etag(source)}</ETag>"
+            "<LastModified>2026-01-01T00:00:00.000Z</LastModified></CopyObjectResult>"
+        )
+        self.reply(200, result.encode(), [("Content-Type", "application/xml")])
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_GET(self):
+        if self.key() not in self.server.objects:
+            return self.reply(404)
+        body, content_type = self.server.objects[self.key()]
+        status_code = 200
+        if self.headers.get("Range"):
+            start, end = self.headers["Range"].removeprefix("bytes=").split("-")
+            body, status_code = body[int(start) : int(end) + 1], 206
+        headers = [("Content-Type", content_type), ("ETag", self.etag(self.key()))]
+        if self.command == "HEAD":
+            self.send_response(status_code)
+            for name, value in headers:
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(body)))
+            return self.end_headers()
+        self.reply(status_code, body, headers)
+
+    def do_DELETE(self):
+        self.server.objects.pop(self.key(), None)
+        self.reply(204)
+
+
+def png_bytes():
+    buffer = io.BytesIO()
+    Image.new("RGB", (4, 4), "red").save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class DirectUploadTestCase(APITestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), S3StubHandler)
+        cls.server.objects = {}
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.addClassCleanup(cls.server.shutdown)
+        storage = {
+            "BACKEND": "storages.backends.s3.S3Storage",
+            "OPTIONS": {
+                "bucket_name": "media",
+                "endpoint_url": f"http://127.0.0.1:{cls.server.server_port}",
+                "access_key": "stub",
+                "secret_key": "stub",
+                "region_name": "auto",
+                "addressing_style": "path",
+                "default_acl": "public-read",
+                "querystring_auth": False,
+                "object_parameters": {"CacheControl": "max-age=31536000"},
+            },
+        }
+        cls.local_storages = settings.STORAGES
+        cls.enterClassContext(
+            override_settings(STORAGES={**settings.STORAGES, "default": storage})
+        )
+
+    def setUp(self):
+        from shops.models import Product, Shop
+
+        self.owner = get_user_model().objects.create_user(username="ana")
+        self.shop = Shop.objects.create(owner=self.owner, name="Tienda Ana", location="Caracas")
+        self.product = Product.objects.create(shop=self.shop, name="Lámpara", price="12.50")
+        self.client.force_authenticate(self.owner)
+        self.server.objects.clear()
+
+    def upload(self, path, filename, data):
+        """Presign at ``path``, PUT ``data`` to the stub; returns (form, bucket response)."""
+        with throttling_disabled():
+            response = self.client.post(f"{path}upload/", {"filename": filename}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.content)
+        form = response.json()
+        form["key"] = unquote(urlsplit(form["url"]).path.split("/", 2)[2])
+        sent = urllib3.request(form["method"], form["url"], body=data, headers=form["headers"])
+        return form, sent
+
+    def confirm(self, path, form):
+        with throttling_disabled():
+            return self.client.post(f"{path}confirm/", {"upload": form["upload"]}, format="json")
+
+    def test_shop_image_goes_straight_to_the_bucket(self):
+        path = f"/api/v1/market/shops/{self.shop.pk}/image/"
+        form, sent = self.upload(path, "fachada.png", png_bytes())
+        self.assertEqual(sent.status, 200)
+        self.assertEqual(form["headers"]["Cache-Control"], "max-age=31536000")
+        self.assertTrue(form["key"].startswith("staging/") and form["key"].endswith(".png"))
+        self.assertEqual(self.server.objects[form["key"]][1], "image/png")
+
+        response = self.confirm(path, form)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        self.shop.refresh_from_db()
+        key = self.shop.image.name
+        self.assertTrue(key.startswith("shops/tienda-ana_") and key.endswith(".png"))
+        self.assertTrue(response.json()["image"].endswith(key))
+        self.assertEqual(self.server.objects[key], (png_bytes(), "image/png"))
+        self.assertNotIn(form["key"], self.server.objects)
+
+        # The URL is still valid, but cannot replace the confirmed image.
+        sent = urllib3.request("PUT", form["url"], body=b"<html>", headers=form["headers"])
+        self.assertEqual(sent.status, 200)
+        self.assertEqual(self.server.objects[key][0], png_bytes())
+        self.assertEqual(self.confirm(path, form).status_code, status.HTTP_400_BAD_REQUEST)
+        self.shop.refresh_from_db()
+        self.assertEqual(self.shop.image.name, key)
+
+    def test_product_and_avatar_uploads(self):
+        path = f"/api/v1/market/products/{self.product.pk}/image/"
+        form, _ = self.upload(path, "lampara.jpg", b"\xff\xd8\xff\xe0" + b"\0" * 64)
+        self.assertEqual(self.confirm(path, form).status_code, status.HTTP_200_OK)
+        self.product.refresh_from_db()
+        self.assertTrue(self.product.image.name.startswith("products/tienda-ana/lampara_"))
+
+        path = "/api/v1/auth/profile/avatar/"
+        form, _ = self.upload(path, "yo.webp", b"RIFF\0\0\0\0WEBPVP8 " + b"\0" * 32)
+        response = self.confirm(path, form)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        self.owner.refresh_from_db()
+        self.assertTrue(self.owner.avatar.name.startswith("avatars/ana_"))
+
+    def test_rejected_uploads(self):
+        from api import uploads
+
+        path = f"/api/v1/market/shops/{self.shop.pk}/image/"
+        # Not a PNG: the object is deleted and nothing is attached.
+        form, _ = self.upload(path, "fachada.png", b"<html>no soy una imagen</html>")
+        response = self.confirm(path, form)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertNotIn(form["key"], self.server.objects)
+        self.shop.refresh_from_db()
+        self.assertFalse(self.shop.image)
+
+        # Oversized files reach the bucket, but are deleted on confirmation.
+        with mock.patch.object(uploads, "MAX_UPLOAD_SIZE", 16):
+            form, sent = self.upload(path, "fachada.png", png_bytes())
+            self.assertEqual(sent.status, 200)
+            self.assertEqual(self.confirm(path, form).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertNotIn(form["key"], self.server.objects)
+
+        # An object replaced after the checks is not copied.
+        form, _ = self.upload(path, "fachada.png", png_bytes())
+        with mock.patch.object(uploads, "check_object", return_value='"replaced"'):
+            self.assertEqual(self.confirm(path, form).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(list(self.server.objects), [])
+
+        # The signed content type must be sent with the PUT.
+        form, _ = self.upload(path, "fachada.png", png_bytes())
+        sent = urllib3.request("PUT", form["url"], body=png_bytes())
+        self.assertEqual(sent.status, 403)
+
+        # Tokens are bound to their object, and only the owner may upload.
+        product_path = f"/api/v1/market/products/{self.product.pk}/image/"
+        form, _ = self.upload(product_path, "lampara.png", png_bytes())
+        self.assertEqual(self.confirm(path, form).status_code, status.HTTP_400_BAD_REQUEST)
+        with throttling_disabled():
+            for filename in ("x.gif", ["x.png"], None):
+                response = self.client.post(
+                    f"{path}upload/", {"filename": filename}, format="json"
+                )
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.client.force_authenticate(get_user_model().objects.create_user(username="otro"))
+            response = self.client.post(f"{path}upload/", {"filename": "x.png"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_local_storage_has_no_direct_uploads(self):
+        with override_settings(STORAGES=self.local_storages), throttling_disabled():
+            response = self.client.post(
+                "/api/v1/auth/profile/avatar/upload/", {"filename": "yo.png"}, format="json"
+            )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
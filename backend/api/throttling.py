@@ -0,0 +1,117 @@
+"""
+Sliding-window rate limiting on shared cache counters.
+
+DRF's ``SimpleRateThrottle`` keeps a list of request timestamps per client
+and rewrites it on every request, and with the per-process locmem cache each
+worker enforces its own copy of the limit. ``SlidingWindowThrottle`` keeps
+one integer per client and window instead (``cache.add()`` + ``cache.incr()``,
+both atomic on Redis), so a check costs the same few cache calls whatever
+the rate, and all workers share the counters once ``REDIS_URL`` is set.
+
+The request count over the last ``duration`` seconds is estimated as the
+current fixed window's count plus the previous window's count weighted by
+how much of it still overlaps the sliding window.
+
+Rates come from ``DEFAULT_THROTTLE_RATES``. A view with a ``throttle_scope``
+(or a ``read_throttle_scope``, for GET/HEAD/OPTIONS only) uses that scope's
+rate instead of the ``anon``/``user`` one, and a scope may list several rates
+(e.g. ``["5/min", "30/day"]``) that must all pass.
+"""
+
+import time
+
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_rate(rate):
+    """``"100/day"`` -> ``(100, 86400)``."""
+    num, period = rate.split("/")
+    return int(num), PERIODS[period[0]]
+
+
+class SlidingWindowThrottle(BaseThrottle):
+    cache = cache
+    timer = time.time
+    key_prefix = "throttle"
+
+    def get_scope(self, request, view):
+        scope = getattr(view, "throttle_scope", None)
+        if request.method in SAFE_METHODS:
+            scope = getattr(view, "read_throttle_scope", None) or scope
+        if scope:
+            return scope
+        return "user" if request.user and request.user.is_authenticated else "anon"
+
+    def get_rates(self, scope):
+        try:
+            rates = api_settings.DEFAULT_THROTTLE_RATES[scope]
+        except KeyError:
+            raise ImproperlyConfigured(f"No default throttle rate set for '{scope}' scope")
+        if rates is None:
+            return []
+        if isinstance(rates, str):
+            rates = [rates]
+        return [parse_rate(rate) for rate in rates]
+
+    def get_client(self, request):
+        if request.user and request.user.is_authenticated:
+            return f"user-{request.user.pk}"
+        return self.get_ident(request)
+
+    def allow_request(self, request, view):
+        scope = self.get_scope(request, view)
+        client = self.get_client(request)
+        now = self.timer()
+        counted = []
+        for num_requests, duration in self.get_rates(scope):
+            key = f"{self.key_prefix}:{scope}:{duration}:{client}"
+            current_key, wait = self.hit(key, num_requests, duration, now)
+            counted.append(current_key)
+            if wait is not None:
+                # Rejected requests do not count against the client.
+                for counter in counted:
+                    self.uncount(counter)
+                self.wait_seconds = wait
+                return False
+        return True
+
+    def hit(self, key, num_requests, duration, now):
+        """
+        Count one request; returns ``(counter key, None)`` when it is within
+        ``num_requests`` per ``duration``, or ``(counter key, seconds to wait)``.
+        """
+        window, offset = divmod(now, duration)
+        window = int(window)
+        current_key = f"{key}:{window}"
+        previous = self.cache.get(f"{key}:{window - 1}", 0)
+        # Counters must outlive their window to serve as the next "previous".
+        self.cache.add(current_key, 0, duration * 2)
+        try:
+            current = self.cache.incr(current_key)
+        except ValueError:  # expired between add() and incr()
+            self.cache.set(current_key, 1, duration * 2)
+            current = 1
+
+        overlap = 1 - offset / duration
+        if previous * overlap + current <= num_requests:
+            return current_key, None
+        if current > num_requests:
+            return current_key, duration - offset
+        # Wait until enough of the previous window has slid out.
+        needed = 1 - (num_requests - current) / previous
+        return current_key, max(needed * duration - offset, 0)
+
+    def uncount(self, current_key):
+        try:
+            self.cache.decr(current_key)
+        except ValueError:
+            pass
+
+    def wait(self):
+        return getattr(self, "wait_seconds", None)
@@ -0,0 +1,198 @@
+"""
+Direct-to-storage image uploads.
+
+Uploading through the API holds a worker for the whole transfer. Instead the
+client asks for an upload (``presign()``), PUTs the file straight to the
+bucket with the returned presigned URL, then confirms it (``confirm()``):
+
+1. ``POST .../image/upload/ {"filename": "photo.png"}`` returns the
+   presigned ``url``, the ``headers`` to send with the PUT (the content type
+   is part of the signature) and a signed ``upload`` token. The URL is for a
+   random key under ``STAGING_DIR``, not for the image's final key.
+2. ``POST .../image/confirm/ {"upload": token}`` checks the staged object
+   with a HEAD request (existence, at most ``MAX_UPLOAD_SIZE`` bytes) and a
+   ranged GET of its first bytes (the image signature must match the
+   extension), copies it to the key the model field's ``upload_to``
+   computes, only if its ETag is still the one checked, and saves that key
+   on the model, which schedules the derivatives as any other upload does
+   (``api.images``). The staged object is deleted either way.
+
+The presigned URL stays valid until it expires, but a PUT after the
+confirmation only recreates a staging object, which nothing refers to; a
+bucket lifecycle rule on ``STAGING_DIR`` should expire those.
+
+A presigned PUT cannot limit the size of the body, so the limit is enforced
+by ``confirm()``. Presigned POST policies can, but Cloudflare R2 does not
+implement them. Only S3-compatible storage (``USE_S3``) supports presigned
+URLs; with the local file storage both endpoints answer 400 and images are
+uploaded as multipart fields instead.
+"""
+
+import os
+import uuid
+
+from botocore.exceptions import ClientError
+from django.conf import settings
+from django.core import signing
+from django.core.files.storage import default_storage
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from storages.utils import clean_name, safe_join
+
+from .validators import FILE_SIZE_MESSAGE, IMAGE_CONTENT_TYPES, MAX_UPLOAD_SIZE
+
+SALT = "api.uploads"
+
+# Where presigned PUTs land until confirm() checks and copies them
+STAGING_DIR = "staging"
+
+# Leading bytes of each accepted content type
+SIGNATURES = {
+    "image/jpeg": lambda head: head.startswith(b"\xff\xd8\xff"),
+    "image/png": lambda head: head.startswith(b"\x89PNG\r\n\x1a\n"),
+    "image/webp": lambda head: head[:4] == b"RIFF" and head[8:12] == b"WEBP",
+}
+HEADER_BYTES = 16
+
+
+class UploadError(Exception):
+    pass
+
+
+def bucket_storage():
+    storage = default_storage
+    if getattr(storage, "bucket_name", None) is None:
+        raise UploadError("Direct uploads need object storage; upload the image as a file.")
+    return storage
+
+
+def object_key(storage, name):
+    """The bucket key ``storage`` stores ``name`` under."""
+    return safe_join(storage.location, clean_name(name))
+
+
+def presign(instance, field_name, filename):
+    """A presigned PUT for a new image of ``instance.<field_name>``."""
+    storage = bucket_storage()
+    if not isinstance(filename, str):
+        raise UploadError("Send the image's 'filename'.")
+    extension = os.path.splitext(filename)[1].lower()
+    content_type = IMAGE_CONTENT_TYPES.get(extension)
+    if content_type is None:
+        raise UploadError("Unsupported file extension. Allowed: jpg, jpeg, png, webp")
+    name = instance._meta.get_field(field_name).generate_filename(instance, filename)
+    staging = f"{STAGING_DIR}/{uuid.uuid4().hex}{extension}"
+    params = {"ContentType": content_type}
+    headers = {"Content-Type": content_type}
+    cache_control = storage.object_parameters.get("CacheControl")
+    if cache_control:
+        params["CacheControl"] = cache_control
+        headers["Cache-Control"] = cache_control
+    url = storage.connection.meta.client.generate_presigned_url(
+        "put_object",
+        Params={"Bucket": storage.bucket_name, "Key": object_key(storage, staging), **params},
+        ExpiresIn=settings.DIRECT_UPLOAD_EXPIRES,
+    )
+    token = signing.dumps(
+        {
+            "model": instance._meta.label,
+            "pk": instance.pk,
+            "field": field_name,
+            "name": name,
+            "staging": staging,
+        },
+        salt=SALT,
+    )
+    return {
+        "method": "PUT",
+        "url": url,
+        "headers": headers,
+        "upload": token,
+        "max_size": MAX_UPLOAD_SIZE,
+        "expires_in": settings.DIRECT_UPLOAD_EXPIRES,
+    }
+
+
+def check_object(storage, name):
+    """
+    Raise UploadError unless the uploaded object is an image within the
+    limits; returns its ETag.
+    """
+    client = storage.connection.meta.client
+    key = object_key(storage, name)
+    try:
+        head = client.head_object(Bucket=storage.bucket_name, Key=key)
+    except ClientError:
+        raise UploadError("The file was not uploaded.")
+    if not 0 < head["ContentLength"] <= MAX_UPLOAD_SIZE:
+        raise UploadError(FILE_SIZE_MESSAGE)
+    expected = IMAGE_CONTENT_TYPES[os.path.splitext(name)[1].lower()]
+    body = client.get_object(
+        Bucket=storage.bucket_name, Key=key, Range=f"bytes=0-{HEADER_BYTES - 1}"
+    )["Body"]
+    with body:
+        header = body.read(HEADER_BYTES)
+    if not SIGNATURES[expected](header):
+        raise UploadError(f"The file is not a valid {expected.split('/')[1].upper()} image.")
+    return head["ETag"]
+
+
+def publish(storage, staging, name):
+    """Check the staged upload and copy it to ``name``; the staged object is deleted."""
+    try:
+        etag = check_object(storage, staging)
+        try:
+            # Fails if the object was replaced after the checks.
+            storage.connection.meta.client.copy_object(
+                Bucket=storage.bucket_name,
+                Key=object_key(storage, name),
+                CopySource={"Bucket": storage.bucket_name, "Key": object_key(storage, staging)},
+                CopySourceIfMatch=etag,
+            )
+        except ClientError:
+            raise UploadError("The file changed while it was being checked; upload it again.")
+    finally:
+        storage.delete(staging)
+
+
+def confirm(instance, field_name, token):
+    """Attach the object uploaded for ``token`` to ``instance.<field_name>``."""
+    storage = bucket_storage()
+    try:
+        # Uploads may finish a while after the URL expired (S3 checks it at the start).
+        upload = signing.loads(str(token), salt=SALT, max_age=settings.DIRECT_UPLOAD_EXPIRES * 2)
+    except signing.BadSignature:
+        raise UploadError("Invalid or expired upload.")
+    issued_for = (upload["model"], upload["pk"], upload["field"])
+    if issued_for != (instance._meta.label, instance.pk, field_name):
+        raise UploadError("This upload was issued for another object.")
+    publish(storage, upload["staging"], upload["name"])
+    setattr(instance, field_name, upload["name"])
+    update_fields = [field_name]
+    if any(f.name == "updated_at" for f in instance._meta.concrete_fields):
+        update_fields.append("updated_at")
+    instance.save(update_fields=update_fields)
+    return instance
+
+
+class DirectUploadMixin:
+    """``image/upload/`` and ``image/confirm/`` actions for a viewset's ``upload_field``."""
+
+    upload_field = "image"
+
+    @action(detail=True, methods=["post"], url_path="image/upload")
+    def image_upload(self, request, pk=None):
+        try:
+            data = presign(self.get_object(), self.upload_field, request.data.get("filename"))
+        except UploadError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=["post"], url_path="image/confirm")
+    def image_confirm(self, request, pk=None):
+        try:
+            instance = confirm(self.get_object(), self.upload_field, request.data.get("upload"))
+        except UploadError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(self.get_serializer(instance).data)
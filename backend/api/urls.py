@@ -1,6 +1,7 @@
 from django.urls import path
-from .views import hello_world
+from .views import BatchView, hello_world
 
 urlpatterns = [
     path("hello/", hello_world, name="hello_world"),
+    path("batch/", BatchView.as_view(), name="batch"),
 ]
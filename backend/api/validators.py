@@ -1,21 +1,31 @@
 import os
 from django.core.exceptions import ValidationError
 
+# 5MB limit
+MAX_UPLOAD_SIZE = 5 * 1024 * 1024
+FILE_SIZE_MESSAGE = "The maximum file size that can be uploaded is 5MB"
+
+IMAGE_CONTENT_TYPES = {
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".webp": "image/webp",
+}
+
 def validate_file_size(value):
     if not value:
         return value
     filesize = value.size
     
-    # 5MB limit
-    if filesize > 5 * 1024 * 1024:
-        raise ValidationError("The maximum file size that can be uploaded is 5MB")
+    if filesize > MAX_UPLOAD_SIZE:
+        raise ValidationError(FILE_SIZE_MESSAGE)
     return value
 
 def validate_image_extension(value):
     if not value or not hasattr(value, 'name'):
         return value
     ext = os.path.splitext(value.name)[1]
-    valid_extensions = ['.jpg', '.jpeg', '.png', '.webp']
+    valid_extensions = list(IMAGE_CONTENT_TYPES)
     if not ext.lower() in valid_extensions:
         raise ValidationError('Unsupported file extension. Allowed: jpg, jpeg, png, webp')
     return value
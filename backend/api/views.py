@@ -1,9 +1,58 @@
+from django.conf import settings
+from django.http import HttpResponse
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from . import batch
 
 
 @api_view(["GET"])
 @permission_classes([AllowAny])
 def hello_world(request):
     return Response({"message": "Hello from Django Rest Framework!"})
+
+
+class BatchView(APIView):
+    """
+    Runs ``{"requests": [{"method": "GET", "path": "/api/v1/...", "body":
+    ..., "headers": {...}}]}`` in-process and returns ``{"responses":
+    [{"status": ..., "headers": {...}, "body": ...}]}`` in the same order.
+    At most ``BATCH_MAX_REQUESTS`` sub-requests per batch. See ``api.batch``.
+    """
+
+    permission_classes = [AllowAny]
+    # On top of the sub-requests, which are throttled by their own views.
+    throttle_scope = "batch"
+
+    def post(self, request):
+        items = request.data.get("requests") if isinstance(request.data, dict) else None
+        if not isinstance(items, list) or not items:
+            raise ValidationError({"requests": "Must be a non-empty list."})
+        if len(items) > settings.BATCH_MAX_REQUESTS:
+            raise ValidationError(
+                {"requests": f"At most {settings.BATCH_MAX_REQUESTS} per batch."}
+            )
+        for i, item in enumerate(items):
+            if not isinstance(item, dict) or not isinstance(item.get("path"), str):
+                raise ValidationError({"requests": f"Item {i} needs a path."})
+            item["method"] = str(item.get("method", "GET")).upper()
+            if item["method"] not in batch.METHODS:
+                raise ValidationError({"requests": f"Item {i}: unsupported method."})
+            headers = item.get("headers") or {}
+            if not isinstance(headers, dict):
+                raise ValidationError({"requests": f"Item {i}: headers must be an object."})
+            allowed = {header.lower() for header in batch.ALLOWED_HEADERS}
+            for header in headers:
+                if header.lower() not in allowed:
+                    raise ValidationError(
+                        {"requests": f"Item {i}: the {header} header cannot be set."}
+                    )
+
+        responses = batch.run(request, items)
+        return HttpResponse(
+            b'{"responses": [' + b", ".join(responses) + b"]}",
+            content_type="application/json",
+        )
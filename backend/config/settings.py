@@ -61,13 +61,16 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "api.middleware.ServerTimingMiddleware",
     "django.middleware.security.SecurityMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",
+    "api.middleware.WhiteNoiseMiddleware",
+    "api.middleware.CompressionMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "api.middleware.ReplicaMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -125,6 +128,33 @@ if not os.getenv("DATABASE_URL") and not os.getenv("DB_NAME"):
         }
     }
 
+# Read replicas (api.replicas): comma-separated URLs of databases replicating
+# "default". Safe requests to REPLICA_PATHS read from one of them; a client
+# that wrote anything reads from "default" for REPLICA_PIN_SECONDS.
+REPLICA_DATABASES = []
+for index, url in enumerate(filter(None, os.getenv("DATABASE_REPLICA_URLS", "").split(",")), 1):
+    alias = f"replica{index}"
+    DATABASES[alias] = dj_database_url.parse(url, conn_max_age=600)
+    # Tests read and write the one test database.
+    DATABASES[alias]["TEST"] = {"MIRROR": "default"}
+    REPLICA_DATABASES.append(alias)
+if REPLICA_DATABASES:
+    DATABASE_ROUTERS = ["api.replicas.ReplicaRouter"]
+REPLICA_PATHS = ("/api/v1/market/", "/api/v1/auth/", "/api/market/", "/api/auth/")
+REPLICA_PIN_SECONDS = int(os.getenv("REPLICA_PIN_SECONDS", "5"))
+
+# Cache
+# Rate-limit counters and cached users must be shared by all workers, so use
+# Redis when it is available; locmem (one cache per process) otherwise.
+
+if os.getenv("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.getenv("REDIS_URL"),
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -174,24 +204,39 @@ if os.getenv("CORS_ALLOWED_ORIGINS"):
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "users.authentication.CachedJWTAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
     "DEFAULT_THROTTLE_CLASSES": [
-        "rest_framework.throttling.AnonRateThrottle",
-        "rest_framework.throttling.UserRateThrottle",
+        "api.throttling.SlidingWindowThrottle",
     ],
+    # Views with a ``throttle_scope`` use that scope's rates instead of the
+    # anon/user ones; every rate listed for a scope must pass.
     "DEFAULT_THROTTLE_RATES": {
         "anon": "100/day",
         "user": "1000/day",
+        "login": ["5/min", "30/day"],
+        "catalog": "120/min",
+        "export": ["2/min", "10/hour"],
+        "autocomplete": "300/min",
+        "reservations": "120/min",
+        "batch": "60/min",
     },
+    # Proxies in front of the app. Clients are told apart by the address the
+    # outermost one appended to X-Forwarded-For; unset, the whole header is
+    # used, and clients can vary it at will.
+    "NUM_PROXIES": int(os.environ["NUM_PROXIES"]) if os.getenv("NUM_PROXIES") else None,
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 20,
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
 }
 
+# Load tests (manage.py benchmark_servers) would trip the rate limits at once.
+if os.getenv("THROTTLING", "True") == "False":
+    REST_FRAMEWORK["DEFAULT_THROTTLE_CLASSES"] = []
+
 SPECTACULAR_SETTINGS = {
     "TITLE": "Buskalo API",
     "DESCRIPTION": "API for Buskalo Market",
@@ -208,6 +253,37 @@ SIMPLE_JWT = {
     "AUTH_HEADER_TYPES": ("Bearer",),
 }
 
+# Seconds an authenticated user is cached by users.authentication; saves
+# invalidate it, this bounds staleness when the cache is per process (no REDIS_URL).
+AUTH_USER_CACHE_TIMEOUT = int(os.getenv("AUTH_USER_CACHE_TIMEOUT", "60"))
+
+# API response compression (api.middleware.CompressionMiddleware). Brotli
+# quality 0-11, gzip level 1-9; higher is smaller but costs more CPU.
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_LEVELS = {
+    "br": int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4")),
+    "gzip": int(os.getenv("COMPRESSION_GZIP_LEVEL", "6")),
+}
+
+# List pages of the catalog serialized from .values() rows (api.fastpath);
+# turn off to compare against the plain DRF serializers.
+FAST_LIST_SERIALIZATION = os.getenv("FAST_LIST_SERIALIZATION", "True") == "True"
+
+# Seconds the facet counts of unsearched product lists are cached (shops.facets)
+FACETS_CACHE_TIMEOUT = int(os.getenv("FACETS_CACHE_TIMEOUT", "60"))
+
+# Seconds stock stays held by an uncommitted reservation (shops.stock)
+STOCK_RESERVATION_TTL = int(os.getenv("STOCK_RESERVATION_TTL", "600"))
+
+# How often each process checks the shared change log of the autocomplete
+# index (shops.autocomplete), i.e. how stale other workers' suggestions get.
+AUTOCOMPLETE_SYNC_INTERVAL = float(os.getenv("AUTOCOMPLETE_SYNC_INTERVAL", "1"))
+
+# POST /api/v1/batch/ (api.batch): sub-requests allowed per batch, and the
+# threads that run consecutive reads of a batch at the same time.
+BATCH_MAX_REQUESTS = int(os.getenv("BATCH_MAX_REQUESTS", "20"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 # Media Storage (Cloudflare R2)
@@ -256,6 +332,31 @@ else:
     MEDIA_URL = "/media/"
     MEDIA_ROOT = BASE_DIR / "media"
 
+# Seconds a presigned direct upload URL stays valid (api.uploads)
+DIRECT_UPLOAD_EXPIRES = int(os.getenv("DIRECT_UPLOAD_EXPIRES", "600"))
+
+# Background tasks (api.tasks): in-process thread pool for work that must not
+# hold up a request, e.g. image derivatives.
+BACKGROUND_TASK_WORKERS = int(os.getenv("BACKGROUND_TASK_WORKERS", "2"))
+
+# Native async catalog reads (shops.async_views). config/asgi.py turns this on,
+# so it only applies when served by uvicorn (opt-in, see README); under WSGI
+# (gunicorn, the default) the views stay sync.
+ASYNC_VIEWS = os.getenv("ASYNC_VIEWS", "False") == "True"
+
+# DATABASE_POOLER=True when the databases sit behind a pooler (e.g. PgBouncer):
+# connections are then closed after each request and reused by the pooler.
+# Under ASGI each request runs the ORM in its own thread, so without a pooler
+# every request opens a new connection whatever CONN_MAX_AGE says.
+if os.getenv("DATABASE_POOLER", "False") == "True":
+    for database in DATABASES.values():
+        database["CONN_MAX_AGE"] = 0
+
+# Per-request profiling (api.middleware.ServerTimingMiddleware): fraction of
+# requests that get a Server-Timing header and a profile log line. 0 disables
+# the middleware; a small rate (e.g. 0.01) is cheap enough for production.
+SERVER_TIMING_SAMPLE_RATE = float(os.getenv("SERVER_TIMING_SAMPLE_RATE", "0"))
+
 # Logging configuration
 LOGGING = {
     "version": 1,
@@ -286,5 +387,10 @@ LOGGING = {
             "level": os.getenv("DJANGO_LOG_LEVEL", "INFO"),
             "propagate": False,
         },
+        "api.profiling": {
+            "handlers": ["console"],
+            "level": "INFO",
+            "propagate": False,
+        },
     },
 }
@@ -1,5 +1,13 @@
 from django.contrib import admin
-from .models import Shop, Product, Category
+from . import stock
+from .models import (
+    Category,
+    Product,
+    Shop,
+    ShopResetJob,
+    StockReservation,
+    StockReservationItem,
+)
 
 
 @admin.register(Shop)
@@ -14,8 +22,32 @@ class ProductAdmin(admin.ModelAdmin):
     list_filter = ("shop", "category")
     search_fields = ("name", "description")
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if change and "stock" in form.changed_data:
+            stock.adjust_stock(obj, form.cleaned_data["stock"] - form.initial["stock"])
+
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ("name",)
     search_fields = ("name",)
+
+
+@admin.register(ShopResetJob)
+class ShopResetJobAdmin(admin.ModelAdmin):
+    list_display = ("shop", "status", "deleted", "total", "created_at", "finished_at")
+    list_filter = ("status",)
+
+
+class StockReservationItemInline(admin.TabularInline):
+    model = StockReservationItem
+    raw_id_fields = ("product",)
+    extra = 0
+
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ("pk", "user", "status", "expires_at", "created_at")
+    list_filter = ("status",)
+    inlines = [StockReservationItemInline]
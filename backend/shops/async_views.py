@@ -0,0 +1,123 @@
+"""
+Native async list/retrieve for the hot catalog reads under ASGI.
+
+With ``ASYNC_VIEWS`` on (the ASGI entry point turns it on), ``as_view()``
+returns a coroutine view for the viewset routes whose GET action is in
+``async_actions``. GET/HEAD requests are then handled on the event loop: the
+queryset is evaluated with the async ORM, while serialization and rendering
+run inline, as they do no I/O once related rows are joined or prefetched.
+Other methods on the same route (POST, PUT, DELETE) still go to the regular
+DRF view through ``sync_to_async``.
+
+Authentication, throttling and building the queryset (the search backend may
+introspect the database once) are done in a single ``sync_to_async`` hop.
+Under WSGI ``ASYNC_VIEWS`` stays off and nothing here is used.
+"""
+
+from functools import update_wrapper
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.http import Http404, HttpResponse
+from rest_framework.response import Response
+
+from api import profiling
+
+
+class AsyncReadMixin:
+    async_actions = ("list", "retrieve")
+
+    @classmethod
+    def as_view(cls, actions=None, **initkwargs):
+        view = super().as_view(actions, **initkwargs)
+        if not getattr(settings, "ASYNC_VIEWS", False):
+            return view
+        action = (actions or {}).get("get")
+        if action not in cls.async_actions:
+            return view
+        sync_view = sync_to_async(view)
+
+        async def async_view(request, *args, **kwargs):
+            if request.method in ("GET", "HEAD"):
+                return await cls.async_dispatch(
+                    request, action, args, kwargs, initkwargs, actions
+                )
+            return await sync_view(request, *args, **kwargs)
+
+        update_wrapper(async_view, view)
+        return async_view
+
+    @classmethod
+    async def async_dispatch(cls, request, action, args, kwargs, initkwargs, actions):
+        """``ViewSetMixin.as_view()`` + ``APIView.dispatch()`` for one async action."""
+        self = cls(**initkwargs)
+        self.action_map = {**actions, "head": action}
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.prepare_read)(request, *args, **kwargs)
+            handler = getattr(self, f"a{action}")
+            response = await handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        response = self.finalize_response(request, response, *args, **kwargs)
+        if not isinstance(response, Response):
+            return response  # e.g. a 304 from the conditional GET
+        profile = profiling.current.get()
+        if profile is None:
+            response.render()
+        else:
+            with profile.phase("render"):
+                response.render()
+        # Django's async handler renders template responses (even rendered
+        # ones) through sync_to_async; a plain HttpResponse skips that hop.
+        plain = HttpResponse(response.content, status=response.status_code)
+        for header, value in response.items():
+            plain[header] = value
+        return plain
+
+    def prepare_read(self, request, *args, **kwargs):
+        self.initial(request, *args, **kwargs)
+        self.read_queryset = self.filter_queryset(self.get_queryset())
+
+    async def alist(self, request, *args, **kwargs):
+        queryset = self.read_queryset
+        page = await self.apaginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        serializer = self.get_serializer([obj async for obj in queryset], many=True)
+        return Response(serializer.data)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        instance = await self.aget_object()
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data)
+
+    async def apaginate_queryset(self, queryset):
+        paginator = self.paginator
+        if paginator is None:
+            return None
+        if hasattr(paginator, "apaginate_queryset"):
+            return await paginator.apaginate_queryset(queryset, self.request, view=self)
+        return await sync_to_async(paginator.paginate_queryset)(
+            queryset, self.request, view=self
+        )
+
+    async def aget_object(self):
+        """``GenericAPIView.get_object()`` with an async lookup."""
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        filter_kwargs = {self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        queryset = self.read_queryset
+        try:
+            obj = await queryset.aget(**filter_kwargs)
+        except (queryset.model.DoesNotExist, TypeError, ValueError, DjangoValidationError):
+            raise Http404
+        self.check_object_permissions(self.request, obj)
+        return obj
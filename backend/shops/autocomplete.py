@@ -0,0 +1,273 @@
+"""
+Typeahead suggestions from an in-process prefix index.
+
+Each process keeps, per kind (products, shops, categories), two sorted lists
+of ``(folded text, pk)``: one keyed by the whole name and one by the rest of
+the name from every later word, so "usb" also finds "Cargador USB-C". Text
+is accent-folded like the search index (``search.tokenize``). A lookup is a
+binary search plus a scan of at most ``limit`` matches, whatever the catalog
+size, and never touches the database.
+
+The index is built from the database on first use. Writes call ``changed()``,
+which after commit re-reads the changed rows into this process's index and
+appends their keys to a change log in the shared cache, in slices of at most
+``MAX_REPLAY``. Other processes replay that log on their lookups (checking at
+most every ``AUTOCOMPLETE_SYNC_INTERVAL`` seconds), at most ``MAX_REPLAY``
+changes per lookup. A process more than ``MAX_LAG`` changes behind, or
+missing log entries that expired, rebuilds its index on a background thread
+(``api.tasks``) and keeps answering from the old one meanwhile, so lookups
+never wait for a rebuild.
+"""
+
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from api.tasks import submit
+
+from . import search
+from .models import Category, Product, Shop
+
+# kind -> (model, extra field kept with each entry)
+KINDS = {
+    "products": (Product, "shop_id"),
+    "shops": (Shop, "status"),
+    "categories": (Category, None),
+}
+MODEL_KINDS = {model: kind for kind, (model, _) in KINDS.items()}
+
+SEQ_KEY = "autocomplete:seq"
+CHANGE_KEY = "autocomplete:change:{}"
+CHANGE_TIMEOUT = 3600
+# Changes replayed per lookup, and per slice of the change log
+MAX_REPLAY = 500
+# Further behind than this, a process rebuilds instead of replaying
+MAX_LAG = 20 * MAX_REPLAY
+
+
+def _discard(keys, item):
+    index = bisect_left(keys, item)
+    if index < len(keys) and keys[index] == item:
+        del keys[index]
+
+
+class PrefixIndex:
+    def __init__(self):
+        self.entries = {}  # pk -> (name, head, words, extra)
+        self.heads = []
+        self.words = []
+
+    @staticmethod
+    def entry(name):
+        tokens = search.tokenize(name)
+        return " ".join(tokens), [" ".join(tokens[i:]) for i in range(1, len(tokens))]
+
+    def load(self, rows):
+        """Bulk-load ``(pk, name, extra)`` rows into an empty index."""
+        for pk, name, extra in rows:
+            head, words = self.entry(name)
+            if not head:
+                continue
+            self.entries[pk] = (name, head, words, extra)
+            self.heads.append((head, pk))
+            self.words.extend((word, pk) for word in words)
+        self.heads.sort()
+        self.words.sort()
+
+    def add(self, pk, name, extra=None):
+        self.remove(pk)
+        head, words = self.entry(name)
+        if not head:
+            return
+        self.entries[pk] = (name, head, words, extra)
+        insort(self.heads, (head, pk))
+        for word in words:
+            insort(self.words, (word, pk))
+
+    def remove(self, pk):
+        entry = self.entries.pop(pk, None)
+        if entry is None:
+            return
+        _, head, words, _ = entry
+        _discard(self.heads, (head, pk))
+        for word in words:
+            _discard(self.words, (word, pk))
+
+    def lookup(self, prefix, limit, accept=None):
+        """
+        Names starting with ``prefix`` first, then names with a word that does.
+        Rows with the same folded name are suggested once.
+        """
+        results = []
+        seen = set()
+        for keys in (self.heads, self.words):
+            position = bisect_left(keys, (prefix,))
+            while position < len(keys) and len(results) < limit:
+                key, pk = keys[position]
+                position += 1
+                if not key.startswith(prefix):
+                    break
+                name, head, _, extra = self.entries[pk]
+                if head in seen or not (accept is None or accept(extra)):
+                    continue
+                seen.add(head)
+                results.append({"id": pk, "name": name})
+        return results
+
+
+class Autocomplete:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.indexes = None
+        self.active_shops = set()
+        self.seq = 0
+        self.checked_at = 0.0
+        self.building = False
+
+    def rows(self, kind, pks=None):
+        model, extra = KINDS[kind]
+        queryset = model.objects.all()
+        if pks is not None:
+            queryset = queryset.filter(pk__in=pks)
+        if extra is None:
+            return [(pk, name, None) for pk, name in queryset.values_list("pk", "name")]
+        return list(queryset.values_list("pk", "name", extra))
+
+    def build(self):
+        # Read first: changes committed while loading are replayed afterwards.
+        seq = cache.get(SEQ_KEY, 0)
+        indexes = {}
+        for kind in KINDS:
+            indexes[kind] = PrefixIndex()
+            indexes[kind].load(self.rows(kind))
+        active_shops = set(Shop.objects.filter(status="active").values_list("pk", flat=True))
+        with self.lock:
+            self.indexes = indexes
+            self.active_shops = active_shops
+            self.seq = seq
+            self.checked_at = time.monotonic()
+
+    def invalidate(self):
+        with self.lock:
+            self.indexes = None
+
+    def rebuild_later(self):
+        """Rebuild on a background thread; lookups use the current index meanwhile."""
+        with self.lock:
+            if self.building:
+                return
+            self.building = True
+        submit(self.rebuild)
+
+    def rebuild(self):
+        try:
+            self.build()
+        finally:
+            self.building = False
+
+    def apply(self, kind, pks):
+        """Re-read ``pks`` of ``kind`` from the database into the index."""
+        if self.indexes is None:
+            return
+        rows = self.rows(kind, pks)
+        with self.lock:
+            if self.indexes is None:
+                return
+            index = self.indexes[kind]
+            for pk in set(pks) - {row[0] for row in rows}:
+                index.remove(pk)
+                if kind == "shops":
+                    self.active_shops.discard(pk)
+            for pk, name, extra in rows:
+                index.add(pk, name, extra)
+                if kind == "shops":
+                    if extra == "active":
+                        self.active_shops.add(pk)
+                    else:
+                        self.active_shops.discard(pk)
+
+    def sync(self):
+        """Replay the shared change log, or rebuild when too far behind or entries are missing."""
+        now = time.monotonic()
+        if now - self.checked_at < settings.AUTOCOMPLETE_SYNC_INTERVAL:
+            return
+        self.checked_at = now
+        seq = cache.get(SEQ_KEY, 0)
+        if seq == self.seq:
+            return
+        if not self.seq < seq <= self.seq + MAX_LAG:
+            return self.rebuild_later()
+        end = min(seq, self.seq + MAX_REPLAY)
+        keys = [CHANGE_KEY.format(n) for n in range(self.seq + 1, end + 1)]
+        changes = cache.get_many(keys)
+        if len(changes) < len(keys):
+            return self.rebuild_later()
+        by_kind = defaultdict(set)
+        for kind, pk in changes.values():
+            by_kind[kind].add(pk)
+        for kind, pks in by_kind.items():
+            self.apply(kind, pks)
+        with self.lock:
+            self.seq = max(self.seq, end)
+            if end < seq:
+                # More to replay: the next lookup carries on at once.
+                self.checked_at = 0.0
+
+    def suggest(self, query, limit):
+        prefix = " ".join(search.tokenize(query))
+        if not prefix:
+            return {kind: [] for kind in KINDS}
+        if self.indexes is None:
+            self.build()
+        else:
+            self.sync()
+        with self.lock:
+            return {
+                "products": self.indexes["products"].lookup(
+                    prefix, limit, lambda shop_id: shop_id in self.active_shops
+                ),
+                "shops": self.indexes["shops"].lookup(
+                    prefix, limit, lambda status: status == "active"
+                ),
+                "categories": self.indexes["categories"].lookup(prefix, limit),
+            }
+
+    def publish(self, kind, pks):
+        for offset in range(0, len(pks), MAX_REPLAY):
+            self.publish_slice(kind, pks[offset : offset + MAX_REPLAY])
+
+    def publish_slice(self, kind, pks):
+        try:
+            end = cache.incr(SEQ_KEY, len(pks))
+        except ValueError:
+            cache.add(SEQ_KEY, 0, None)
+            end = cache.incr(SEQ_KEY, len(pks))
+        start = end - len(pks) + 1
+        cache.set_many(
+            {CHANGE_KEY.format(start + i): (kind, pk) for i, pk in enumerate(pks)},
+            CHANGE_TIMEOUT,
+        )
+        self.apply(kind, pks)
+        with self.lock:
+            if self.seq == start - 1:
+                # Nothing else was logged in between: no need to replay our own.
+                self.seq = end
+
+
+index = Autocomplete()
+
+
+def suggest(query, limit):
+    return index.suggest(query, limit)
+
+
+def changed(model, pks):
+    """Record that rows of ``model`` were saved or deleted (applied on commit)."""
+    pks = list(pks)
+    if pks:
+        transaction.on_commit(lambda: index.publish(MODEL_KINDS[model], pks))
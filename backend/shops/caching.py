@@ -0,0 +1,95 @@
+"""
+HTTP conditional requests for catalog reads.
+
+Views mixing in ``ConditionalGetMixin`` provide a cheap version stamp (one
+indexed lookup or aggregate, never the serialized body). The ETag and
+Last-Modified validators are derived from it, so a matching
+``If-None-Match`` / ``If-Modified-Since`` is answered with a 304 before any
+serialization happens.
+"""
+
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+
+class ConditionalGetMixin:
+    # Seconds shared caches (CDN) may serve anonymous responses without revalidating
+    cache_max_age = 60
+
+    def get_version_stamp(self, request, *args, **kwargs):
+        """
+        Return ``(version, last_modified)`` for the requested resource, or
+        ``None`` to skip conditional handling.
+        """
+        return None
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(super().retrieve, request, *args, **kwargs)
+
+    async def alist(self, request, *args, **kwargs):
+        return await self.aconditional(super().alist, request, *args, **kwargs)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        return await self.aconditional(super().aretrieve, request, *args, **kwargs)
+
+    def conditional(self, handler, request, *args, **kwargs):
+        stamp = self.get_version_stamp(request, *args, **kwargs)
+        if stamp is None:
+            return handler(request, *args, **kwargs)
+
+        etag, timestamp = self.get_validators(request, stamp)
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        return self.patch_conditional_headers(request, response, etag, timestamp)
+
+    def prepare_read(self, request, *args, **kwargs):
+        super().prepare_read(request, *args, **kwargs)
+        # Looked up in the same sync_to_async hop as authentication.
+        self.version_stamp = self.get_version_stamp(request, *args, **kwargs)
+
+    async def aconditional(self, handler, request, *args, **kwargs):
+        """``conditional()`` for the async read path (``shops.async_views``)."""
+        stamp = self.version_stamp
+        if stamp is None:
+            return await handler(request, *args, **kwargs)
+
+        etag, timestamp = self.get_validators(request, stamp)
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = await handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        return self.patch_conditional_headers(request, response, etag, timestamp)
+
+    def get_validators(self, request, stamp):
+        version, last_modified = stamp
+        # Same stamp, different URL (page, ordering) or renderer: different body.
+        key = f"{version}|{request.get_full_path()}|{request.accepted_media_type}"
+        etag = 'W/"%s"' % hashlib.md5(key.encode(), usedforsecurity=False).hexdigest()
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        return etag, timestamp
+
+    def patch_conditional_headers(self, request, response, etag, timestamp):
+        response["ETag"] = etag
+        if timestamp is not None:
+            response["Last-Modified"] = http_date(timestamp)
+        if request.user.is_authenticated:
+            # Always revalidate; the 304 keeps that cheap.
+            patch_cache_control(response, private=True, no_cache=True)
+        else:
+            patch_cache_control(
+                response,
+                public=True,
+                max_age=self.cache_max_age,
+                stale_while_revalidate=self.cache_max_age,
+            )
+        patch_vary_headers(response, ("Accept", "Authorization"))
+        return response
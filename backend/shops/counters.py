@@ -0,0 +1,188 @@
+"""
+Denormalized per-shop product counters: ``Shop.product_count``,
+``in_stock_count``, ``min_price`` and ``max_price``.
+
+Saving or deleting a single product adjusts its shop with one ``UPDATE``
+of F() expressions (the same statement that bumps the shop's version
+stamp, see ``shops.signals``). The deltas compare the product row as it is
+stored, read with ``lock()`` in the writer's transaction, not as it was
+when the instance was loaded, so a reservation or another edit landing in
+between is neither lost nor counted twice. A new price only widens the range; the range is
+recomputed from the products (an index lookup on ``(shop, price)``) only
+when the price that was removed or changed was the shop's minimum or
+maximum.
+
+Bulk writes skip model signals: the importer and the reset apply the same
+``deltas()`` per batch, the dataset generator ``refresh()``-es its shops,
+which recomputes the counters with subqueries. ``manage.py
+repair_shop_counters`` finds and fixes drift left by anything else, e.g.
+``QuerySet.update()`` or fixtures.
+"""
+
+from django.db import models
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Product, Shop
+
+IN_STOCK = models.Q(is_infinite_stock=True) | models.Q(stock__gt=0)
+
+# The product columns that Product.counter_state() depends on
+COUNTED_FIELDS = ("shop_id", "stock", "is_infinite_stock", "price")
+
+# Shop field -> aggregate over the shop's products
+AGGREGATES = {
+    "product_count": lambda: models.Count("pk"),
+    "in_stock_count": lambda: models.Count("pk", filter=IN_STOCK),
+    "min_price": lambda: models.Min("price"),
+    "max_price": lambda: models.Max("price"),
+}
+
+
+def _aggregate(field):
+    """Correlated subquery computing ``field`` for the shop being updated."""
+    value = (
+        Product.objects.filter(shop=models.OuterRef("pk"))
+        .order_by()
+        .values("shop")
+        .annotate(value=AGGREGATES[field]())
+        .values("value")
+    )
+    subquery = models.Subquery(value, output_field=Shop._meta.get_field(field))
+    if field.endswith("_count"):
+        return Coalesce(subquery, 0)
+    return subquery
+
+
+def _bound(field, added, removed):
+    """``min_price``/``max_price`` after the ``added`` prices appear and ``removed`` go."""
+    output_field = Shop._meta.get_field(field)
+    bound = models.F(field)
+    if added:
+        widest, beyond = (min(added), "gt") if field == "min_price" else (max(added), "lt")
+        bound = models.Case(
+            models.When(
+                models.Q(**{f"{field}__isnull": True}) | models.Q(**{f"{field}__{beyond}": widest}),
+                then=models.Value(widest, output_field=output_field),
+            ),
+            default=bound,
+            output_field=output_field,
+        )
+    if removed:
+        # Only a removed extreme needs a look at the remaining products.
+        bound = models.Case(
+            models.When(**{f"{field}__in": sorted(set(removed))}, then=_aggregate(field)),
+            default=bound,
+            output_field=output_field,
+        )
+    return bound
+
+
+def _add(field, delta):
+    if delta > 0:
+        return models.F(field) + delta
+    # Drift must not make a decrement fail the column's >= 0 check.
+    return Greatest(models.F(field) + delta, 0)
+
+
+def lock(pks, using="default"):
+    """``{pk: row}`` of the counted columns, locked until the transaction ends."""
+    rows = (
+        Product.objects.using(using)
+        .select_for_update()
+        .filter(pk__in=list(pks))
+        .order_by("pk")  # the same lock order as shops.stock
+        .values("pk", *COUNTED_FIELDS)
+    )
+    return {row.pop("pk"): row for row in rows}
+
+
+def state(row):
+    """``Product.counter_state()`` of a ``lock()`` row."""
+    return row["shop_id"], row["is_infinite_stock"] or row["stock"] > 0, row["price"]
+
+
+def saved_state(product, row, fields=None):
+    """
+    ``Product.counter_state()`` once ``fields`` of ``product`` (all of them
+    when None) are written over the locked ``row``.
+    """
+    if row is None or fields is None:
+        return product.counter_state()
+    written = {Product._meta.get_field(name).attname for name in fields}
+    return state(
+        {
+            attname: getattr(product, attname) if attname in written else value
+            for attname, value in row.items()
+        }
+    )
+
+
+def no_change():
+    return {"count": 0, "in_stock": 0, "added": [], "removed": []}
+
+
+def deltas(changes):
+    """
+    Counter changes per shop for ``(before, after)`` pairs of
+    ``Product.counter_state()`` tuples, one per product (None when it is
+    created or deleted).
+    """
+    shops = {}
+    for before, after in changes:
+        if before == after:
+            continue
+        for sign, current in ((-1, before), (1, after)):
+            if current is None:
+                continue
+            shop_id, in_stock, price = current
+            change = shops.setdefault(shop_id, no_change())
+            change["count"] += sign
+            change["in_stock"] += sign * in_stock
+            if not (before and after and before[0] == after[0] and before[2] == after[2]):
+                change["added" if sign > 0 else "removed"].append(price)
+    return shops
+
+
+def updates(change):
+    """``QuerySet.update()`` keyword arguments applying one shop's ``change``."""
+    values = {}
+    if change["count"]:
+        values["product_count"] = _add("product_count", change["count"])
+    if change["in_stock"]:
+        values["in_stock_count"] = _add("in_stock_count", change["in_stock"])
+    if change["added"] or change["removed"]:
+        for field in ("min_price", "max_price"):
+            values[field] = _bound(field, change["added"], change["removed"])
+    return values
+
+
+def apply(shops, using="default", **fields):
+    """Write ``deltas()`` to the shops, along with any other ``fields`` (e.g. the stamp)."""
+    for shop_id, change in shops.items():
+        values = {**fields, **updates(change)}
+        if values:
+            Shop.objects.using(using).filter(pk=shop_id).update(**values)
+
+
+def refresh(shop_ids=None, using="default"):
+    """Recompute the counters of ``shop_ids`` (all shops when None) from their products."""
+    queryset = Shop.objects.using(using)
+    if shop_ids is not None:
+        queryset = queryset.filter(pk__in=list(shop_ids))
+    return queryset.update(**{field: _aggregate(field) for field in AGGREGATES})
+
+
+def actual(shop_ids, using="default"):
+    """``{shop_id: {field: value}}`` computed from the products, for verification."""
+    rows = (
+        Product.objects.using(using)
+        .filter(shop_id__in=shop_ids)
+        .order_by()
+        .values("shop_id")
+        .annotate(**{field: make() for field, make in AGGREGATES.items()})
+    )
+    empty = {"product_count": 0, "in_stock_count": 0, "min_price": None, "max_price": None}
+    counts = {shop_id: dict(empty) for shop_id in shop_ids}
+    for row in rows:
+        counts[row.pop("shop_id")] = row
+    return counts
@@ -0,0 +1,102 @@
+"""
+Constant-memory catalog export (NDJSON or CSV).
+
+Rows are read as plain tuples with ``values_list().iterator()`` (a
+server-side cursor on Postgres, chunked fetches on SQLite) and encoded by a
+small per-format function instead of ``ProductSerializer``, so a dump of
+millions of products is streamed with flat memory.
+"""
+
+import csv
+import json
+
+from django.core.files.storage import default_storage
+
+from .models import Product
+
+CHUNK_SIZE = 2000
+
+COLUMNS = (
+    "id",
+    "shop",
+    "shop_name",
+    "category",
+    "category_name",
+    "name",
+    "description",
+    "image",
+    "price",
+    "stock",
+    "is_infinite_stock",
+    "created_at",
+    "updated_at",
+)
+# Database paths for COLUMNS, in the same order
+SOURCES = (
+    "id",
+    "shop_id",
+    "shop__name",
+    "category_id",
+    "category__name",
+    "name",
+    "description",
+    "image",
+    "price",
+    "stock",
+    "is_infinite_stock",
+    "created_at",
+    "updated_at",
+)
+IMAGE = COLUMNS.index("image")
+PRICE = COLUMNS.index("price")
+DATES = (COLUMNS.index("created_at"), COLUMNS.index("updated_at"))
+
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+def export_queryset(shop_id=None):
+    queryset = Product.objects.all()
+    if shop_id:
+        queryset = queryset.filter(shop_id=shop_id)
+    else:
+        queryset = queryset.filter(shop__status="active")
+    return queryset.order_by("pk").values_list(*SOURCES)
+
+
+def normalize(row):
+    """Turn a raw tuple into JSON/CSV-friendly values, matching the API output."""
+    row = list(row)
+    row[IMAGE] = default_storage.url(row[IMAGE]) if row[IMAGE] else None
+    row[PRICE] = str(row[PRICE])
+    for index in DATES:
+        row[index] = row[index].isoformat().replace("+00:00", "Z")
+    return row
+
+
+def ndjson_lines(rows):
+    dumps = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+    for row in rows:
+        yield dumps(dict(zip(COLUMNS, normalize(row)))) + "\n"
+
+
+class Echo:
+    """File-like object whose ``write`` just returns the line csv.writer built."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(COLUMNS)
+    for row in rows:
+        yield writer.writerow(normalize(row))
+
+
+def export_products(fmt, shop_id=None, chunk_size=CHUNK_SIZE):
+    """Yield the encoded export line by line."""
+    rows = export_queryset(shop_id).iterator(chunk_size=chunk_size)
+    return ndjson_lines(rows) if fmt == "ndjson" else csv_lines(rows)
@@ -0,0 +1,157 @@
+"""
+Facet counts next to product results (``?facets=category,price,in_stock``).
+
+All requested facets are computed from one grouped aggregate over the
+filtered queryset: rows are grouped by the keys of every requested facet at
+once (category, price bucket, in-stock flag), which yields at most a few
+hundred rows, and each facet is summed from those rows in Python. An empty
+``?facets=`` asks for all of them.
+
+Facets of lists without a search query (the whole catalog or one shop) are
+the same for every visitor and cached for ``FACETS_CACHE_TIMEOUT`` seconds.
+"""
+
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models
+from rest_framework.exceptions import ValidationError
+
+# Upper edges of the price histogram buckets; the last bucket is open-ended.
+PRICE_BUCKETS = (10, 25, 50, 100, 250, 500, 1000)
+
+
+def _price_bucket():
+    whens = [
+        models.When(price__lt=edge, then=models.Value(index))
+        for index, edge in enumerate(PRICE_BUCKETS)
+    ]
+    return models.Case(*whens, default=models.Value(len(PRICE_BUCKETS)))
+
+
+def _category_facet(rows):
+    counts = Counter()
+    for row in rows:
+        counts[row["category_id"], row["category__name"]] += row["count"]
+    # Most products first; ties by name, uncategorized last.
+    ordered = sorted(
+        counts.items(), key=lambda item: (-item[1], item[0][1] is None, item[0][1])
+    )
+    return [
+        {"id": category_id, "name": name, "count": count}
+        for (category_id, name), count in ordered
+    ]
+
+
+def _price_facet(rows):
+    counts = Counter()
+    for row in rows:
+        counts[row["price_bucket"]] += row["count"]
+    edges = (0, *PRICE_BUCKETS, None)
+    return [
+        {"min": edges[index], "max": edges[index + 1], "count": counts[index]}
+        for index in range(len(PRICE_BUCKETS) + 1)
+    ]
+
+
+def _in_stock_facet(rows):
+    return sum(row["count"] for row in rows if row["in_stock"])
+
+
+# name -> (fields to group by, annotations to group by, rollup of the rows)
+FACETS = {
+    "category": (("category_id", "category__name"), {}, _category_facet),
+    "price": ((), {"price_bucket": _price_bucket}, _price_facet),
+    "in_stock": (
+        (),
+        {
+            "in_stock": lambda: models.ExpressionWrapper(
+                models.Q(is_infinite_stock=True) | models.Q(stock__gt=0),
+                output_field=models.BooleanField(),
+            )
+        },
+        _in_stock_facet,
+    ),
+}
+
+
+def parse_facets(value):
+    """``"price,category"`` -> ``["category", "price"]``; empty means all."""
+    names = sorted({name.strip() for name in value.split(",") if name.strip()})
+    if not names:
+        return sorted(FACETS)
+    unknown = [name for name in names if name not in FACETS]
+    if unknown:
+        raise ValidationError(
+            {"facets": f"Unknown facet '{unknown[0]}'. Use: {', '.join(sorted(FACETS))}."}
+        )
+    return names
+
+
+def facet_queryset(queryset, names):
+    fields = []
+    annotations = {}
+    for name in names:
+        group_fields, group_annotations, _ = FACETS[name]
+        fields.extend(group_fields)
+        annotations.update({alias: make() for alias, make in group_annotations.items()})
+    return (
+        queryset.order_by()
+        .values(*fields, **annotations)
+        .annotate(count=models.Count("pk"))
+    )
+
+
+def rollup(rows, names):
+    return {name: FACETS[name][2](rows) for name in names}
+
+
+class FacetMixin:
+    """
+    Adds ``"facets"`` to paginated list responses when ``?facets=`` is sent.
+
+    Sits between ``ConditionalGetMixin`` and ``AsyncReadMixin`` so a 304
+    never computes facets, on either the sync or the async read path.
+    """
+
+    facets_query_param = "facets"
+
+    def get_facets_cache_key(self, request, names):
+        return None
+
+    def get_facet_names(self, request):
+        value = request.query_params.get(self.facets_query_param)
+        return None if value is None else parse_facets(value)
+
+    def list(self, request, *args, **kwargs):
+        self.facets = None
+        names = self.get_facet_names(request)
+        if names is not None:
+            key = self.get_facets_cache_key(request, names)
+            self.facets = cache.get(key) if key else None
+            if self.facets is None:
+                queryset = self.filter_queryset(self.get_queryset())
+                self.facets = rollup(list(facet_queryset(queryset, names)), names)
+                if key:
+                    cache.set(key, self.facets, settings.FACETS_CACHE_TIMEOUT)
+        return super().list(request, *args, **kwargs)
+
+    async def alist(self, request, *args, **kwargs):
+        self.facets = None
+        names = self.get_facet_names(request)
+        if names is not None:
+            key = self.get_facets_cache_key(request, names)
+            self.facets = await cache.aget(key) if key else None
+            if self.facets is None:
+                queryset = facet_queryset(self.read_queryset, names)
+                self.facets = rollup([row async for row in queryset], names)
+                if key:
+                    await cache.aset(key, self.facets, settings.FACETS_CACHE_TIMEOUT)
+        return await super().alist(request, *args, **kwargs)
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if getattr(self, "facets", None) is not None:
+            response.data["facets"] = self.facets
+        return response
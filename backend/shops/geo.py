@@ -0,0 +1,124 @@
+"""
+Geohash cell index and haversine distance for "shops near me" queries.
+
+Each shop stores the geohash of its coordinates. A radius query picks the
+geohash precision whose cells are at least as large as the radius, so the
+circle is always covered by the centre cell and its eight neighbours. Those
+nine prefixes become index range scans, and the exact haversine distance is
+computed only for the shops inside them.
+"""
+
+import math
+
+from django.db import models
+from django.db.models.functions import ASin, Cos, Power, Radians, Sin, Sqrt
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+PRECISION = 12
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def encode(latitude, longitude, precision=PRECISION):
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        rng, value = (lng_range, longitude) if even else (lat_range, latitude)
+        mid = (rng[0] + rng[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return "".join(chars)
+
+
+def cell_size(precision):
+    """Return the (latitude, longitude) span in degrees of a cell."""
+    lng_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2**lat_bits, 360.0 / 2**lng_bits
+
+
+def covering_cells(latitude, longitude, radius_km):
+    """Geohash prefixes whose union contains the circle around a point."""
+    lat_radius = radius_km / KM_PER_DEGREE
+    lng_radius = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(latitude)), 1e-6))
+    precision = 0
+    for candidate in range(1, PRECISION + 1):
+        lat_span, lng_span = cell_size(candidate)
+        if lat_span < lat_radius or lng_span < lng_radius:
+            break
+        precision = candidate
+    if precision == 0:
+        # Radius larger than a top-level cell: no useful narrowing.
+        return []
+
+    lat_span, lng_span = cell_size(precision)
+    cells = set()
+    for dlat in (-lat_span, 0, lat_span):
+        lat = latitude + dlat
+        if not -90 <= lat <= 90:
+            continue
+        for dlng in (-lng_span, 0, lng_span):
+            lng = (longitude + dlng + 180) % 360 - 180
+            cells.add(encode(lat, lng, precision))
+    return sorted(cells)
+
+
+def _successor(prefix):
+    """Smallest string greater than every string starting with ``prefix``."""
+    while prefix:
+        index = BASE32.index(prefix[-1])
+        if index + 1 < len(BASE32):
+            return prefix[:-1] + BASE32[index + 1]
+        prefix = prefix[:-1]
+    return None
+
+
+def cells_q(cells, field="geohash"):
+    """A Q object matching rows whose ``field`` starts with any of ``cells``."""
+    condition = models.Q()
+    for cell in cells:
+        upper = _successor(cell)
+        bounds = {f"{field}__gte": cell}
+        if upper:
+            bounds[f"{field}__lt"] = upper
+        condition |= models.Q(**bounds)
+    return condition
+
+
+def haversine_km(latitude, longitude, lat_field="latitude", lng_field="longitude"):
+    """Database expression for the great-circle distance to a point, in km."""
+    lat1 = math.radians(latitude)
+    lng1 = math.radians(longitude)
+    lat2 = Radians(lat_field)
+    lng2 = Radians(lng_field)
+    a = Power(Sin((lat2 - lat1) / 2), 2) + math.cos(lat1) * Cos(lat2) * Power(
+        Sin((lng2 - lng1) / 2), 2
+    )
+    return models.ExpressionWrapper(
+        2 * EARTH_RADIUS_KM * ASin(Sqrt(a)), output_field=models.FloatField()
+    )
+
+
+def near(queryset, latitude, longitude, radius_km):
+    """Restrict ``queryset`` to shops within ``radius_km``, annotated with distance."""
+    queryset = queryset.filter(is_physical=True).exclude(geohash="")
+    cells = covering_cells(latitude, longitude, radius_km)
+    if cells:
+        queryset = queryset.filter(cells_q(cells))
+    return queryset.annotate(
+        distance_km=haversine_km(latitude, longitude)
+    ).filter(distance_km__lte=radius_km)
@@ -0,0 +1,254 @@
+"""
+Streaming bulk product import for a shop (CSV or JSONL).
+
+Rows are read one at a time from the upload, validated with the
+``ProductSerializer`` field rules and written in fixed-size batches with
+``bulk_create`` / ``bulk_update``, each batch in its own transaction, so
+memory stays flat however large the file is. A row with an ``id`` updates
+that product of the shop; otherwise a product of the shop with the same
+``name`` is updated, or a new one is created. Only the columns present in a
+row are changed on update.
+"""
+
+import csv
+import json
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import autocomplete, counters, search
+from .models import Category, Product
+from .serializers import ProductSerializer
+
+BATCH_SIZE = 500
+MAX_REPORTED_ERRORS = 1000
+FORMATS = ("csv", "jsonl")
+UNICODE_MESSAGE = "The file is not UTF-8 encoded; save it as UTF-8 (e.g. \"CSV UTF-8\")."
+
+
+class ProductImportError(ValueError):
+    def __init__(self, message, line=None):
+        super().__init__(message)
+        self.line = line
+
+
+class ProductImportSerializer(ProductSerializer):
+    # Shop comes from the URL and categories are resolved by name in bulk,
+    # so no per-row related-object queries are needed.
+    class Meta(ProductSerializer.Meta):
+        fields = ("name", "description", "price", "stock", "is_infinite_stock")
+
+
+def detect_format(filename, fmt=None):
+    fmt = (fmt or filename.rsplit(".", 1)[-1]).lower()
+    if fmt in ("ndjson", "json"):
+        fmt = "jsonl"
+    if fmt not in FORMATS:
+        raise ProductImportError(
+            f"Unsupported format '{fmt}'. Use one of: {', '.join(FORMATS)}."
+        )
+    return fmt
+
+
+def iter_lines(fileobj, strict=False):
+    """
+    Decode the binary lines of ``fileobj``. A line that is not UTF-8 is
+    yielded as ``None``, or raises ProductImportError when ``strict``.
+    """
+    for line_num, raw in enumerate(fileobj, start=1):
+        try:
+            yield raw.decode("utf-8-sig" if line_num == 1 else "utf-8")
+        except UnicodeDecodeError:
+            if strict:
+                raise ProductImportError(UNICODE_MESSAGE, line=line_num)
+            yield None
+
+
+def iter_rows(fileobj, fmt):
+    """
+    Yield ``(line number, dict)`` pairs without reading the whole file.
+
+    A JSONL line that cannot be parsed is yielded with the exception instead
+    of the dict. A CSV file that cannot be read past some line (not UTF-8,
+    a runaway quoted value) raises ProductImportError with that line, since a quoted
+    value may span several lines.
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(iter_lines(fileobj, strict=True))
+        try:
+            for row in reader:
+                # Empty cells mean "not provided", so model defaults apply.
+                yield reader.line_num, {
+                    key.strip(): value.strip()
+                    for key, value in row.items()
+                    if key and value not in (None, "")
+                }
+        except csv.Error as exc:
+            # The record that failed starts on the line after the last one read.
+            raise ProductImportError(
+                f"Could not read the file: {exc}.", line=reader.line_num + 1
+            )
+        return
+    for line_num, line in enumerate(iter_lines(fileobj), start=1):
+        if line is None:
+            yield line_num, ValueError(UNICODE_MESSAGE)
+            continue
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            yield line_num, exc
+            continue
+        yield line_num, row if isinstance(row, dict) else ValueError("Expected a JSON object")
+
+
+class ProductImporter:
+    def __init__(self, shop, batch_size=BATCH_SIZE):
+        self.shop = shop
+        self.batch_size = batch_size
+        self.categories = {c.name.lower(): c for c in Category.objects.all()}
+        self.created = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors = []
+
+    def run(self, fileobj, fmt):
+        batch = []
+        try:
+            for line_num, row in iter_rows(fileobj, fmt):
+                if isinstance(row, Exception):
+                    self.add_error(line_num, {"non_field_errors": [str(row)]})
+                    continue
+                batch.append((line_num, row))
+                if len(batch) >= self.batch_size:
+                    self.write_batch(batch)
+                    batch = []
+        except ProductImportError as exc:
+            # Earlier batches are already written: report where reading
+            # stopped along with what was imported.
+            if exc.line is None:
+                raise
+            message = f"{exc} Rows from here on were not read."
+            self.add_error(exc.line, {"non_field_errors": [message]})
+        if batch:
+            self.write_batch(batch)
+        return self.report()
+
+    def report(self):
+        return {
+            "created": self.created,
+            "updated": self.updated,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+        }
+
+    def add_error(self, line_num, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": line_num, "errors": errors})
+
+    def existing_products(self, batch):
+        ids, names = set(), set()
+        for _, row in batch:
+            if row.get("id"):
+                ids.add(str(row["id"]))
+            elif row.get("name"):
+                names.add(str(row["name"]))
+        by_id, by_name = {}, {}
+        products = self.shop.products.filter(pk__in=[i for i in ids if i.isdigit()])
+        for product in products:
+            by_id[str(product.pk)] = product
+        for product in self.shop.products.filter(name__in=names).order_by("-pk"):
+            by_name[product.name] = product  # lowest pk wins
+        return by_id, by_name
+
+    def write_batch(self, batch):
+        by_id, by_name = self.existing_products(batch)
+        to_create, to_update, update_fields = [], {}, set()
+
+        for line_num, row in batch:
+            if row.get("id"):
+                product = by_id.get(str(row["id"]))
+                if product is None:
+                    self.add_error(line_num, {"id": ["Product not found in this shop."]})
+                    continue
+            else:
+                product = by_name.get(str(row.get("name", "")))
+
+            errors = {}
+            category = None
+            if row.get("category"):
+                category = self.categories.get(str(row["category"]).strip().lower())
+                if category is None:
+                    errors["category"] = [f"Unknown category '{row['category']}'."]
+
+            serializer = ProductImportSerializer(
+                instance=product, data=row, partial=product is not None
+            )
+            if not serializer.is_valid():
+                errors.update(serializer.errors)
+            if errors:
+                self.add_error(line_num, errors)
+                continue
+
+            values = serializer.validated_data
+            if product is None:
+                product = Product(shop=self.shop, category=category, **values)
+                to_create.append(product)
+                # Later rows with the same name update this one.
+                by_name[product.name] = product
+                continue
+            for field, value in values.items():
+                setattr(product, field, value)
+            update_fields.update(values)
+            if category is not None:
+                product.category = category
+                update_fields.add("category")
+            if product.pk:
+                to_update[product.pk] = product
+
+        now = timezone.now()
+        with transaction.atomic():
+            if to_create:
+                Product.objects.bulk_create(to_create, batch_size=self.batch_size)
+            counted = counters.lock(to_update) if to_update else {}
+            if to_update:
+                for product in to_update.values():
+                    product.updated_at = now
+                Product.objects.bulk_update(
+                    list(to_update.values()),
+                    sorted(update_fields | {"updated_at"}),
+                    batch_size=self.batch_size,
+                )
+            if to_create or to_update:
+                # bulk writes skip signals: refresh the search index, the
+                # shop's version stamp and its counters ourselves.
+                search.index_objects(Product, to_create + list(to_update.values()))
+                autocomplete.changed(
+                    Product, [p.pk for p in to_create] + list(to_update)
+                )
+                shops = counters.deltas(
+                    [(None, p.counter_state()) for p in to_create]
+                    + [
+                        (
+                            counters.state(counted[pk]),
+                            counters.saved_state(p, counted[pk], update_fields),
+                        )
+                        for pk, p in to_update.items()
+                        if pk in counted
+                    ]
+                )
+                shops.setdefault(self.shop.pk, counters.no_change())
+                counters.apply(shops, updated_at=now)
+
+        self.created += len(to_create)
+        self.updated += len(to_update)
+
+
+def import_products(shop, fileobj, filename="", fmt=None, batch_size=BATCH_SIZE):
+    """Import products into ``shop`` from a binary file object; returns a report."""
+    return ProductImporter(shop, batch_size=batch_size).run(
+        fileobj, detect_format(filename, fmt)
+    )
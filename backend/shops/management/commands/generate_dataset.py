@@ -0,0 +1,193 @@
+import io
+import itertools
+import random
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from shops import autocomplete, counters, geo, search
+from shops.models import Category, Product, Shop
+
+User = get_user_model()
+
+# Every generated user can log in with this password.
+PASSWORD = "buskalo-demo"
+
+CITIES = [
+    ("Caracas", 10.4806, -66.9036),
+    ("Maracaibo", 10.6545, -71.6406),
+    ("Valencia", 10.1620, -68.0077),
+    ("Barquisimeto", 10.0678, -69.3467),
+    ("Mérida", 8.5897, -71.1561),
+    ("Puerto La Cruz", 10.2141, -64.6328),
+    ("Ciudad Guayana", 8.3596, -62.6517),
+    ("Maturín", 9.7457, -63.1832),
+]
+# Relative weights: most shops are in the big cities.
+CITY_WEIGHTS = [30, 15, 14, 10, 6, 5, 4, 4]
+
+SHOP_KINDS = [
+    "Tienda", "Bodega", "Ferretería", "Panadería", "Farmacia", "Boutique",
+    "Librería", "Juguetería", "Licorería", "Frutería", "Zapatería", "Bazar",
+]
+SHOP_NAMES = [
+    "El Sol", "La Esperanza", "Don José", "La Económica", "Doña Carmen",
+    "El Progreso", "San Rafael", "La Bendición", "Los Andes", "El Ahorro",
+    "La Estrella", "Mi Barrio", "El Punto", "La Fe", "Santa Rosa",
+]
+PRODUCTS = {
+    "Electrónica": ["Audífonos", "Cargador", "Cable USB", "Teléfono", "Parlante", "Batería"],
+    "Ropa y Moda": ["Camisa", "Pantalón", "Vestido", "Chaqueta", "Zapatos", "Gorra"],
+    "Hogar y Jardín": ["Lámpara", "Silla", "Mesa", "Maceta", "Cortina", "Sartén"],
+    "Deportes": ["Balón", "Raqueta", "Guantes", "Bicicleta", "Pesas", "Colchoneta"],
+    "Juguetes y Juegos": ["Muñeca", "Rompecabezas", "Carrito", "Peluche", "Ajedrez"],
+    "Salud y Belleza": ["Champú", "Crema", "Perfume", "Jabón", "Protector solar"],
+    "Automóviles": ["Aceite", "Cauchos", "Limpiaparabrisas", "Filtro", "Batería"],
+    "Libros y Papelería": ["Cuaderno", "Novela", "Lápices", "Agenda", "Diccionario"],
+    "Alimentos y Bebidas": ["Café", "Harina", "Arroz", "Chocolate", "Jugo", "Queso"],
+    "Mascotas": ["Alimento para perros", "Arena para gatos", "Collar", "Juguete"],
+}
+ADJECTIVES = [
+    "clásico", "premium", "económico", "deluxe", "artesanal", "importado",
+    "nacional", "ecológico", "grande", "pequeño", "de lujo", "básico",
+]
+BRANDS = ["Acme", "Patria", "Cóndor", "Tropical", "Orinoco", "Ávila", "Roraima", "Caribe"]
+DESCRIPTIONS = [
+    "Excelente calidad a buen precio.",
+    "Producto original con garantía.",
+    "Ideal para regalar.",
+    "Disponible para entrega inmediata.",
+    "Hecho en Venezuela.",
+    "",
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Deterministically generates users, shops and products with realistic "
+        "distributions, for local performance work"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument("--shops", type=int, default=200)
+        parser.add_argument("--products", type=int, default=10000)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--prefix", default="demo", help="Username prefix")
+        parser.add_argument("--batch-size", type=int, default=2000)
+        parser.add_argument(
+            "--flush",
+            action="store_true",
+            help="Delete users (and their shops) previously generated with this prefix",
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        prefix = options["prefix"]
+        batch_size = options["batch_size"]
+        existing = User.objects.filter(username__startswith=f"{prefix}_")
+        if options["flush"]:
+            Product.objects.filter(shop__owner__in=existing).delete()
+            existing.delete()
+        elif existing.exists():
+            raise CommandError(
+                f"Users '{prefix}_*' already exist; use --flush or another --prefix"
+            )
+        if options["users"] < 1 and options["shops"]:
+            raise CommandError("Shops need at least one user")
+
+        call_command("seed_categories", stdout=io.StringIO())
+        categories = {c.name: c for c in Category.objects.filter(name__in=PRODUCTS)}
+
+        with transaction.atomic():
+            users = self.create_users(prefix, options["users"], batch_size)
+            shops = self.create_shops(rng, users, options["shops"], batch_size)
+        products = self.create_products(rng, shops, categories, options["products"], batch_size)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Generated {len(users)} users, {len(shops)} shops and {products} products "
+                f"(seed {options['seed']}, password '{PASSWORD}')"
+            )
+        )
+
+    def create_users(self, prefix, count, batch_size):
+        # Hashing once keeps generation fast; every user shares the password.
+        password = make_password(PASSWORD)
+        users = [
+            User(
+                username=f"{prefix}_{i:06d}",
+                email=f"{prefix}_{i:06d}@example.com",
+                password=password,
+            )
+            for i in range(count)
+        ]
+        return User.objects.bulk_create(users, batch_size=batch_size)
+
+    def create_shops(self, rng, users, count, batch_size):
+        # A few users own many shops.
+        owner_weights = list(itertools.accumulate(rng.paretovariate(1.5) for _ in users))
+        owners = rng.choices(users, cum_weights=owner_weights, k=count)
+        shops = []
+        for owner in owners:
+            city, lat, lng = rng.choices(CITIES, weights=CITY_WEIGHTS)[0]
+            is_physical = rng.random() < 0.8
+            shop = Shop(
+                owner=owner,
+                name=f"{rng.choice(SHOP_KINDS)} {rng.choice(SHOP_NAMES)}",
+                location=city if is_physical else "Tienda en línea",
+                description=rng.choice(DESCRIPTIONS),
+                is_physical=is_physical,
+                status="active" if rng.random() < 0.9 else "draft",
+            )
+            if is_physical:
+                shop.latitude = round(lat + rng.gauss(0, 0.03), 6)
+                shop.longitude = round(lng + rng.gauss(0, 0.03), 6)
+                shop.geohash = geo.encode(shop.latitude, shop.longitude)
+            shops.append(shop)
+        shops = Shop.objects.bulk_create(shops, batch_size=batch_size)
+        search.index_objects(Shop, shops)
+        autocomplete.changed(Shop, [shop.pk for shop in shops])
+        return shops
+
+    def create_products(self, rng, shops, categories, count, batch_size):
+        if not shops:
+            return 0
+        # Heavy-tailed catalog sizes: most shops list a handful of products,
+        # a few list thousands.
+        shop_weights = list(itertools.accumulate(rng.paretovariate(1.1) for _ in shops))
+        category_names = sorted(categories)
+        created = 0
+        while created < count:
+            batch = []
+            size = min(batch_size, count - created)
+            for shop in rng.choices(shops, cum_weights=shop_weights, k=size):
+                category = rng.choice(category_names)
+                name = (
+                    f"{rng.choice(PRODUCTS[category])} {rng.choice(ADJECTIVES)} "
+                    f"{rng.choice(BRANDS)}"
+                )
+                price = Decimal(str(round(min(rng.lognormvariate(2.5, 1.0), 99999), 2)))
+                infinite = rng.random() < 0.1
+                batch.append(
+                    Product(
+                        shop=shop,
+                        category=categories[category],
+                        name=name,
+                        description=rng.choice(DESCRIPTIONS),
+                        price=price,
+                        stock=0 if infinite else int(rng.expovariate(1 / 20)),
+                        is_infinite_stock=infinite,
+                    )
+                )
+            with transaction.atomic():
+                batch = Product.objects.bulk_create(batch)
+                search.index_objects(Product, batch)
+                autocomplete.changed(Product, [product.pk for product in batch])
+                counters.refresh({product.shop_id for product in batch})
+            created += len(batch)
+            self.stdout.write(f"  {created}/{count} products")
+        return created
@@ -0,0 +1,43 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shops.importers import BATCH_SIZE, ProductImportError, import_products
+from shops.models import Shop
+
+
+class Command(BaseCommand):
+    help = "Bulk imports products into a shop from a CSV or JSONL file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("shop_id", type=int)
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=["csv", "jsonl"])
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            shop = Shop.objects.get(pk=options["shop_id"])
+        except Shop.DoesNotExist:
+            raise CommandError(f"Shop {options['shop_id']} does not exist")
+
+        with open(options["path"], "rb") as fileobj:
+            try:
+                report = import_products(
+                    shop,
+                    fileobj,
+                    options["path"],
+                    options["format"],
+                    batch_size=options["batch_size"],
+                )
+            except ProductImportError as exc:
+                raise CommandError(str(exc))
+
+        for error in report["errors"]:
+            self.stderr.write(f"Row {error['row']}: {json.dumps(error['errors'], ensure_ascii=False)}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {report['created']}, updated {report['updated']}, "
+                f"failed {report['failed']}"
+            )
+        )
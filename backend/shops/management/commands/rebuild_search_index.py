@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from shops import search
+from shops.models import Product, Shop
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the SQLite FTS5 search tables (Postgres indexes maintain themselves)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default="default")
+
+    def handle(self, *args, **options):
+        for model in (Shop, Product):
+            count = search.rebuild_index(model, using=options["database"])
+            self.stdout.write(
+                self.style.SUCCESS(f"Indexed {count} {model._meta.verbose_name_plural}")
+            )
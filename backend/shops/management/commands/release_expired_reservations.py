@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from shops import stock
+
+
+class Command(BaseCommand):
+    help = "Returns the stock of held reservations past their deadline (run it from cron)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            released = stock.release_expired(limit=options["batch_size"])
+            total += released
+            if released < options["batch_size"]:
+                break
+        self.stdout.write(self.style.SUCCESS(f"Expired {total} reservations"))
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+
+from shops import counters
+from shops.models import Shop
+
+
+class Command(BaseCommand):
+    help = (
+        "Verifies the denormalized product counters of every shop against its "
+        "products and recomputes the ones that drifted"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default="default")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--shop", type=int, nargs="+", help="Only these shop ids")
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Report drift without repairing it"
+        )
+
+    def handle(self, *args, **options):
+        using = options["database"]
+        shops = Shop.objects.using(using).order_by("pk")
+        if options["shop"]:
+            shops = shops.filter(pk__in=options["shop"])
+        checked = drifted = 0
+        last_pk = 0
+        while True:
+            # Seek by pk so every batch is an index range scan.
+            batch = list(
+                shops.filter(pk__gt=last_pk).values("pk", *Shop.COUNTER_FIELDS)[
+                    : options["batch_size"]
+                ]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1]["pk"]
+            actual = counters.actual([row["pk"] for row in batch], using)
+            wrong = []
+            for row in batch:
+                stored = {field: row[field] for field in Shop.COUNTER_FIELDS}
+                if stored != actual[row["pk"]]:
+                    wrong.append(row["pk"])
+                    self.stdout.write(
+                        f"  shop {row['pk']}: stored {stored}, actual {actual[row['pk']]}"
+                    )
+            if wrong and not options["dry_run"]:
+                counters.refresh(wrong, using)
+            checked += len(batch)
+            drifted += len(wrong)
+
+        action = "found" if options["dry_run"] else "repaired"
+        style = self.style.WARNING if drifted and options["dry_run"] else self.style.SUCCESS
+        self.stdout.write(style(f"Checked {checked} shops, {action} {drifted} with drift"))
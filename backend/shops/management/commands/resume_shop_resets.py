@@ -0,0 +1,38 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from shops.models import ShopResetJob
+from shops.reset import CHUNK_SIZE, run_reset_job
+
+
+class Command(BaseCommand):
+    help = (
+        "Finishes the shop resets whose background job was lost (pending or running "
+        "with no progress for a while), e.g. after a worker restart"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--stale-minutes",
+            type=int,
+            default=10,
+            help="Resume jobs with no progress for this long",
+        )
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(minutes=options["stale_minutes"])
+        jobs = ShopResetJob.objects.filter(
+            status__in=["pending", "running"], updated_at__lt=cutoff
+        ).order_by("pk")
+        resumed = 0
+        for job in jobs:
+            run_reset_job(job.pk, chunk_size=options["chunk_size"])
+            job.refresh_from_db()
+            self.stdout.write(
+                f"  shop {job.shop_id}: {job.status}, deleted {job.deleted} of {job.total}"
+            )
+            resumed += 1
+        self.stdout.write(self.style.SUCCESS(f"Resumed {resumed} shop resets"))
@@ -0,0 +1,139 @@
+import random
+import threading
+import time
+from collections import Counter
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from shops import stock
+from shops.models import Product, Shop
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Many concurrent buyers reserve, then release, the same few products "
+        "through shops.stock; checks nothing is oversold or lost and reports throughput"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=16, help="Concurrent threads")
+        parser.add_argument("--requests", type=int, default=1000, help="Reservations tried")
+        parser.add_argument("--stock", type=int, default=200, help="Initial stock per product")
+        parser.add_argument("--products", type=int, default=1, help="Products (SKUs) to share")
+        parser.add_argument("--quantity", type=int, default=1, help="Units per reservation")
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--prefix", default="stress", help="Username of the buyer/owner")
+
+    def handle(self, *args, **options):
+        username = f"{options['prefix']}_buyer"
+        if User.objects.filter(username=username).exists():
+            raise CommandError(f"User '{username}' exists; use another --prefix")
+        user = User.objects.create_user(username=username)
+        try:
+            shop = Shop.objects.create(owner=user, name="Stress", location="Caracas")
+            products = [
+                Product.objects.create(
+                    shop=shop, name=f"SKU {i}", price=Decimal("1.00"), stock=options["stock"]
+                ).pk
+                for i in range(options["products"])
+            ]
+            self.run_checks(user, products, options)
+        finally:
+            user.delete()  # cascades to the shop, products and reservations
+
+    def run_checks(self, user, products, options):
+        rng = random.Random(options["seed"])
+        quantity = options["quantity"]
+        plan = [rng.choice(products) for _ in range(options["requests"])]
+
+        def reserve(product_id):
+            try:
+                return "held", stock.reserve(user, [(product_id, quantity)])
+            except stock.InsufficientStock:
+                return "short", None
+
+        results, outcomes, elapsed = self.storm(plan, reserve, options["workers"])
+        self.report("reserve", outcomes, elapsed)
+        sold = Counter()
+        for (_, reservation), product_id in zip(results, plan):
+            if reservation is not None:
+                sold[product_id] += quantity
+        remaining = dict(Product.objects.filter(pk__in=products).values_list("pk", "stock"))
+        for product_id in products:
+            if sold[product_id] > options["stock"]:
+                raise CommandError(f"Oversold product {product_id}: {sold[product_id]} units")
+            if remaining[product_id] != options["stock"] - sold[product_id]:
+                raise CommandError(
+                    f"Product {product_id}: {remaining[product_id]} left after selling "
+                    f"{sold[product_id]} of {options['stock']}"
+                )
+
+        # Every reservation released twice at once: stock must come back exactly once.
+        reservations = [reservation for _, reservation in results if reservation is not None]
+        twice = reservations + reservations
+        random.Random(options["seed"]).shuffle(twice)
+
+        def release(reservation):
+            try:
+                stock.release(reservation, user)
+                return "released", None
+            except stock.ReservationClosed:
+                return "closed", None
+
+        _, outcomes, elapsed = self.storm(twice, release, options["workers"])
+        self.report("release", outcomes, elapsed)
+        if outcomes["released"] != len(reservations):
+            raise CommandError(
+                f"{outcomes['released']} releases succeeded for {len(reservations)} reservations"
+            )
+        remaining = dict(Product.objects.filter(pk__in=products).values_list("pk", "stock"))
+        if any(remaining[pk] != options["stock"] for pk in products):
+            raise CommandError(f"Stock not restored after the releases: {remaining}")
+        self.stdout.write(self.style.SUCCESS("No oversell, no lost or doubled updates"))
+
+    def storm(self, tasks, func, workers):
+        """Run ``func`` over ``tasks`` from ``workers`` threads; results keep task order."""
+        results = [None] * len(tasks)
+        errors = []
+        lock = threading.Lock()
+        queue = iter(range(len(tasks)))
+
+        def work():
+            try:
+                while True:
+                    with lock:
+                        index = next(queue, None)
+                    if index is None:
+                        return
+                    try:
+                        results[index] = func(tasks[index])
+                    except Exception as exc:  # reported, e.g. "database is locked"
+                        results[index] = ("error", None)
+                        errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=work) for _ in range(workers)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        if errors:
+            raise CommandError(f"{len(errors)} requests failed, first: {errors[0]!r}")
+        return results, Counter(outcome for outcome, _ in results), elapsed
+
+    def report(self, label, outcomes, elapsed):
+        total = sum(outcomes.values())
+        counts = ", ".join(f"{name} {count}" for name, count in sorted(outcomes.items()))
+        self.stdout.write(
+            f"  {label:<8} {total:>6} requests in {elapsed:.2f}s "
+            f"({total / elapsed:,.0f}/s): {counts}"
+        )
+
@@ -0,0 +1,111 @@
+import re
+import unicodedata
+
+from django.db import migrations
+from django.db.utils import OperationalError
+
+# Frozen copies of shops.search as of this migration, so later changes to the
+# search module do not change what the migration creates.
+PG_VECTOR_SQL = (
+    "(setweight(to_tsvector('spanish', buskalo_unaccent(name)), 'A') || "
+    "setweight(to_tsvector('spanish', buskalo_unaccent(description)), 'B'))"
+)
+PG_NAME_SQL = "buskalo_unaccent(lower(name))"
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def fold(text):
+    text = unicodedata.normalize("NFKD", text or "")
+    return "".join(c for c in text if not unicodedata.combining(c)).lower()
+
+
+def stem(word):
+    if len(word) <= 3 or word.isdigit():
+        return word
+    if word.endswith("ces") and len(word) > 4 and word[-4] in "aeiou":
+        return word[:-3] + "z"
+    if word.endswith("es") and len(word) > 4 and word[-3] not in "aeiou":
+        word = word[:-2]
+    elif word.endswith("s"):
+        word = word[:-1]
+    if len(word) > 4 and word[-1] in "aeo":
+        word = word[:-1]
+    return word
+
+
+def terms(text):
+    return [stem(token) for token in TOKEN_RE.findall(fold(text))]
+
+PG_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    # unaccent() is only STABLE; index expressions need an IMMUTABLE wrapper.
+    """
+    CREATE OR REPLACE FUNCTION buskalo_unaccent(text) RETURNS text
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+    AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$
+    """,
+]
+PG_BACKWARD = ["DROP FUNCTION IF EXISTS buskalo_unaccent(text)"]
+
+for table in ("shops_product", "shops_shop"):
+    PG_FORWARD += [
+        f"CREATE INDEX IF NOT EXISTS {table}_search_idx ON {table} "
+        f"USING gin ({PG_VECTOR_SQL})",
+        f"CREATE INDEX IF NOT EXISTS {table}_name_trgm_idx ON {table} "
+        f"USING gin ({PG_NAME_SQL} gin_trgm_ops)",
+    ]
+    PG_BACKWARD = [
+        f"DROP INDEX IF EXISTS {table}_search_idx",
+        f"DROP INDEX IF EXISTS {table}_name_trgm_idx",
+    ] + PG_BACKWARD
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == "postgresql":
+        for sql in PG_FORWARD:
+            schema_editor.execute(sql)
+        return
+    if connection.vendor != "sqlite":
+        return
+
+    for table in ("shops_product", "shops_shop"):
+        try:
+            schema_editor.execute(
+                f"CREATE VIRTUAL TABLE {table}_fts USING fts5("
+                "name, description, tokenize='unicode61 remove_diacritics 2')"
+            )
+        except OperationalError:
+            # SQLite built without FTS5: search falls back to icontains.
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT id, name, description FROM {table}")
+            rows = [
+                (pk, " ".join(terms(name)), " ".join(terms(description)))
+                for pk, name, description in cursor.fetchall()
+            ]
+            cursor.executemany(
+                f"INSERT INTO {table}_fts (rowid, name, description) VALUES (%s, %s, %s)",
+                rows,
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == "postgresql":
+        for sql in PG_BACKWARD:
+            schema_editor.execute(sql)
+    elif connection.vendor == "sqlite":
+        for table in ("shops_product", "shops_shop"):
+            schema_editor.execute(f"DROP TABLE IF EXISTS {table}_fts")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("shops", "0008_alter_product_image_alter_product_name_and_more"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
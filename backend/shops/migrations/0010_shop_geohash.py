@@ -0,0 +1,55 @@
+# Generated by Django 6.0.1 on 2026-10-17 18:42
+
+from django.db import migrations, models
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def encode(latitude, longitude, precision=12):
+    # Frozen copy of shops.geo.encode as of this migration.
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        rng, value = (lng_range, longitude) if even else (lat_range, latitude)
+        mid = (rng[0] + rng[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return "".join(chars)
+
+
+def populate_geohash(apps, schema_editor):
+    Shop = apps.get_model("shops", "Shop")
+    shops = Shop.objects.filter(latitude__isnull=False, longitude__isnull=False)
+    for shop in shops.iterator():
+        shop.geohash = encode(shop.latitude, shop.longitude)
+        shop.save(update_fields=["geohash"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shops', '0009_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shop',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=12),
+        ),
+        migrations.RunPython(populate_geohash, migrations.RunPython.noop),
+    ]
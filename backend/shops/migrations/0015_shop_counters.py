@@ -0,0 +1,64 @@
+# Generated by Django 6.0.1 on 2026-10-17 19:29
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    Product = apps.get_model("shops", "Product")
+    Shop = apps.get_model("shops", "Shop")
+    aggregates = {
+        "product_count": models.Count("pk"),
+        "in_stock_count": models.Count(
+            "pk", filter=models.Q(is_infinite_stock=True) | models.Q(stock__gt=0)
+        ),
+        "min_price": models.Min("price"),
+        "max_price": models.Max("price"),
+    }
+    values = {}
+    for field, aggregate in aggregates.items():
+        subquery = models.Subquery(
+            Product.objects.filter(shop=models.OuterRef("pk"))
+            .order_by()
+            .values("shop")
+            .annotate(value=aggregate)
+            .values("value"),
+            output_field=Shop._meta.get_field(field),
+        )
+        values[field] = Coalesce(subquery, 0) if field.endswith("_count") else subquery
+    Shop.objects.using(schema_editor.connection.alias).update(**values)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shops', '0014_shopresetjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shop',
+            name='in_stock_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='shop',
+            name='max_price',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='shop',
+            name='min_price',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='shop',
+            name='product_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['shop', 'price'], name='product_shop_price_idx'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
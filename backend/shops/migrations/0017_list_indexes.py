@@ -0,0 +1,27 @@
+# Generated by Django 6.0.1 on 2026-10-17 19:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shops', '0016_stock_reservations'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['shop', 'created_at', 'id'], name='product_shop_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shop',
+            index=models.Index(condition=models.Q(('status', 'active')), fields=['created_at', 'id'], name='shop_active_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shop',
+            index=models.Index(fields=['owner', 'created_at', 'id'], name='shop_owner_created_idx'),
+        ),
+    ]
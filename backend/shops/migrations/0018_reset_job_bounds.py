@@ -0,0 +1,36 @@
+# Generated by Django 6.0.1 on 2026-10-17 20:05
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def bound_unfinished_jobs(apps, schema_editor):
+    # Jobs still in flight keep deleting what their shop has now.
+    ShopResetJob = apps.get_model("shops", "ShopResetJob")
+    Product = apps.get_model("shops", "Product")
+    for job in ShopResetJob.objects.filter(status__in=["pending", "running"]):
+        job.last_product_id = Product.objects.filter(shop_id=job.shop_id).aggregate(
+            last=Max("pk")
+        )["last"]
+        job.save(update_fields=["last_product_id"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shops', '0017_list_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shopresetjob',
+            name='last_product_id',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='shopresetjob',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(bound_unfinished_jobs, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, router, transaction
 from django.conf import settings
 from django.utils.text import slugify
 import uuid
@@ -23,6 +23,7 @@ def product_image_path(instance, filename):
 
 class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name_plural = "Categories"
@@ -48,8 +49,12 @@ class Shop(models.Model):
         blank=True,
         validators=[validate_file_size, validate_image_extension]
     )
+    # Resized WebP/JPEG derivatives, see api.images
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     latitude = models.FloatField(null=True, blank=True)
     longitude = models.FloatField(null=True, blank=True)
+    # Geohash of (latitude, longitude), maintained in shops.signals
+    geohash = models.CharField(max_length=12, blank=True, db_index=True, editable=False)
     is_physical = models.BooleanField(default=True)
     status = models.CharField(
         max_length=10, 
@@ -58,10 +63,48 @@ class Shop(models.Model):
         db_index=True
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    # Version stamp for HTTP validators; also bumped when the shop's products,
+    # their categories or the owner change (see shops.signals).
+    updated_at = models.DateTimeField(auto_now=True)
+    # Product counters, kept up to date with F() updates by shops.counters
+    product_count = models.PositiveIntegerField(default=0, editable=False)
+    in_stock_count = models.PositiveIntegerField(default=0, editable=False)
+    min_price = models.DecimalField(
+        max_digits=10, decimal_places=2, null=True, blank=True, editable=False
+    )
+    max_price = models.DecimalField(
+        max_digits=10, decimal_places=2, null=True, blank=True, editable=False
+    )
+
+    COUNTER_FIELDS = ("product_count", "in_stock_count", "min_price", "max_price")
+
+    class Meta:
+        indexes = [
+            # Keyset pagination seeks on (sort key, id)
+            models.Index(fields=["created_at", "id"], name="shop_created_idx"),
+            # The default list ordering of what guests see, and of ?owner=<id>
+            models.Index(
+                fields=["created_at", "id"],
+                condition=models.Q(status="active"),
+                name="shop_active_created_idx",
+            ),
+            models.Index(fields=["owner", "created_at", "id"], name="shop_owner_created_idx"),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # A full save of an instance loaded earlier must not write back
+        # counters that products changed since.
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
 
 class Product(models.Model):
     shop = models.ForeignKey(Shop, on_delete=models.CASCADE, related_name="products")
@@ -76,10 +119,117 @@ class Product(models.Model):
         blank=True,
         validators=[validate_file_size, validate_image_extension]
     )
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.PositiveIntegerField(default=0)
     is_infinite_stock = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination seeks on (sort key, id)
+            models.Index(fields=["created_at", "id"], name="product_created_idx"),
+            models.Index(fields=["price", "id"], name="product_price_idx"),
+            # ?shop_id= lists in the default ordering
+            models.Index(fields=["shop", "created_at", "id"], name="product_shop_created_idx"),
+            # Shop price range recomputation (shops.counters)
+            models.Index(fields=["shop", "price"], name="product_shop_price_idx"),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.shop.name})"
+
+    def save(self, *args, **kwargs):
+        # Reservations (shops.stock) move stock without loading instances, so
+        # a full save of one loaded earlier must not write it back; stock
+        # edits go through shops.stock.adjust_stock().
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            deferred = self.get_deferred_fields()
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name != "stock"
+                and field.attname not in deferred
+            ]
+        # shops.signals locks the row in pre_save and adjusts the shop's
+        # counters in post_save; both belong to this transaction.
+        using = kwargs.get("using") or router.db_for_write(Product, instance=self)
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
+
+    def counter_state(self):
+        """What this product contributes to its shop's counters (shops.counters)."""
+        return self.shop_id, self.is_infinite_stock or self.stock > 0, self.price
+
+
+class ShopResetJob(models.Model):
+    """Progress of a background shop reset (see shops.reset)."""
+
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("running", "Running"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+    ]
+    shop = models.ForeignKey(Shop, on_delete=models.CASCADE, related_name="reset_jobs")
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, related_name="+"
+    )
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="pending")
+    total = models.PositiveIntegerField(default=0)
+    deleted = models.PositiveIntegerField(default=0)
+    # Highest product id when the reset was requested: later products stay.
+    last_product_id = models.PositiveBigIntegerField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Bumped on every chunk, so stalled jobs can be told from running ones.
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Reset {self.shop_id} ({self.status})"
+
+
+class StockReservation(models.Model):
+    """
+    Stock held for a buyer until committed, released or expired (see
+    shops.stock). Held stock is already subtracted from ``Product.stock``.
+    """
+
+    STATUS_CHOICES = [
+        ("held", "Held"),
+        ("committed", "Committed"),
+        ("released", "Released"),
+        ("expired", "Expired"),
+    ]
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="reservations"
+    )
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="held")
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The expiry sweep: held reservations past their deadline
+            models.Index(fields=["status", "expires_at"], name="reservation_expiry_idx"),
+        ]
+
+    def __str__(self):
+        return f"Reservation {self.pk} ({self.status})"
+
+
+class StockReservationItem(models.Model):
+    reservation = models.ForeignKey(
+        StockReservation, on_delete=models.CASCADE, related_name="items"
+    )
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="+")
+    quantity = models.PositiveIntegerField()
+    # False for products with is_infinite_stock, whose stock is never taken
+    held = models.BooleanField(default=True)
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id}"
@@ -0,0 +1,178 @@
+import base64
+import datetime
+import json
+from decimal import Decimal
+
+from django.core import exceptions
+from django.core.paginator import InvalidPage
+from django.db import models
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset ("seek") pagination over ``(sort key, pk)``.
+
+    The queryset must already be ordered by one model field followed by the
+    primary key in the same direction, e.g. ``("-created_at", "-pk")``. Each
+    page is a ``WHERE (key, pk) < (last key, last pk)`` range scan, so deep
+    pages cost the same as the first one and rows inserted or deleted while a
+    client scrolls never cause duplicates or gaps. No ``COUNT(*)`` is issued.
+    """
+
+    cursor_query_param = "cursor"
+    page_size = None
+
+    def __init__(self, page_size):
+        self.page_size = page_size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        return self.set_page([obj async for obj in self.page_queryset(queryset, request)])
+
+    def page_queryset(self, queryset, request):
+        self.request = request
+        field, descending = self.get_sort_key(queryset)
+        self.field = field
+        self.ordering = f"-{field}" if descending else field
+
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded:
+            value, pk = self.decode_cursor(encoded, queryset)
+            if descending:
+                after = models.Q(**{f"{field}__lt": value}) | models.Q(
+                    **{field: value, "pk__lt": pk}
+                )
+            else:
+                after = models.Q(**{f"{field}__gt": value}) | models.Q(
+                    **{field: value, "pk__gt": pk}
+                )
+            queryset = queryset.filter(after)
+        return queryset[: self.page_size + 1]
+
+    def set_page(self, page):
+        self.has_next = len(page) > self.page_size
+        self.page = page[: self.page_size]
+        return self.page
+
+    def get_sort_key(self, queryset):
+        order_by = [str(term) for term in queryset.query.order_by]
+        if len(order_by) == 2 and order_by[1].lstrip("-") in ("pk", "id"):
+            field = order_by[0].lstrip("-")
+            descending = order_by[0].startswith("-")
+            if descending == order_by[1].startswith("-") and "__" not in field:
+                try:
+                    queryset.model._meta.get_field(field)
+                    return field, descending
+                except exceptions.FieldDoesNotExist:
+                    pass
+        raise ValidationError(
+            {self.cursor_query_param: "Cursor pagination is not available for this ordering."}
+        )
+
+    def encode_cursor(self, obj):
+        if isinstance(obj, dict):  # a .values() row from api.fastpath
+            value, pk = obj[self.field], obj["pk"]
+        else:
+            value, pk = getattr(obj, self.field), obj.pk
+        if isinstance(value, (datetime.datetime, datetime.date)):
+            value = value.isoformat()
+        elif isinstance(value, Decimal):
+            value = str(value)
+        payload = json.dumps({"o": self.ordering, "v": value, "pk": pk})
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+    def decode_cursor(self, encoded, queryset):
+        try:
+            padded = encoded + "=" * (-len(encoded) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            if payload["o"] != self.ordering:
+                raise ValueError("cursor was issued for another ordering")
+            # Cursors come back from clients, so the key is validated here
+            # rather than left to blow up inside the query.
+            field = queryset.model._meta.get_field(self.field)
+            return field.to_python(payload["v"]), int(payload["pk"])
+        except (ValueError, KeyError, TypeError, exceptions.ValidationError):
+            raise NotFound("Invalid cursor")
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(self.page[-1])
+        )
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+
+class MarketPagination(PageNumberPagination):
+    """
+    Page-number pagination by default; sending ``?cursor=`` (empty for the
+    first page) switches to keyset pagination for infinite-scroll clients.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if KeysetPagination.cursor_query_param in request.query_params:
+            self.keyset = KeysetPagination(self.get_page_size(request))
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """``paginate_queryset()`` for the async read path (``shops.async_views``)."""
+        self.keyset = None
+        if KeysetPagination.cursor_query_param in request.query_params:
+            self.keyset = KeysetPagination(self.get_page_size(request))
+            return await self.keyset.apaginate_queryset(queryset, request, view)
+
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        paginator = self.django_paginator_class(queryset, page_size)
+        # Counted up front so the paginator never queries synchronously.
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(
+                self.invalid_page_message.format(page_number=page_number, message=str(exc))
+            )
+        self.page.object_list = [obj async for obj in self.page.object_list]
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        return list(self.page)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_schema_operation_parameters(self, view):
+        return super().get_schema_operation_parameters(view) + [
+            {
+                "name": KeysetPagination.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Keyset pagination cursor; send it empty for the first page.",
+                "schema": {"type": "string"},
+            }
+        ]
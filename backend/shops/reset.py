@@ -0,0 +1,143 @@
+"""
+Background shop reset.
+
+The request only resets the shop's own fields and records a
+``ShopResetJob``; the products are deleted afterwards in bounded chunks with
+plain ``DELETE ... WHERE id IN (...)`` statements. That skips Django's
+collector, which would load every product and fire its signals, so the work
+the signal handlers normally do (search index, shop stamp, image files) is
+done here once per chunk instead, along with the shop's product counters.
+
+A job only deletes the products that existed when the reset was requested,
+so products the owner adds meanwhile are kept. Jobs are lost if their worker
+exits; ``manage.py resume_shop_resets`` runs the stalled ones again.
+"""
+
+import logging
+
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models import Count, F, Max
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from api.images import delete_variants
+from api.tasks import enqueue
+
+from . import autocomplete, counters, search
+from .models import Product, Shop, ShopResetJob, StockReservationItem
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1000
+
+
+def reset_shop_fields(shop):
+    shop.description = ""
+    shop.location = "Tienda en línea"
+    shop.latitude = None
+    shop.longitude = None
+    shop.is_physical = False
+    shop.image = None
+    shop.status = "draft"
+    shop.save()
+
+
+def start_reset(shop, user):
+    """Reset ``shop`` now and schedule deletion of its products; returns the job."""
+    with transaction.atomic():
+        reset_shop_fields(shop)
+        existing = shop.products.aggregate(total=Count("pk"), last=Max("pk"))
+        job = ShopResetJob.objects.create(
+            shop=shop,
+            requested_by=user,
+            total=existing["total"],
+            last_product_id=existing["last"],
+        )
+        enqueue(run_reset_job, job.pk)
+    return job
+
+
+def delete_rows(model, field_name, values):
+    """
+    ``DELETE FROM <model> WHERE <field> IN (values)`` as one statement,
+    without the collector's cascades and signals; returns the row count.
+    """
+    quote = connection.ops.quote_name
+    placeholders = ", ".join(["%s"] * len(values))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {quote(model._meta.db_table)} "
+            f"WHERE {quote(model._meta.get_field(field_name).column)} IN ({placeholders})",
+            list(values),
+        )
+        return cursor.rowcount
+
+
+def delete_chunk(shop_id, last_product_id, chunk_size):
+    """
+    Delete up to ``chunk_size`` products of a shop with ids up to
+    ``last_product_id``; returns how many went.
+    """
+    if last_product_id is None:
+        return 0
+    with transaction.atomic():
+        # Locked, so a job running twice (see resume_shop_resets) cannot
+        # delete the same products, and count them, twice.
+        rows = list(
+            Product.objects.select_for_update()
+            .filter(shop_id=shop_id, pk__lte=last_product_id)
+            .order_by("pk")
+            .values_list(
+                "pk", "image", "image_variants", "stock", "is_infinite_stock", "price"
+            )[:chunk_size]
+        )
+        if not rows:
+            return 0
+        pks = [row[0] for row in rows]
+        # Reservation items first: the raw delete does not cascade.
+        delete_rows(StockReservationItem, "product", pks)
+        delete_rows(Product, "id", pks)
+        search.unindex_objects(Product, pks)
+        autocomplete.changed(Product, pks)
+        counters.apply(
+            counters.deltas(
+                ((shop_id, infinite or stock > 0, price), None)
+                for _, _, _, stock, infinite, price in rows
+            )
+        )
+    for _, image, variants, *_ in rows:
+        if image:
+            default_storage.delete(image)
+        delete_variants(default_storage, variants)
+    return len(rows)
+
+
+def run_reset_job(job_id, chunk_size=None):
+    """Delete the products of a pending, running or stalled job; safe to re-run."""
+    chunk_size = chunk_size or CHUNK_SIZE
+    job = ShopResetJob.objects.get(pk=job_id)
+    if job.status in ("done", "failed"):
+        return
+    jobs = ShopResetJob.objects.filter(pk=job.pk)
+    jobs.update(status="running", updated_at=timezone.now())
+    try:
+        while True:
+            deleted = delete_chunk(job.shop_id, job.last_product_id, chunk_size)
+            if not deleted:
+                break
+            # A resumed job may overlap a stalled run, so count in the database.
+            jobs.update(deleted=F("deleted") + deleted, updated_at=timezone.now())
+    except Exception as exc:
+        logger.exception("Reset of shop %s failed", job.shop_id)
+        now = timezone.now()
+        jobs.update(status="failed", error=str(exc), updated_at=now, finished_at=now)
+        return
+    Shop.objects.filter(pk=job.shop_id).update(updated_at=timezone.now())
+    now = timezone.now()
+    jobs.update(
+        status="done",
+        total=Greatest("total", "deleted"),
+        updated_at=now,
+        finished_at=now,
+    )
@@ -0,0 +1,189 @@
+"""
+Ranked full-text search for products and shops.
+
+Postgres uses expression GIN indexes (a weighted Spanish ``tsvector`` and a
+trigram index on the unaccented name) that the database maintains by itself.
+SQLite uses FTS5 tables holding accent-folded, stemmed text, kept in sync by
+the signal handlers in ``shops.signals``. Any other backend, or a SQLite build
+without FTS5, falls back to ``icontains``.
+"""
+
+import re
+import unicodedata
+
+from django.db import connections, models
+from django.db.models.expressions import RawSQL
+
+from .models import Product, Shop
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+FTS_TABLES = {
+    Product: "shops_product_fts",
+    Shop: "shops_shop_fts",
+}
+
+# Weighted document used both by the GIN index (unqualified columns) and by
+# queries (qualified with the table name, since product queries join shops).
+PG_VECTOR_SQL = (
+    "(setweight(to_tsvector('spanish', buskalo_unaccent({table}name)), 'A') || "
+    "setweight(to_tsvector('spanish', buskalo_unaccent({table}description)), 'B'))"
+)
+PG_NAME_SQL = "buskalo_unaccent(lower({table}name))"
+
+
+def fold(text):
+    """Lowercase and strip accents: "Camión Ñandú" -> "camion nandu"."""
+    text = unicodedata.normalize("NFKD", text or "")
+    return "".join(c for c in text if not unicodedata.combining(c)).lower()
+
+
+def stem(word):
+    """Light Spanish stemmer: strips plural and gender endings."""
+    if len(word) <= 3 or word.isdigit():
+        return word
+    if word.endswith("ces") and len(word) > 4 and word[-4] in "aeiou":
+        # luces -> luz, peces -> pez
+        return word[:-3] + "z"
+    if word.endswith("es") and len(word) > 4 and word[-3] not in "aeiou":
+        word = word[:-2]
+    elif word.endswith("s"):
+        word = word[:-1]
+    if len(word) > 4 and word[-1] in "aeo":
+        word = word[:-1]
+    return word
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(fold(text))
+
+
+def terms(text):
+    return [stem(token) for token in tokenize(text)]
+
+
+_fts_tables_seen = {}
+
+
+def _fts_available(connection, model):
+    if connection.vendor != "sqlite":
+        return False
+    key = (connection.alias, str(connection.settings_dict["NAME"]), model)
+    if key not in _fts_tables_seen:
+        with connection.cursor() as cursor:
+            tables = connection.introspection.table_names(cursor)
+        _fts_tables_seen[key] = FTS_TABLES[model] in tables
+    return _fts_tables_seen[key]
+
+
+def _backend(model, using):
+    connection = connections[using]
+    if connection.vendor == "postgresql":
+        return "postgresql"
+    if _fts_available(connection, model):
+        return "fts5"
+    return "basic"
+
+
+def search(queryset, query):
+    """
+    Filter ``queryset`` by ``query`` and order it by relevance.
+
+    The result is annotated with ``search_rank`` (higher is better) on the
+    indexed backends. Queries without any word token (``"!!!"``, ``"¿?"``)
+    cannot use the indexes and fall back to ``icontains``.
+    """
+    model = queryset.model
+    backend = _backend(model, queryset.db)
+    tokens = tokenize(query)
+    if not tokens:
+        backend = "basic"
+
+    if backend == "postgresql":
+        table = f'"{model._meta.db_table}".'
+        vector = PG_VECTOR_SQL.format(table=table)
+        name = PG_NAME_SQL.format(table=table)
+        tsquery = " & ".join(f"{token}:*" for token in tokens)
+        phrase = " ".join(tokens)
+        return (
+            queryset.filter(
+                RawSQL(
+                    f"({vector} @@ to_tsquery('spanish', %s) OR %s <%% {name})",
+                    (tsquery, phrase),
+                    output_field=models.BooleanField(),
+                )
+            )
+            .annotate(
+                search_rank=RawSQL(
+                    f"ts_rank({vector}, to_tsquery('spanish', %s)) "
+                    f"+ word_similarity(%s, {name})",
+                    (tsquery, phrase),
+                    output_field=models.FloatField(),
+                )
+            )
+            .order_by("-search_rank", "-pk")
+        )
+
+    if backend == "fts5":
+        table = FTS_TABLES[model]
+        match = " ".join(f'"{term}"*' for term in terms(query))
+        return queryset.extra(
+            tables=[table],
+            where=[
+                f"{table} MATCH %s",
+                f'{table}.rowid = "{model._meta.db_table}"."id"',
+            ],
+            params=[match],
+            select={"search_rank": f"-bm25({table}, 10.0, 1.0)"},
+        ).order_by("-search_rank", "-pk")
+
+    return queryset.filter(
+        models.Q(name__icontains=query) | models.Q(description__icontains=query)
+    )
+
+
+def index_objects(model, objs, using="default"):
+    """Refresh the FTS5 rows for ``objs``. Postgres indexes maintain themselves."""
+    connection = connections[using]
+    if not objs or not _fts_available(connection, model):
+        return
+    table = FTS_TABLES[model]
+    rows = [
+        (obj.pk, " ".join(terms(obj.name)), " ".join(terms(obj.description)))
+        for obj in objs
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {table} WHERE rowid = %s", [(r[0],) for r in rows])
+        cursor.executemany(
+            f"INSERT INTO {table} (rowid, name, description) VALUES (%s, %s, %s)", rows
+        )
+
+
+def unindex_objects(model, pks, using="default"):
+    connection = connections[using]
+    if not pks or not _fts_available(connection, model):
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"DELETE FROM {FTS_TABLES[model]} WHERE rowid = %s", [(pk,) for pk in pks]
+        )
+
+
+def rebuild_index(model, using="default", batch_size=2000):
+    """Re-create every FTS5 row for ``model``. Returns the number indexed."""
+    connection = connections[using]
+    if not _fts_available(connection, model):
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLES[model]}")
+    count = 0
+    batch = []
+    queryset = model.objects.using(using).only("id", "name", "description")
+    for obj in queryset.iterator(chunk_size=batch_size):
+        batch.append(obj)
+        if len(batch) >= batch_size:
+            index_objects(model, batch, using)
+            count += len(batch)
+            batch = []
+    index_objects(model, batch, using)
+    return count + len(batch)
@@ -1,17 +1,29 @@
+from django.db import transaction
 from rest_framework import serializers
-from .models import Shop, Product, Category
+from api.fields import ImageVariantsField
+from api.fieldsets import SparseFieldsetMixin
+from . import stock
+from .models import (
+    Category,
+    Product,
+    Shop,
+    ShopResetJob,
+    StockReservation,
+    StockReservationItem,
+)
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Category
-        fields = "__all__"
+        fields = ("id", "name")
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     category_name = serializers.ReadOnlyField(source="category.name")
     shop_name = serializers.ReadOnlyField(source="shop.name")
     shop_location = serializers.ReadOnlyField(source="shop.location")
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Product
@@ -25,6 +37,7 @@ class ProductSerializer(serializers.ModelSerializer):
             "name",
             "description",
             "image",
+            "image_variants",
             "price",
             "stock",
             "is_infinite_stock",
@@ -34,12 +47,26 @@ class ProductSerializer(serializers.ModelSerializer):
         extra_kwargs = {
             "description": {"max_length": 1000},
         }
+        # ?expand=category renders {"id", "name"} instead of the id
+        expandable_fields = {"category": (CategorySerializer, {})}
 
+    def update(self, instance, validated_data):
+        # A sent stock is the owner's edit of the value loaded here; it is
+        # applied as a change, so units reserved meanwhile stay sold.
+        new_stock = validated_data.pop("stock", None)
+        with transaction.atomic():
+            loaded = instance.stock
+            instance = super().update(instance, validated_data)
+            if new_stock is not None:
+                stock.adjust_stock(instance, new_stock - loaded)
+        return instance
 
-class ShopSerializer(serializers.ModelSerializer):
+
+class ShopSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     owner_username = serializers.ReadOnlyField(source="owner.username")
     owner_avatar = serializers.ImageField(source="owner.avatar", read_only=True)
-    products = ProductSerializer(many=True, read_only=True)
+    distance_km = serializers.SerializerMethodField()
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Shop
@@ -53,13 +80,54 @@ class ShopSerializer(serializers.ModelSerializer):
             "latitude",
             "longitude",
             "is_physical",
+            "distance_km",
             "description",
             "image",
+            "image_variants",
             "status",
-            "products",
+            "product_count",
+            "in_stock_count",
+            "min_price",
+            "max_price",
             "created_at",
         )
         read_only_fields = ("owner", "created_at")
         extra_kwargs = {
             "description": {"max_length": 2000},
         }
+        # The shop's products are only embedded with ?expand=products
+        expandable_fields = {"products": (ProductSerializer, {"many": True})}
+        # Method fields that only read columns or annotations of the row, so
+        # list pages can render them from .values() (api.fastpath).
+        row_method_fields = ("distance_km",)
+
+    def get_distance_km(self, obj):
+        # Only annotated by the ?near= filter
+        distance = getattr(obj, "distance_km", None)
+        return round(distance, 3) if distance is not None else None
+
+
+class ShopResetJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ShopResetJob
+        fields = ("id", "shop", "status", "total", "deleted", "error", "created_at", "finished_at")
+        read_only_fields = fields
+
+
+class StockReservationItemSerializer(serializers.ModelSerializer):
+    # A plain id: shops.stock checks all the products of a request at once.
+    product = serializers.IntegerField(source="product_id", min_value=1, max_value=2**63 - 1)
+    quantity = serializers.IntegerField(min_value=1, max_value=10000)
+
+    class Meta:
+        model = StockReservationItem
+        fields = ("product", "quantity")
+
+
+class StockReservationSerializer(serializers.ModelSerializer):
+    items = StockReservationItemSerializer(many=True, allow_empty=False, max_length=100)
+
+    class Meta:
+        model = StockReservation
+        fields = ("id", "status", "items", "expires_at", "created_at", "finished_at")
+        read_only_fields = ("id", "status", "expires_at", "created_at", "finished_at")
@@ -0,0 +1,109 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from api.images import sync_variants
+
+from . import autocomplete, counters, geo, search
+from .models import Category, Product, Shop
+
+
+@receiver(pre_save, sender=Shop)
+def update_geohash(sender, instance, raw=False, **kwargs):
+    if instance.latitude is not None and instance.longitude is not None:
+        instance.geohash = geo.encode(instance.latitude, instance.longitude)
+    else:
+        instance.geohash = ""
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Shop)
+def update_search_index(sender, instance, raw=False, using="default", **kwargs):
+    if not raw:
+        search.index_objects(sender, [instance], using)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Shop)
+@receiver(post_save, sender=Category)
+def update_autocomplete(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if update_fields and not {"name", "shop", "status"} & set(update_fields):
+        return
+    autocomplete.changed(sender, [instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Shop)
+@receiver(post_delete, sender=Category)
+def remove_from_autocomplete(sender, instance, **kwargs):
+    autocomplete.changed(sender, [instance.pk])
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Shop)
+def update_image_variants(sender, instance, raw=False, **kwargs):
+    if not raw:
+        sync_variants(instance)
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Shop)
+def remove_from_search_index(sender, instance, using="default", **kwargs):
+    search.unindex_objects(sender, [instance.pk], using)
+
+
+# Shop.updated_at is the version stamp behind the ETag of the shop detail and
+# per-shop product list, so anything rendered in those payloads bumps it.
+
+
+@receiver(pre_save, sender=Product)
+@receiver(pre_delete, sender=Product)
+def lock_counted_row(sender, instance, raw=False, using="default", **kwargs):
+    # The stored row, not the instance as it was loaded: the lock holds until
+    # touch_product_shop() has adjusted the counters, since Product.save()
+    # and deletions each run in one transaction.
+    if not raw:
+        pk = instance.pk
+        instance._counted_row = None if pk is None else counters.lock([pk], using).get(pk)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def touch_product_shop(
+    sender, instance, raw=False, using="default", update_fields=None, signal=None, **kwargs
+):
+    """Bump the stamp and adjust the counters (shops.counters) in one UPDATE per shop."""
+    if raw:
+        return
+    row = getattr(instance, "_counted_row", None)
+    before = None if row is None else counters.state(row)
+    if signal is post_delete:
+        after = None
+    else:
+        after = counters.saved_state(instance, row, update_fields)
+    shops = counters.deltas([(before, after)])
+    shops.setdefault(instance.shop_id, counters.no_change())  # the stamp, at least
+    counters.apply(shops, using, updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Category)
+@receiver(pre_delete, sender=Category)  # before products are SET_NULL
+def touch_category_shops(sender, instance, raw=False, using="default", **kwargs):
+    if not raw:
+        Shop.objects.using(using).filter(
+            pk__in=Product.objects.filter(category=instance).values("shop_id")
+        ).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def touch_owner_shops(
+    sender, instance, created=False, raw=False, update_fields=None, using="default", **kwargs
+):
+    if raw or created:
+        return
+    if update_fields and not {"username", "avatar"} & set(update_fields):
+        return
+    Shop.objects.using(using).filter(owner=instance).update(updated_at=timezone.now())
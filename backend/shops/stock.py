@@ -0,0 +1,200 @@
+"""
+Stock reservations: ``reserve()`` holds stock, then ``commit()`` keeps it
+sold or ``release()`` (or expiry) gives it back.
+
+Stock is taken with one conditional statement per product,
+``UPDATE ... SET stock = stock - n WHERE id = ? AND stock >= n AND NOT
+is_infinite_stock``, so nothing is read beforehand and concurrent buyers of
+the same product can never take more than there is. A reservation of several
+products is all or nothing: the first product that falls short rolls the
+others back. Products are updated in primary key order, so two multi-product
+reservations never wait on each other's rows in opposite orders. Products
+with ``is_infinite_stock`` are recorded but never decremented.
+
+Reservations move out of ``held`` with a conditional update too (``WHERE
+status = 'held'``), so however many requests race to commit, release or
+expire one, exactly one of them wins and stock is returned at most once.
+Held reservations past ``expires_at`` are released by ``release_expired()``:
+on demand when a reservation falls short on products they hold, and by
+``manage.py release_expired_reservations`` from cron.
+
+Owners edit stock with ``adjust_stock()``, which applies their change on
+top of whatever reservations did since the product was loaded; full
+``Product.save()`` calls leave the column alone.
+
+Products that run out or come back adjust their shop's ``in_stock_count``
+(``shops.counters``); every change bumps the shop's version stamp.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models, transaction
+from django.utils import timezone
+
+from . import counters
+from .models import Product, StockReservation, StockReservationItem
+
+
+class StockError(Exception):
+    def __init__(self, message, product_ids=()):
+        super().__init__(message)
+        self.product_ids = list(product_ids)
+
+
+class UnknownProducts(StockError):
+    pass
+
+
+class InsufficientStock(StockError):
+    pass
+
+
+class ReservationClosed(StockError):
+    pass
+
+
+def _quantities(items):
+    """``[(product id, quantity), ...]`` -> ``{product id: total quantity}``."""
+    quantities = {}
+    for product_id, quantity in items:
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+    return quantities
+
+
+def _adjust_shops(shops, crossed, sign, now):
+    """
+    Bump the stamp of every shop in ``shops`` (product id -> shop id) and
+    move ``in_stock_count`` by ``sign`` for each product in ``crossed``.
+    """
+    changes = {shop_id: counters.no_change() for shop_id in shops.values()}
+    for product_id in crossed:
+        changes[shops[product_id]]["in_stock"] += sign
+    counters.apply(changes, updated_at=now)
+
+
+def _take(quantities, now):
+    """Decrement every product or none; returns the products that ran out."""
+    for product_id in sorted(quantities):
+        taken = Product.objects.filter(
+            pk=product_id, is_infinite_stock=False, stock__gte=quantities[product_id]
+        ).update(stock=models.F("stock") - quantities[product_id], updated_at=now)
+        if not taken:
+            raise InsufficientStock(
+                f"Not enough stock for product {product_id}.", [product_id]
+            )
+    # The rows are locked by this transaction, so these reads are exact.
+    return list(
+        Product.objects.filter(pk__in=list(quantities), stock=0).values_list("pk", flat=True)
+    )
+
+
+def _restock(quantities, now):
+    """Give stock back; returns the products that were sold out before."""
+    for product_id in sorted(quantities):
+        Product.objects.filter(pk=product_id, is_infinite_stock=False).update(
+            stock=models.F("stock") + quantities[product_id], updated_at=now
+        )
+    rows = Product.objects.filter(pk__in=list(quantities), is_infinite_stock=False)
+    return [
+        pk for pk, stock in rows.values_list("pk", "stock") if stock == quantities[pk]
+    ]
+
+
+def reserve(user, items, ttl=None):
+    """
+    Hold ``items`` (``(product id, quantity)`` pairs) for ``user`` for
+    ``ttl`` seconds (``STOCK_RESERVATION_TTL`` by default).
+    """
+    quantities = _quantities(items)
+    products = {
+        pk: (shop_id, infinite)
+        for pk, shop_id, infinite in Product.objects.filter(
+            pk__in=list(quantities), shop__status="active"
+        ).values_list("pk", "shop_id", "is_infinite_stock")
+    }
+    unknown = sorted(set(quantities) - set(products))
+    if unknown:
+        raise UnknownProducts(f"Unknown product {unknown[0]}.", unknown)
+    finite = {pk: quantity for pk, quantity in quantities.items() if not products[pk][1]}
+    shops = {pk: products[pk][0] for pk in finite}
+    ttl = settings.STOCK_RESERVATION_TTL if ttl is None else ttl
+
+    for attempt in range(2):
+        now = timezone.now()
+        try:
+            with transaction.atomic():
+                sold_out = _take(finite, now)
+                reservation = StockReservation.objects.create(
+                    user=user, expires_at=now + timedelta(seconds=ttl)
+                )
+                StockReservationItem.objects.bulk_create(
+                    StockReservationItem(
+                        reservation=reservation,
+                        product_id=pk,
+                        quantity=quantity,
+                        held=pk in finite,
+                    )
+                    for pk, quantity in sorted(quantities.items())
+                )
+                _adjust_shops(shops, sold_out, -1, now)
+            return reservation
+        except InsufficientStock as exc:
+            # Expired holds on the product may cover it; retry once if so.
+            if attempt or not release_expired(product_ids=exc.product_ids):
+                raise
+
+
+def _close(reservation_id, status, now, **filters):
+    """Move a held reservation to ``status``, returning its stock; False if not held."""
+    with transaction.atomic():
+        closed = StockReservation.objects.filter(
+            pk=reservation_id, status="held", **filters
+        ).update(status=status, finished_at=now)
+        if not closed:
+            return False
+        if status == "committed":
+            return True
+        items = StockReservationItem.objects.filter(reservation_id=reservation_id, held=True)
+        quantities = _quantities(items.values_list("product_id", "quantity"))
+        if quantities:
+            refilled = _restock(quantities, now)
+            shops = dict(
+                Product.objects.filter(pk__in=list(quantities)).values_list("pk", "shop_id")
+            )
+            _adjust_shops(shops, refilled, 1, now)
+    return True
+
+
+def commit(reservation, user):
+    """Keep the held stock sold; fails once the reservation expired or closed."""
+    now = timezone.now()
+    if not _close(reservation.pk, "committed", now, user=user, expires_at__gt=now):
+        raise ReservationClosed("This reservation is no longer held.")
+
+
+def release(reservation, user):
+    """Give the held stock back."""
+    if not _close(reservation.pk, "released", timezone.now(), user=user):
+        raise ReservationClosed("This reservation is no longer held.")
+
+
+def adjust_stock(product, change):
+    """
+    Add ``change`` (negative to remove) to the stored stock of ``product``,
+    never going below zero, and refresh ``product.stock``.
+    """
+    with transaction.atomic():
+        current = counters.lock([product.pk])[product.pk]["stock"]
+        product.stock = max(current + change, 0)
+        product.save(update_fields=["stock", "updated_at"])
+
+
+def release_expired(product_ids=None, limit=500):
+    """Expire held reservations past their deadline; returns how many."""
+    now = timezone.now()
+    expired = StockReservation.objects.filter(status="held", expires_at__lte=now)
+    if product_ids:
+        expired = expired.filter(items__product_id__in=product_ids, items__held=True)
+    reservation_ids = list(expired.values_list("pk", flat=True).distinct()[:limit])
+    return sum(_close(reservation_id, "expired", now) for reservation_id in reservation_ids)
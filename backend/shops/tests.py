@@ -1 +1,1202 @@
-# Create your tests here.
+import base64
+import csv
+import io
+import json
+import math
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from decimal import Decimal
+from unittest import mock
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import AsyncRequestFactory, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from PIL import Image
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api.benchmark import throttling_disabled
+from api.fastpath import RowPlan, compile_plan
+
+from . import autocomplete, counters, geo, stock
+from .importers import import_products
+from .models import Category, Product, Shop, StockReservation, StockReservationItem
+from .pagination import MarketPagination
+from .reset import start_reset
+from .search import stem, terms
+from .serializers import ProductSerializer, ShopSerializer
+
+User = get_user_model()
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class MarketTestCase(APITestCase):
+    """Shared fixtures: one owner with an active shop and a category."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username="owner", password="pass1234")
+        cls.category = Category.objects.create(name="Electrónica")
+        cls.shop = Shop.objects.create(
+            owner=cls.owner, name="Tienda Central", location="Caracas"
+        )
+
+    def make_product(self, name, description="", shop=None, **kwargs):
+        kwargs.setdefault("price", Decimal("10.00"))
+        kwargs.setdefault("category", self.category)
+        return Product.objects.create(
+            shop=shop or self.shop,
+            name=name,
+            description=description,
+            **kwargs,
+        )
+
+
+class SearchTestCase(MarketTestCase):
+    url = "/api/v1/market/products/"
+
+    def search_names(self, query, url=None):
+        response = self.client.get(url or self.url, {"search": query})
+        self.assertEqual(response.status_code, 200)
+        return [row["name"] for row in response.data["results"]]
+
+    def test_stemmer_folds_plurals_and_accents(self):
+        """Singular, plural and accented forms share a single index term."""
+        self.assertEqual(stem("zapatos"), stem("zapato"))
+        self.assertEqual(stem("camiones"), stem("camion"))
+        self.assertEqual(stem("luces"), "luz")
+        self.assertEqual(terms("Camión Eléctrico"), terms("camion electrico"))
+
+    def test_search_matches_accents_and_plurals(self):
+        self.make_product("Camión de juguete")
+        self.make_product("Teléfono móvil")
+        self.assertEqual(self.search_names("camiones"), ["Camión de juguete"])
+        self.assertEqual(self.search_names("TELEFONO"), ["Teléfono móvil"])
+
+    def test_name_matches_rank_above_description_matches(self):
+        self.make_product("Funda", description="Compatible con cualquier teléfono")
+        self.make_product("Teléfono inteligente")
+        self.assertEqual(
+            self.search_names("telefono"), ["Teléfono inteligente", "Funda"]
+        )
+
+    def test_index_follows_updates_and_deletes(self):
+        product = self.make_product("Lámpara")
+        product.name = "Bombillo"
+        product.save()
+        self.assertEqual(self.search_names("lampara"), [])
+        self.assertEqual(self.search_names("bombillo"), ["Bombillo"])
+        product.delete()
+        self.assertEqual(self.search_names("bombillo"), [])
+
+    def test_shop_search(self):
+        Shop.objects.create(owner=self.owner, name="Panadería La Estrella", location="Mérida")
+        names = self.search_names("panaderias", url="/api/v1/market/shops/")
+        self.assertEqual(names, ["Panadería La Estrella"])
+
+    def test_queries_without_words_fall_back_to_substring_matches(self):
+        self.make_product("Oferta!!!")
+        self.make_product("Oferta")
+        self.assertEqual(self.search_names("!!!"), ["Oferta!!!"])
+
+
+class NearbyShopsTestCase(MarketTestCase):
+    url = "/api/v1/market/shops/"
+
+    def make_shop(self, name, latitude, longitude, **kwargs):
+        return Shop.objects.create(
+            owner=self.owner,
+            name=name,
+            location="Caracas",
+            latitude=latitude,
+            longitude=longitude,
+            **kwargs,
+        )
+
+    def test_geohash_is_maintained_on_save(self):
+        shop = self.make_shop("Plaza", 10.4806, -66.9036)
+        self.assertEqual(shop.geohash, geo.encode(10.4806, -66.9036))
+        shop.latitude = None
+        shop.save()
+        self.assertEqual(shop.geohash, "")
+
+    def test_covering_cells_contain_the_whole_circle(self):
+        """Points on the edge of the radius always fall in a covering cell."""
+        for latitude, longitude in [(10.4806, -66.9036), (64.1, -21.9), (0.0, 179.99)]:
+            cells = geo.covering_cells(latitude, longitude, 5)
+            for bearing in range(0, 360, 15):
+                dlat = 4.99 / geo.KM_PER_DEGREE * math.cos(math.radians(bearing))
+                dlng = (
+                    4.99
+                    / (geo.KM_PER_DEGREE * math.cos(math.radians(latitude)))
+                    * math.sin(math.radians(bearing))
+                )
+                point = geo.encode(latitude + dlat, (longitude + dlng + 180) % 360 - 180)
+                self.assertTrue(any(point.startswith(cell) for cell in cells))
+
+    def test_near_filters_by_radius_and_orders_by_distance(self):
+        self.make_shop("Lejos", 10.60, -66.90)  # ~13 km north
+        self.make_shop("Cerca", 10.49, -66.90)  # ~1 km
+        self.make_shop("Medio", 10.52, -66.90)  # ~4.5 km
+        self.make_shop("Online", 10.48, -66.90, is_physical=False)
+        response = self.client.get(
+            self.url, {"near": "10.48,-66.90", "radius_km": 10, "ordering": "distance"}
+        )
+        self.assertEqual(response.status_code, 200)
+        results = response.data["results"]
+        self.assertEqual([row["name"] for row in results], ["Cerca", "Medio"])
+        self.assertAlmostEqual(results[0]["distance_km"], 1.112, places=2)
+
+    def test_invalid_near_is_rejected(self):
+        for params in [{"near": "abc"}, {"near": "95,0"}, {"near": "1,1", "radius_km": 0}]:
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, 400)
+
+
+class QueryBudgetTestCase(MarketTestCase):
+    """
+    Every read endpoint has a fixed query budget that must not grow with
+    the page size. Add new endpoints to ``budgets`` as they are created.
+    """
+
+    # Conditional-GET endpoints pay one extra version-stamp query.
+    budgets = {
+        "/api/v1/market/shops/": 3,  # count, shops + owners, products + categories
+        "/api/v1/market/shops/{shop}/": 3,
+        "/api/v1/market/products/": 2,  # count, products + shops + categories
+        "/api/v1/market/products/?shop_id={shop}": 3,
+        "/api/v1/market/products/{product}/": 1,
+        "/api/v1/market/categories/": 3,
+    }
+
+    def populate(self, shops, products_per_shop):
+        for i in range(shops):
+            shop = Shop.objects.create(
+                owner=User.objects.create_user(username=f"seller{shops}-{i}"),
+                name=f"Tienda {i}",
+                location="Valencia",
+            )
+            for j in range(products_per_shop):
+                self.make_product(f"Producto {j}", shop=shop)
+            Category.objects.create(name=f"Categoría {shops}-{i}")
+
+    def count_queries(self, url):
+        product = self.shop.products.first() or self.make_product("Muestra")
+        url = url.format(shop=self.shop.pk, product=product.pk)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return len(queries)
+
+    def test_query_budget_is_constant(self):
+        for size in (2, 8):
+            self.populate(shops=size, products_per_shop=3)
+            for i in range(size):
+                self.make_product(f"Extra {size}-{i}")
+            for url, budget in self.budgets.items():
+                with self.subTest(url=url, size=size):
+                    self.assertLessEqual(self.count_queries(url), budget)
+
+    def test_authenticated_shop_list_budget(self):
+        self.populate(shops=5, products_per_shop=2)
+        self.client.force_authenticate(self.owner)
+        self.assertLessEqual(self.count_queries("/api/v1/market/shops/"), 3)
+
+
+class KeysetPaginationTestCase(MarketTestCase):
+    url = "/api/v1/market/products/"
+
+    def scroll(self, params):
+        """Follow ``next`` links to the end; returns ids and queries per page."""
+        ids, queries = [], []
+        response = self.client.get(self.url, {"cursor": "", **params})
+        while True:
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn("count", response.data)
+            ids += [row["id"] for row in response.data["results"]]
+            if not response.data["next"]:
+                return ids, queries
+            with CaptureQueriesContext(connection) as captured:
+                response = self.client.get(response.data["next"])
+            queries.append(len(captured))
+
+    def test_scroll_visits_every_row_once_despite_ties(self):
+        products = [self.make_product(f"P{i}", price=Decimal(i % 3)) for i in range(45)]
+        # Identical timestamps force the pk tie-breaker to do its job.
+        Product.objects.update(created_at=products[0].created_at)
+        for ordering in ("-created_at", "created_at", "price", "-price", "name"):
+            with self.subTest(ordering=ordering):
+                ids, queries = self.scroll({"ordering": ordering})
+                expected = list(
+                    Product.objects.order_by(
+                        ordering, "-pk" if ordering.startswith("-") else "pk"
+                    ).values_list("pk", flat=True)
+                )
+                self.assertEqual(ids, expected)
+                self.assertEqual(set(queries), {1})
+
+    def test_rows_inserted_while_scrolling_are_not_duplicated(self):
+        for i in range(25):
+            self.make_product(f"P{i}")
+        first = self.client.get(self.url, {"cursor": ""}).data
+        self.make_product("Nuevo")
+        second = self.client.get(first["next"]).data
+        ids = [row["id"] for row in first["results"] + second["results"]]
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(len(ids), 25)
+
+    def test_page_number_mode_is_unchanged(self):
+        self.make_product("P")
+        response = self.client.get(self.url)
+        self.assertEqual(response.data["count"], 1)
+
+    def test_invalid_cursor_and_ordering(self):
+        self.assertEqual(self.client.get(self.url, {"cursor": "nope"}).status_code, 404)
+        self.assertEqual(self.client.get(self.url, {"ordering": "stock"}).status_code, 400)
+        response = self.client.get(self.url, {"cursor": "", "search": "p"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_tampered_cursor_values_are_rejected(self):
+        self.make_product("P")
+        for ordering, value in [
+            ("price", "cheap"),
+            ("price", [1]),
+            ("-created_at", {"a": 1}),
+            ("-created_at", "yesterday"),
+        ]:
+            with self.subTest(ordering=ordering, value=value):
+                payload = json.dumps({"o": ordering, "v": value, "pk": 1})
+                cursor = base64.urlsafe_b64encode(payload.encode()).decode()
+                response = self.client.get(self.url, {"ordering": ordering, "cursor": cursor})
+                self.assertEqual(response.status_code, 404)
+
+
+class SparseFieldsetTestCase(MarketTestCase):
+    def setUp(self):
+        self.enterContext(throttling_disabled())
+        for i in range(3):
+            self.make_product(f"Cargador {i}", description="Carga rápida " * 20)
+
+    def get(self, path, params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path, params)
+        self.assertEqual(response.status_code, 200)
+        return response.data, [query["sql"] for query in queries]
+
+    def test_fields_limit_payload_and_columns(self):
+        data, sql = self.get("/api/v1/market/products/", {"fields": "id,name,price"})
+        self.assertEqual([set(row) for row in data["results"]], [{"id", "name", "price"}] * 3)
+        select = sql[-1].split(" FROM ")[0]
+        self.assertIn('"shops_product"."price"', select)
+        for column in ("description", "image_variants", "shops_shop", "shops_category"):
+            self.assertNotIn(column, select)
+
+        # Keyset cursors still read the (deferred-by-default) sort key.
+        data, sql = self.get(
+            "/api/v1/market/products/", {"fields": "name", "cursor": ""}
+        )
+        self.assertEqual(len(sql), 1)
+        self.assertEqual([set(row) for row in data["results"]], [{"name"}] * 3)
+
+    def test_expansion_is_opt_in(self):
+        path = f"/api/v1/market/shops/{self.shop.pk}/"
+        data, sql = self.get(path, {})
+        self.assertNotIn("products", data)
+        self.assertEqual(len(sql), 2)  # stamp + shop with owner
+
+        data, sql = self.get(path, {"expand": "products", "fields": "name,products"})
+        self.assertEqual(len(data["products"]), 3)
+        self.assertEqual(data["products"][0]["shop_name"], "Tienda Central")
+        self.assertEqual(len(sql), 3)
+
+        data, _ = self.get(
+            "/api/v1/market/products/", {"expand": "category", "fields": "name,category"}
+        )
+        self.assertEqual(data["results"][0]["category"], {"id": self.category.pk, "name": "Electrónica"})
+
+    def test_unknown_names_and_profile(self):
+        for params in ({"fields": "name,secret"}, {"expand": "owner"}):
+            response = self.client.get("/api/v1/market/products/", params)
+            self.assertEqual(response.status_code, 400)
+        self.client.force_authenticate(self.owner)
+        response = self.client.get("/api/v1/auth/profile/", {"fields": "username"})
+        self.assertEqual(response.data, {"username": "owner"})
+
+
+class ConditionalGetTestCase(MarketTestCase):
+    def revalidate(self, url, etag):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        return response, len(queries)
+
+    def test_categories_revalidate_without_serializing(self):
+        url = "/api/v1/market/categories/"
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("public", response["Cache-Control"])
+        self.assertIn("Last-Modified", response)
+
+        not_modified, queries = self.revalidate(url, response["ETag"])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(queries, 1)
+
+        Category.objects.create(name="Deportes")
+        changed, _ = self.revalidate(url, response["ETag"])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed["ETag"], response["ETag"])
+
+    def test_shop_detail_and_product_list_follow_the_shop_stamp(self):
+        urls = [
+            f"/api/v1/market/shops/{self.shop.pk}/",
+            f"/api/v1/market/products/?shop_id={self.shop.pk}",
+        ]
+        etags = [self.client.get(url)["ETag"] for url in urls]
+        for url, etag in zip(urls, etags):
+            self.assertEqual(self.revalidate(url, etag)[0].status_code, 304)
+
+        Shop.objects.filter(pk=self.shop.pk).update(updated_at=self.shop.created_at)
+        self.make_product("Nuevo")
+        for url, etag in zip(urls, etags):
+            self.assertEqual(self.revalidate(url, etag)[0].status_code, 200)
+
+    def test_authenticated_responses_are_private(self):
+        self.client.force_authenticate(self.owner)
+        response = self.client.get(f"/api/v1/market/shops/{self.shop.pk}/")
+        self.assertIn("private", response["Cache-Control"])
+
+
+class FacetsTestCase(MarketTestCase):
+    url = "/api/v1/market/products/"
+
+    def setUp(self):
+        cache.clear()
+        self.enterContext(throttling_disabled())
+        other = Category.objects.create(name="Hogar")
+        self.make_product("Cable", price=Decimal("5.00"), stock=3)
+        self.make_product("Cargador", price=Decimal("12.50"))
+        self.make_product("Lámpara", price=Decimal("2000.00"), category=other, stock=1)
+        self.make_product("Silla", price=Decimal("40.00"), category=None, is_infinite_stock=True)
+
+    def get(self, params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.data, len(queries)
+
+    def test_all_facets_in_one_query(self):
+        _, plain_queries = self.get({"search": "cargador"})
+        data, queries = self.get({"facets": ""})
+        self.assertEqual(queries, plain_queries + 1)
+        self.assertEqual((data["count"], len(data["results"])), (4, 4))
+        facets = data["facets"]
+        self.assertEqual(
+            [(row["name"], row["count"]) for row in facets["category"]],
+            [("Electrónica", 2), ("Hogar", 1), (None, 1)],
+        )
+        self.assertEqual(
+            [(row["min"], row["max"], row["count"]) for row in facets["price"] if row["count"]],
+            [(0, 10, 1), (10, 25, 1), (25, 50, 1), (1000, None, 1)],
+        )
+        self.assertEqual(facets["in_stock"], 3)
+
+    def test_facets_follow_the_filters_and_unsearched_lists_are_cached(self):
+        data, _ = self.get({"facets": "in_stock", "search": "cargador"})
+        self.assertEqual(data["facets"], {"in_stock": 0})
+        self.get({"facets": "category,in_stock"})
+        _, queries = self.get({"facets": "in_stock,category"})
+        _, plain_queries = self.get({})
+        self.assertEqual(queries, plain_queries)
+        self.assertNotIn("facets", self.client.get(self.url).data)
+
+    def test_unknown_facet(self):
+        response = self.client.get(self.url, {"facets": "price,color"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("color", response.data["facets"])
+
+
+@override_settings(ASYNC_VIEWS=True)
+class AsyncReadTestCase(MarketTestCase):
+    """The async read path answers exactly like the DRF views it replaces."""
+
+    def setUp(self):
+        self.enterContext(throttling_disabled())
+        for i, price in enumerate(("5.00", "12.50", "3.20")):
+            self.make_product(f"Cargador {i}", price=Decimal(price))
+        self.shop.latitude, self.shop.longitude = 10.48, -66.90
+        self.shop.is_physical = True
+        self.shop.status = "active"
+        self.shop.save()
+        self.draft = Shop.objects.create(owner=self.owner, name="Borrador", location="Coro")
+        self.auth = {"Authorization": f"Bearer {AccessToken.for_user(self.owner)}"}
+
+    def async_get(self, path, params=None, headers=None):
+        match = resolve(path)
+        view = match.func.cls.as_view(match.func.actions, **match.func.initkwargs)
+        self.assertTrue(iscoroutinefunction(view))
+        request = AsyncRequestFactory().get(path, params or {}, headers=headers)
+        return async_to_sync(view)(request, *match.args, **match.kwargs)
+
+    def test_same_responses_as_sync_views(self):
+        product = self.shop.products.first()
+        market = "/api/v1/market"
+        cases = [
+            (f"{market}/products/", {}),
+            (f"{market}/products/", {"ordering": "price"}),
+            (f"{market}/products/", {"ordering": "bogus"}),
+            (f"{market}/products/", {"page": 9}),
+            (f"{market}/products/", {"cursor": ""}),
+            (f"{market}/products/", {"search": "cargador"}),
+            (f"{market}/products/", {"shop_id": self.shop.pk}),
+            (f"{market}/products/", {"facets": "", "search": "cargador"}),
+            (f"{market}/products/", {"facets": "bogus"}),
+            (f"{market}/products/{product.pk}/", {}),
+            (f"{market}/products/abc/", {}),
+            (f"{market}/shops/", {}),
+            (f"{market}/shops/", {"near": "10.48,-66.90", "ordering": "distance"}),
+            (f"{market}/shops/{self.shop.pk}/", {}),
+            (f"{market}/shops/{self.draft.pk}/", {}),
+            (f"{market}/categories/", {}),
+        ]
+        for path, params in cases:
+            for headers in ({}, self.auth):
+                with self.subTest(path=path, params=params, auth=bool(headers)):
+                    expected = self.client.get(path, params, headers=headers)
+                    response = self.async_get(path, params, headers=headers)
+                    self.assertEqual(response.status_code, expected.status_code)
+                    self.assertEqual(json.loads(response.content), expected.json())
+                    for header in ("ETag", "Cache-Control"):
+                        self.assertEqual(response.get(header), expected.get(header))
+
+    def test_not_modified_and_writes(self):
+        path = f"/api/v1/market/shops/{self.shop.pk}/"
+        etag = self.async_get(path)["ETag"]
+        response = self.async_get(path, headers={"If-None-Match": etag})
+        self.assertEqual((response.status_code, response.content), (304, b""))
+
+        # Other methods on an async route still reach the sync view.
+        match = resolve("/api/v1/market/shops/")
+        view = match.func.cls.as_view(match.func.actions, **match.func.initkwargs)
+        request = AsyncRequestFactory().post(
+            "/api/v1/market/shops/",
+            {"name": "Nueva", "location": "Coro"},
+            content_type="application/json",
+            headers=self.auth,
+        )
+        self.assertEqual(async_to_sync(view)(request).status_code, 201)
+
+
+@override_settings(ASYNC_VIEWS=True)
+class FastListTestCase(MarketTestCase):
+    """``api.fastpath`` list pages are byte-for-byte the serializers' pages."""
+
+    def setUp(self):
+        self.enterContext(throttling_disabled())
+        self.owner.avatar = "avatars/owner.png"
+        self.owner.save()
+        self.shop.latitude, self.shop.longitude = 10.48, -66.90
+        self.shop.image = "shops/central.jpg"
+        self.shop.save()
+        variants = {
+            "source": "products/mesa.png",
+            "sizes": {
+                "thumb": {
+                    "width": 200,
+                    "height": 113,
+                    "webp": "products/variants/mesa-thumb.webp",
+                    "jpg": "products/variants/mesa-thumb.jpg",
+                }
+            },
+        }
+        self.make_product(
+            "Mesa de café ☕", description="Línea\u2028nueva", price=Decimal("1234.5"),
+            image="products/mesa.png", image_variants=variants, stock=3,
+        )
+        self.make_product("Cargador sin categoría", category=None, price=Decimal("0.1"))
+        self.make_product("Cargador infinito", is_infinite_stock=True, price=Decimal("99"))
+        other = Shop.objects.create(
+            owner=User.objects.create_user(username="otra"), name="Otra", location="Coro",
+            latitude=10.5, longitude=-66.91, is_physical=True,
+        )
+        self.make_product("Cargador lejano", shop=other)
+        self.auth = {"Authorization": f"Bearer {AccessToken.for_user(self.owner)}"}
+
+    def async_get(self, path, params, headers):
+        match = resolve(path)
+        view = match.func.cls.as_view(match.func.actions, **match.func.initkwargs)
+        request = AsyncRequestFactory().get(path, params, headers=headers)
+        return async_to_sync(view)(request, *match.args, **match.kwargs)
+
+    def test_same_bytes_as_serializers(self):
+        market = "/api/v1/market"
+        cases = [
+            (f"{market}/products/", {}),
+            (f"{market}/products/", {"ordering": "-price"}),
+            (f"{market}/products/", {"ordering": "price", "cursor": ""}),
+            (f"{market}/products/", {"search": "cargador"}),
+            (f"{market}/products/", {"shop_id": self.shop.pk, "facets": ""}),
+            (f"{market}/products/", {"fields": "name,price,image,category_name"}),
+            (f"{market}/products/", {"expand": "category"}),
+            (f"{market}/products/", {"expand": "category", "fields": "id,category"}),
+            (f"{market}/shops/", {}),
+            (f"{market}/shops/", {"ordering": "name", "cursor": ""}),
+            (f"{market}/shops/", {"near": "10.48,-66.90", "ordering": "distance"}),
+            (f"{market}/shops/", {"fields": "name,owner_avatar,distance_km"}),
+            (f"{market}/shops/", {"expand": "products"}),
+        ]
+        for path, params in cases:
+            for headers in ({}, self.auth):
+                with self.subTest(path=path, params=params, auth=bool(headers)):
+                    with override_settings(FAST_LIST_SERIALIZATION=False):
+                        expected = self.client.get(path, params, headers=headers)
+                    self.assertEqual(expected.status_code, 200)
+                    for response in (
+                        self.client.get(path, params, headers=headers),
+                        self.async_get(path, params, headers),
+                    ):
+                        self.assertEqual(response.content, expected.content)
+                        self.assertEqual(response.get("ETag"), expected.get("ETag"))
+
+    def test_cursor_pages_follow_on(self):
+        url = "/api/v1/market/products/"
+        names = []
+        params = {"cursor": "", "ordering": "price"}
+        self.enterContext(mock.patch.object(MarketPagination, "page_size", 1))
+        while True:
+            data = self.client.get(url, params).json()
+            names.extend(row["name"] for row in data["results"])
+            if data["next"] is None:
+                break
+            params["cursor"] = data["next"].split("cursor=")[1].split("&")[0]
+        self.assertEqual(names[0], "Cargador sin categoría")
+        self.assertEqual(names[-2:], ["Cargador infinito", "Mesa de café ☕"])
+        self.assertEqual(len(names), 4)
+
+    def test_plans(self):
+        encode = self.enterContext(
+            mock.patch.object(RowPlan, "encode", autospec=True, side_effect=RowPlan.encode)
+        )
+        self.client.get("/api/v1/market/products/", {"expand": "category"})
+        self.client.get("/api/v1/market/shops/", {"expand": "products"})
+        self.assertEqual(encode.call_count, 1)
+
+        plan = compile_plan(ProductSerializer())
+        self.assertIs(compile_plan(ProductSerializer()), plan)
+        self.assertIn("shop__name", plan.columns)
+        self.assertIsNotNone(compile_plan(ShopSerializer()))
+        shop = ShopSerializer()
+        shop.fields["products"] = ProductSerializer(many=True, read_only=True)
+        self.assertIsNone(compile_plan(shop))  # nested lists keep the regular path
+
+        # Uncategorized products have no category_name, as with the serializer.
+        data = self.client.get("/api/v1/market/products/", {"search": "sin"}).json()
+        self.assertNotIn("category_name", data["results"][0])
+        self.assertIsNone(data["results"][0]["category"])
+
+
+class ImageVariantsTestCase(MarketTestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        overrides = override_settings(MEDIA_ROOT=self.media_root, BACKGROUND_TASKS_EAGER=True)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def upload(self, size=(1600, 900), mode="RGBA"):
+        buffer = io.BytesIO()
+        Image.new(mode, size, (200, 30, 30, 128)).save(buffer, "PNG")
+        return SimpleUploadedFile("foto.png", buffer.getvalue(), content_type="image/png")
+
+    def test_derivatives_are_generated_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            product = self.make_product("Mesa", image=self.upload())
+        product.refresh_from_db()
+        self.assertEqual(product.image_variants["source"], product.image.name)
+
+        data = self.client.get(f"/api/v1/market/products/{product.pk}/").data
+        variants = data["image_variants"]
+        self.assertEqual(set(variants), {"thumb", "medium", "large"})
+        self.assertEqual((variants["thumb"]["width"], variants["thumb"]["height"]), (200, 113))
+        self.assertTrue(variants["thumb"]["webp"].startswith("http://testserver/media/"))
+        with product.image.storage.open(product.image_variants["sizes"]["large"]["jpg"]) as f:
+            self.assertEqual(Image.open(f).size, (1200, 675))
+
+    def test_small_images_are_not_upscaled_and_clearing_removes_files(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            product = self.make_product("Taza", image=self.upload(size=(150, 100), mode="RGB"))
+        product.refresh_from_db()
+        sizes = product.image_variants["sizes"]
+        self.assertEqual(sizes["large"]["width"], 150)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product.image = None
+            product.save()
+        product.refresh_from_db()
+        self.assertEqual(product.image_variants, {})
+        self.assertFalse(product.image.storage.exists(sizes["thumb"]["webp"]))
+
+
+class ProductImportTestCase(MarketTestCase):
+    def url(self, shop=None):
+        return f"/api/v1/market/shops/{(shop or self.shop).pk}/import/"
+
+    def upload(self, name, content):
+        self.client.force_authenticate(self.owner)
+        return self.client.post(
+            self.url(),
+            {"file": SimpleUploadedFile(name, content.encode())},
+            format="multipart",
+        )
+
+    def test_csv_import_creates_updates_and_reports_errors(self):
+        existing = self.make_product("Cable USB", price=Decimal("3.00"))
+        csv_data = (
+            "name,description,price,stock,category\n"
+            "Cable USB,,4.50,,\n"  # updates by name; empty cells keep values
+            "Cargador,Rápido,12.00,5,electrónica\n"
+            "Audífonos,,abc,1,\n"
+            "Mouse,,9.99,2,Inexistente\n"
+        )
+        response = self.upload("productos.csv", csv_data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            (response.data["created"], response.data["updated"], response.data["failed"]),
+            (1, 1, 2),
+        )
+        self.assertEqual([e["row"] for e in response.data["errors"]], [4, 5])
+        self.assertIn("price", response.data["errors"][0]["errors"])
+        self.assertIn("category", response.data["errors"][1]["errors"])
+
+        existing.refresh_from_db()
+        self.assertEqual(existing.price, Decimal("4.50"))
+        charger = Product.objects.get(name="Cargador")
+        self.assertEqual((charger.stock, charger.category), (5, self.category))
+        # Bulk writes still reach the search index.
+        response = self.client.get("/api/v1/market/products/", {"search": "cargadores"})
+        self.assertEqual([row["name"] for row in response.data["results"]], ["Cargador"])
+
+    def test_jsonl_import_in_small_batches(self):
+        lines = [f'{{"name": "Item {i}", "price": "{i}.00"}}' for i in range(1, 8)]
+        lines.insert(3, "{not json")
+        report = import_products(
+            self.shop, io.BytesIO("\n".join(lines).encode()), "items.jsonl", batch_size=3
+        )
+        self.assertEqual((report["created"], report["failed"]), (7, 1))
+        self.assertEqual(report["errors"][0]["row"], 4)
+        self.assertEqual(self.shop.products.count(), 7)
+
+    def test_only_the_owner_can_import(self):
+        other = User.objects.create_user(username="other")
+        self.client.force_authenticate(other)
+        response = self.client.post(
+            self.url(), {"file": SimpleUploadedFile("a.csv", b"name,price\nX,1\n")}
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_unsupported_format(self):
+        response = self.upload("productos.xlsx", "x")
+        self.assertEqual(response.status_code, 400)
+
+    def test_unreadable_files_are_reported_not_raised(self):
+        # A cp1252 export from a spreadsheet: the rows before it are kept.
+        self.client.force_authenticate(self.owner)
+        content = "name,price\nCable,1.00\nCamión,2.00\nMouse,3.00\n".encode("cp1252")
+        response = self.client.post(
+            self.url(), {"file": SimpleUploadedFile("a.csv", content)}, format="multipart"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data["created"], response.data["failed"]), (1, 1))
+        self.assertEqual(response.data["errors"][0]["row"], 3)
+        self.assertIn("UTF-8", response.data["errors"][0]["errors"]["non_field_errors"][0])
+
+        # An unterminated quote runs into the csv module's field size limit.
+        content = b'name,price\nX,1\n"Y,2\n' + b"z" * 200000
+        report = import_products(self.shop, io.BytesIO(content), "a.csv")
+        self.assertEqual((report["failed"], report["errors"][0]["row"]), (1, 3))
+
+        # JSONL lines are independent, so only the bad line fails.
+        content = (
+            '{"name": "Audífonos", "price": "1"}\n'.encode()
+            + '{"name": "Lápiz", "price": "2"}\n'.encode("cp1252")
+        )
+        report = import_products(self.shop, io.BytesIO(content), "a.jsonl")
+        self.assertEqual((report["created"], report["failed"]), (1, 1))
+        self.assertEqual(report["errors"][0]["row"], 2)
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True)
+class ShopResetTestCase(MarketTestCase):
+    def url(self, suffix=""):
+        return f"/api/v1/market/shops/{self.shop.pk}/reset/{suffix}"
+
+    def test_reset_deletes_products_in_chunks(self):
+        for i in range(5):
+            self.make_product(f"Cargador {i}")
+        self.client.force_authenticate(self.owner)
+        self.assertEqual(self.client.post(self.url()).status_code, 400)
+
+        with mock.patch("shops.reset.CHUNK_SIZE", 2), self.captureOnCommitCallbacks(
+            execute=True
+        ):
+            response = self.client.post(self.url(), {"confirm": True}, format="json")
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data["total"], 5)
+        self.assertTrue(response.data["status_url"].endswith(self.url("status/")))
+
+        self.shop.refresh_from_db()
+        self.assertEqual((self.shop.status, self.shop.location), ("draft", "Tienda en línea"))
+        self.assertFalse(self.shop.products.exists())
+        status = self.client.get(self.url("status/")).data
+        self.assertEqual((status["status"], status["deleted"]), ("done", 5))
+        # Raw deletes still leave the search index clean.
+        response = self.client.get("/api/v1/market/products/", {"search": "cargador"})
+        self.assertEqual(response.data["results"], [])
+
+    def test_lost_jobs_resume_and_keep_newer_products(self):
+        for i in range(3):
+            self.make_product(f"Cargador {i}")
+        # The job is scheduled on commit, which never comes: a lost job.
+        job = start_reset(self.shop, self.owner)
+        newer = self.make_product("Cable nuevo")
+
+        out = io.StringIO()
+        call_command("resume_shop_resets", stale_minutes=0, chunk_size=2, stdout=out)
+        self.assertIn("Resumed 1 shop resets", out.getvalue())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.deleted), ("done", 3))
+        self.assertEqual(list(self.shop.products.all()), [newer])
+        self.assertEqual(Shop.objects.get(pk=self.shop.pk).product_count, 1)
+
+        call_command("resume_shop_resets", stale_minutes=0, stdout=out)
+        self.assertIn("Resumed 0 shop resets", out.getvalue())
+
+    def test_only_the_owner_sees_reset_status(self):
+        other = User.objects.create_user(username="other")
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(self.url("status/")).status_code, 403)
+        self.client.force_authenticate(self.owner)
+        self.assertEqual(self.client.get(self.url("status/")).status_code, 404)
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True)
+class ShopCountersTestCase(MarketTestCase):
+    def counters(self, shop=None):
+        shop = Shop.objects.get(pk=(shop or self.shop).pk)
+        stored = {field: getattr(shop, field) for field in Shop.COUNTER_FIELDS}
+        self.assertEqual(stored, counters.actual([shop.pk])[shop.pk])
+        return stored
+
+    def test_product_writes_keep_counters_exact(self):
+        self.assertEqual(self.counters()["product_count"], 0)
+        cheap = self.make_product("Cable", price=Decimal("2.50"))
+        self.make_product("Cargador", price=Decimal("30.00"), stock=4)
+        self.make_product("Servicio", price=Decimal("99.90"), is_infinite_stock=True)
+        self.assertEqual(
+            self.counters(),
+            {
+                "product_count": 3,
+                "in_stock_count": 2,
+                "min_price": Decimal("2.50"),
+                "max_price": Decimal("99.90"),
+            },
+        )
+
+        # Raising the cheapest price recomputes the minimum.
+        cheap.price, cheap.stock = Decimal("40.00"), 1
+        cheap.save(update_fields=["price", "stock"])
+        self.assertEqual(self.counters()["min_price"], Decimal("30.00"))
+        self.assertEqual(self.counters()["in_stock_count"], 3)
+
+        # Instances loaded without the counted columns look the old row up.
+        deferred = Product.objects.only("name").get(pk=cheap.pk)
+        stock.adjust_stock(deferred, -1)
+        self.assertEqual(self.counters()["in_stock_count"], 2)
+
+        other = Shop.objects.create(owner=self.owner, name="Otra", location="Coro")
+        moved = Product.objects.get(pk=cheap.pk)
+        moved.shop = other
+        moved.save()
+        self.assertEqual(self.counters(other)["product_count"], 1)
+        self.assertEqual(self.counters()["min_price"], Decimal("30.00"))
+
+        Product.objects.filter(name="Servicio").delete()
+        self.assertEqual(self.counters()["max_price"], Decimal("30.00"))
+        self.assertEqual(self.counters()["product_count"], 1)
+
+    def test_writes_after_a_reservation_count_the_stored_row(self):
+        lamp = self.make_product("Lámpara", stock=1)
+        stale = Product.objects.get(pk=lamp.pk)
+        stock.reserve(self.owner, [(lamp.pk, 1)])  # sells the lamp out meanwhile
+        self.assertEqual(self.counters()["in_stock_count"], 0)
+        stale.name = "Lámpara LED"
+        stale.save(update_fields=["name"])
+        self.assertEqual(self.counters()["in_stock_count"], 0)
+        stale.price = Decimal("12.00")
+        stale.save()
+        self.counters()
+
+    def test_stale_shop_saves_and_api(self):
+        stale = Shop.objects.get(pk=self.shop.pk)
+        self.make_product("Cable")
+        stale.description = "Nueva descripción"
+        stale.save()
+        self.assertEqual(self.counters()["product_count"], 1)
+
+        self.client.force_authenticate(self.owner)
+        response = self.client.post(
+            "/api/v1/market/products/",
+            {"shop": self.shop.pk, "name": "Lámpara", "price": "15.00", "stock": 2},
+        )
+        self.assertEqual(response.status_code, 201)
+        self.client.delete(f"/api/v1/market/products/{response.data['id']}/")
+        data = self.client.get(f"/api/v1/market/shops/{self.shop.pk}/").data
+        self.assertEqual(
+            (data["product_count"], data["in_stock_count"], data["min_price"]),
+            (1, 0, "10.00"),
+        )
+
+    def test_bulk_paths_and_repair(self):
+        import_products(
+            self.shop,
+            io.BytesIO(b"name,price,stock\nCable,3.00,1\nFoco,7.50,0\n"),
+            "products.csv",
+        )
+        import_products(self.shop, io.BytesIO(b"name,price\nCable,12.00\n"), "products.csv")
+        self.assertEqual(
+            self.counters(),
+            {
+                "product_count": 2,
+                "in_stock_count": 1,
+                "min_price": Decimal("7.50"),
+                "max_price": Decimal("12.00"),
+            },
+        )
+
+        Product.objects.filter(shop=self.shop).update(stock=0)  # bypasses the counters
+        out = io.StringIO()
+        call_command("repair_shop_counters", dry_run=True, stdout=out)
+        self.assertIn("found 1 with drift", out.getvalue())
+        call_command("repair_shop_counters", stdout=io.StringIO())
+        self.assertEqual(self.counters()["in_stock_count"], 0)
+
+        with mock.patch("shops.reset.CHUNK_SIZE", 1), self.captureOnCommitCallbacks(
+            execute=True
+        ):
+            start_reset(self.shop, self.owner)
+        self.assertEqual(
+            self.counters(),
+            {"product_count": 0, "in_stock_count": 0, "min_price": None, "max_price": None},
+        )
+
+
+class StockReservationTestCase(MarketTestCase):
+    url = "/api/v1/market/reservations/"
+
+    def setUp(self):
+        self.enterContext(throttling_disabled())
+        self.buyer = User.objects.create_user(username="buyer")
+        self.client.force_authenticate(self.buyer)
+        self.lamp = self.make_product("Lámpara", stock=3)
+        self.cable = self.make_product("Cable", stock=10)
+        self.service = self.make_product("Instalación", is_infinite_stock=True)
+
+    def reserve(self, *items):
+        return self.client.post(
+            self.url,
+            {"items": [{"product": p.pk, "quantity": q} for p, q in items]},
+            format="json",
+        )
+
+    def stock(self, product):
+        product.refresh_from_db()
+        return product.stock
+
+    def test_reserve_commit_release(self):
+        response = self.reserve((self.lamp, 2), (self.service, 5), (self.lamp, 1))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["status"], "held")
+        self.assertEqual(
+            [(item["product"], item["quantity"]) for item in response.data["items"]],
+            sorted([(self.lamp.pk, 3), (self.service.pk, 5)]),
+        )
+        self.assertEqual(self.stock(self.lamp), 0)
+        self.assertEqual(self.stock(self.service), 0)  # unlimited: never decremented
+        self.shop.refresh_from_db()
+        self.assertEqual(self.shop.in_stock_count, 2)  # the lamp sold out
+
+        held = response.data["id"]
+        response = self.client.post(f"{self.url}{held}/release/")
+        self.assertEqual((response.status_code, response.data["status"]), (200, "released"))
+        self.assertEqual(self.stock(self.lamp), 3)
+        self.shop.refresh_from_db()
+        self.assertEqual(self.shop.in_stock_count, 3)
+        # Closed reservations cannot be released (or committed) again.
+        self.assertEqual(self.client.post(f"{self.url}{held}/release/").status_code, 409)
+        self.assertEqual(self.client.post(f"{self.url}{held}/commit/").status_code, 409)
+
+        held = self.reserve((self.cable, 4)).data["id"]
+        response = self.client.post(f"{self.url}{held}/commit/")
+        self.assertEqual((response.status_code, response.data["status"]), (200, "committed"))
+        self.assertEqual(self.stock(self.cable), 6)
+
+        # Other users cannot see or touch the reservation.
+        self.client.force_authenticate(self.owner)
+        self.assertEqual(self.client.post(f"{self.url}{held}/release/").status_code, 404)
+
+    def test_all_or_nothing_and_errors(self):
+        response = self.reserve((self.cable, 5), (self.lamp, 4))
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data["products"], [self.lamp.pk])
+        self.assertEqual((self.stock(self.cable), self.stock(self.lamp)), (10, 3))
+        self.assertFalse(StockReservation.objects.exists())
+
+        self.assertEqual(self.reserve((self.lamp, 0)).status_code, 400)
+        self.assertEqual(self.client.post(self.url, {"items": []}, format="json").status_code, 400)
+        response = self.client.post(
+            self.url, {"items": [{"product": 999999, "quantity": 1}]}, format="json"
+        )
+        self.assertEqual((response.status_code, response.data["products"]), (400, [999999]))
+        for product in (2**63, 0):
+            response = self.client.post(
+                self.url, {"items": [{"product": product, "quantity": 1}]}, format="json"
+            )
+            self.assertEqual(response.status_code, 400)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.reserve((self.lamp, 1)).status_code, 401)
+
+    def test_expired_holds_are_reclaimed(self):
+        stale = stock.reserve(self.owner, [(self.lamp.pk, 3)], ttl=-1)
+        # The lamp looks sold out, but the expired hold is released on demand.
+        response = self.reserve((self.lamp, 2))
+        self.assertEqual(response.status_code, 201)
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, "expired")
+        self.assertEqual(self.stock(self.lamp), 1)
+        with self.assertRaises(stock.ReservationClosed):
+            stock.commit(stale, self.owner)
+
+        stock.reserve(self.owner, [(self.cable.pk, 10)], ttl=-1)
+        out = io.StringIO()
+        call_command("release_expired_reservations", stdout=out)
+        self.assertIn("Expired 1 reservations", out.getvalue())
+        self.assertEqual(self.stock(self.cable), 10)
+
+    @override_settings(BACKGROUND_TASKS_EAGER=True)
+    def test_reset_deletes_reserved_products(self):
+        self.reserve((self.lamp, 1))
+        with self.captureOnCommitCallbacks(execute=True):
+            start_reset(self.shop, self.owner)
+        self.assertFalse(self.shop.products.exists())
+        self.assertFalse(StockReservationItem.objects.exists())
+
+
+    def test_product_edits_keep_stock_reserved_since_they_loaded(self):
+        stale = Product.objects.get(pk=self.lamp.pk)
+        stock.reserve(self.buyer, [(self.lamp.pk, 2)])
+        stale.name = "Lámpara LED"
+        stale.save()
+        self.assertEqual(Product.objects.get(pk=self.lamp.pk).stock, 1)
+
+        stale = Product.objects.get(pk=self.lamp.pk)
+        stock.reserve(self.buyer, [(self.lamp.pk, 1)])
+        serializer = ProductSerializer(stale, data={"stock": 5}, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()  # the owner added four units to the one they saw
+        self.assertEqual((stale.stock, Product.objects.get(pk=self.lamp.pk).stock), (4, 4))
+        shop = Shop.objects.get(pk=self.shop.pk)
+        actual = counters.actual([shop.pk])[shop.pk]
+        self.assertEqual(shop.in_stock_count, actual["in_stock_count"])
+
+class StockStressTestCase(TransactionTestCase):
+    args = ["--workers=8", "--requests=60", "--stock=20", "--products=2", "--quantity=2"]
+
+    def run_in_subprocess(self):
+        """Against a throwaway database file, for the in-memory SQLite test database."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        env = {**os.environ, "DATABASE_URL": f"sqlite:///{directory}/stress.sqlite3"}
+        env.setdefault("SECRET_KEY", "stress")
+        manage = [sys.executable, str(settings.BASE_DIR / "manage.py")]
+        subprocess.run([*manage, "migrate", "-v0"], env=env, check=True)
+        return subprocess.run(
+            [*manage, "stress_stock", *self.args],
+            env=env,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+
+    def test_concurrent_reservations_never_oversell(self):
+        if connection.vendor == "sqlite" and connection.is_in_memory_db():
+            # Shared-cache in-memory SQLite fails concurrent writers at once
+            # ("database table is locked") instead of waiting for the lock.
+            output = self.run_in_subprocess()
+        else:
+            out = io.StringIO()
+            call_command("stress_stock", *self.args, stdout=out)
+            output = out.getvalue()
+        self.assertIn("held 20, short 40", output)
+        self.assertIn("No oversell", output)
+
+
+class CatalogExportTestCase(MarketTestCase):
+    url = "/api/v1/market/products/export/"
+
+    def setUp(self):
+        self.enterContext(throttling_disabled())
+        self.draft = Shop.objects.create(
+            owner=self.owner, name="Borrador", location="Caracas", status="draft"
+        )
+        self.make_product("Café, molido", description='Tostado "oscuro"', price=Decimal("7.50"))
+        self.make_product("Oculto", shop=self.draft)
+
+    def read(self, response):
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content).decode()
+
+    def test_ndjson_matches_the_api_representation(self):
+        lines = self.read(self.client.get(self.url)).splitlines()
+        self.assertEqual(len(lines), 1)
+        row = json.loads(lines[0])
+        api = self.client.get(f"/api/v1/market/products/{row['id']}/").data
+        for key in ("name", "description", "price", "shop_name", "category_name", "created_at"):
+            self.assertEqual(row[key], api[key])
+
+    def test_csv_export_for_one_shop(self):
+        response = self.client.get(self.url, {"output": "csv", "shop_id": self.draft.pk})
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        rows = list(csv.DictReader(io.StringIO(self.read(response))))
+        self.assertEqual([row["name"] for row in rows], ["Oculto"])
+
+    def test_unknown_output_is_rejected(self):
+        self.assertEqual(self.client.get(self.url, {"output": "xml"}).status_code, 400)
+
+
+class DatasetAndBenchmarkTestCase(MarketTestCase):
+    def generate(self, **options):
+        call_command(
+            "generate_dataset", users=5, shops=8, products=60, stdout=io.StringIO(), **options
+        )
+        return list(
+            Product.objects.filter(shop__owner__username__startswith="demo_")
+            .order_by("pk")
+            .values_list("shop__name", "name", "price")
+        )
+
+    def test_generation_is_deterministic(self):
+        first = self.generate(seed=7)
+        self.assertEqual(len(first), 60)
+        self.assertEqual(self.generate(seed=7, flush=True), first)
+        self.assertNotEqual(self.generate(seed=8, flush=True), first)
+
+    def test_benchmark_writes_comparable_results(self):
+        self.generate()
+        output = os.path.join(tempfile.mkdtemp(), "bench.json")
+        self.addCleanup(shutil.rmtree, os.path.dirname(output))
+        call_command("benchmark_api", iterations=2, warmup=0, output=output, stdout=io.StringIO())
+        with open(output) as fileobj:
+            report = json.load(fileobj)
+        self.assertEqual(report["meta"]["dataset"]["products"], 60)
+        for name, result in report["results"].items():
+            self.assertEqual(result["status"], 200, name)
+            self.assertGreater(result["bytes_per_response"], 0)
+        self.assertEqual(report["results"]["product_detail"]["queries_per_request"], 1)
+
+    def test_serializer_benchmark_checks_parity(self):
+        self.generate()
+        out = io.StringIO()
+        call_command("benchmark_serializers", rows=50, iterations=1, stdout=out)
+        self.assertIn("rows/s", out.getvalue())
+
+
+@override_settings(AUTOCOMPLETE_SYNC_INTERVAL=0)
+class AutocompleteTestCase(MarketTestCase):
+    url = "/api/v1/market/autocomplete/"
+
+    def setUp(self):
+        cache.clear()
+        autocomplete.index.invalidate()
+        self.enterContext(throttling_disabled())
+        Shop.objects.filter(pk=self.shop.pk).update(status="active")
+        self.draft = Shop.objects.create(
+            owner=self.owner, name="Cámaras Ocultas", location="Coro", status="draft"
+        )
+        self.make_product("Cargador USB-C")
+        self.make_product("Cámara Réflex")
+        self.make_product("Camisa", shop=self.draft)
+
+    def suggest(self, query, **params):
+        response = self.client.get(self.url, {"q": query, **params})
+        self.assertEqual(response.status_code, 200)
+        return {kind: [row["name"] for row in rows] for kind, rows in response.data.items()}
+
+    def test_prefixes_are_folded_and_match_later_words(self):
+        self.assertEqual(
+            self.suggest("cám"),
+            {"products": ["Cámara Réflex"], "shops": [], "categories": []},
+        )
+        self.assertEqual(self.suggest("usb")["products"], ["Cargador USB-C"])
+        self.assertEqual(self.suggest("ELEC")["categories"], ["Electrónica"])
+        self.assertEqual(self.suggest("tienda c")["shops"], ["Tienda Central"])
+        self.assertEqual(self.suggest("ca", limit=1)["products"], ["Cámara Réflex"])
+        self.assertEqual(self.suggest(" ")["products"], [])
+        self.assertEqual(self.client.get(self.url, {"limit": 99}).status_code, 400)
+
+        with self.assertNumQueries(0):
+            self.suggest("car")
+
+    def test_changes_reach_this_and_other_processes(self):
+        self.suggest("c")
+        other = autocomplete.Autocomplete()
+        other.build()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product = self.make_product("Cable HDMI")
+            self.draft.status = "active"
+            self.draft.save()
+        # This process applied the change when it committed.
+        with self.assertNumQueries(0):
+            self.assertIn("Cable HDMI", self.suggest("cab")["products"])
+
+        # Another process replays the shared change log on its next lookup.
+        with self.assertNumQueries(2):
+            result = other.suggest("ca", 10)
+        self.assertIn("Camisa", [row["name"] for row in result["products"]])
+        self.assertIn("Cámaras Ocultas", [row["name"] for row in result["shops"]])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product.delete()
+        self.assertNotIn("Cable HDMI", self.suggest("cab")["products"])
+        self.assertNotIn("Cable HDMI", [row["name"] for row in other.suggest("cab", 5)["products"]])
+
+    @override_settings(AUTOCOMPLETE_SYNC_INTERVAL=0)
+    def test_bulk_changes_never_rebuild_in_a_lookup(self):
+        other = autocomplete.Autocomplete()
+        other.build()
+        products = Product.objects.bulk_create(
+            [Product(shop=self.shop, name=f"Cable {i}", price=1) for i in range(5)]
+        )
+        with mock.patch.object(autocomplete, "MAX_REPLAY", 2):
+            with self.captureOnCommitCallbacks(execute=True):
+                autocomplete.changed(Product, [p.pk for p in products])
+            # Logged in slices and replayed a slice per lookup.
+            found = [len(other.suggest("cable", 10)["products"]) for _ in range(3)]
+        self.assertEqual(found, [2, 4, 5])
+
+        # Far behind: the old index answers while a rebuild is scheduled once.
+        cache.incr(autocomplete.SEQ_KEY, autocomplete.MAX_LAG + 1)
+        with mock.patch.object(autocomplete, "submit") as submit, self.assertNumQueries(0):
+            self.assertEqual(len(other.suggest("cable", 10)["products"]), 5)
+            other.suggest("cable", 10)
+        submit.assert_called_once_with(other.rebuild)
+        other.rebuild()
+        self.assertEqual((other.seq, other.building), (cache.get(autocomplete.SEQ_KEY), False))
@@ -1,12 +1,20 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ShopViewSet, ProductViewSet, CategoryViewSet
+from .views import (
+    AutocompleteView,
+    CategoryViewSet,
+    ProductViewSet,
+    ShopViewSet,
+    StockReservationViewSet,
+)
 
 router = DefaultRouter()
 router.register(r"shops", ShopViewSet)
 router.register(r"products", ProductViewSet)
 router.register(r"categories", CategoryViewSet)
+router.register(r"reservations", StockReservationViewSet, basename="reservation")
 
 urlpatterns = [
+    path("autocomplete/", AutocompleteView.as_view(), name="autocomplete"),
     path("", include(router.urls)),
 ]
@@ -1,9 +1,33 @@
-from rest_framework import viewsets, permissions, status
+from rest_framework import mixins, viewsets, permissions, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
+from rest_framework.views import APIView
+from django.core.exceptions import FieldDoesNotExist
 from django.db import models
-from .models import Shop, Product, Category
-from .serializers import ShopSerializer, ProductSerializer, CategorySerializer
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from api import fieldsets
+from api.fastpath import FastListMixin
+from api.uploads import DirectUploadMixin
+
+from . import autocomplete, geo, search, stock
+from .async_views import AsyncReadMixin
+from .caching import ConditionalGetMixin
+from .facets import FacetMixin
+from .exporters import FORMATS as EXPORT_FORMATS, export_products
+from .importers import ProductImportError, import_products
+from .models import Shop, Product, Category, StockReservation
+from .pagination import MarketPagination
+from .reset import start_reset
+from .serializers import (
+    ShopSerializer,
+    ProductSerializer,
+    CategorySerializer,
+    ShopResetJobSerializer,
+    StockReservationSerializer,
+)
 
 
 class IsOwnerOrReadOnly(permissions.BasePermission):
@@ -14,10 +38,61 @@ class IsOwnerOrReadOnly(permissions.BasePermission):
         return owner == request.user
 
 
-class ShopViewSet(viewsets.ModelViewSet):
+class OrderingMixin:
+    """
+    Applies ``?ordering=<key>`` / ``?ordering=-<key>`` with the primary key as
+    tie-breaker, so pages are stable and keyset pagination can seek on them.
+    Without the parameter, relevance/distance orderings already applied by the
+    filters are kept, otherwise ``default_ordering`` is used.
+    """
+
+    ordering_fields = {"created_at": "created_at"}
+    default_ordering = "-created_at"
+
+    def order_queryset(self, queryset):
+        ordering = self.request.query_params.get("ordering")
+        if not ordering:
+            if queryset.query.order_by:
+                return queryset
+            ordering = self.default_ordering
+
+        descending = ordering.startswith("-")
+        field = self.ordering_fields.get(ordering.lstrip("-"))
+        if field is None:
+            raise ValidationError(
+                {"ordering": f"Supported values: {', '.join(self.ordering_fields)}."}
+            )
+        if field not in queryset.query.annotations:
+            try:
+                queryset.model._meta.get_field(field)
+            except FieldDoesNotExist:
+                raise ValidationError(
+                    {"ordering": f"'{ordering}' is not available for this query."}
+                )
+        prefix = "-" if descending else ""
+        return queryset.order_by(f"{prefix}{field}", f"{prefix}pk")
+
+
+class ShopViewSet(
+    ConditionalGetMixin,
+    FastListMixin,
+    AsyncReadMixin,
+    OrderingMixin,
+    DirectUploadMixin,
+    viewsets.ModelViewSet,
+):
     queryset = Shop.objects.all()
     serializer_class = ShopSerializer
+    read_throttle_scope = "catalog"
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
+    pagination_class = MarketPagination
+    ordering_fields = {
+        "created_at": "created_at",
+        "name": "name",
+        "distance": "distance_km",  # requires ?near=
+    }
+    default_radius_km = 10
+    max_radius_km = 200
 
     def perform_create(self, serializer):
         serializer.save(owner=self.request.user)
@@ -33,19 +108,47 @@ class ShopViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Delete all products
-        shop.products.all().delete()
-        # Reset shop fields
-        shop.description = ""
-        shop.location = "Tienda en línea"
-        shop.latitude = None
-        shop.longitude = None
-        shop.is_physical = False
-        shop.image = None
-        shop.status = "draft"
-        shop.save()
+        # The shop fields are reset now; its products are deleted in chunks
+        # by a background job whose progress is at reset/status/.
+        job = start_reset(shop, request.user)
+        data = ShopResetJobSerializer(job).data
+        # Relative to .../reset/, so it keeps the API version prefix.
+        data["status_url"] = request.build_absolute_uri("status/")
+        return Response(data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=True, methods=["get"], url_path="reset/status")
+    def reset_status(self, request, pk=None):
+        """Progress of the shop's most recent reset job."""
+        shop = self.get_object()
+        if shop.owner_id != request.user.pk:
+            raise PermissionDenied()
+        job = shop.reset_jobs.order_by("-created_at", "-pk").first()
+        if job is None:
+            raise NotFound("This shop has never been reset.")
+        return Response(ShopResetJobSerializer(job).data)
 
-        return Response({"status": "shop reset successful"}, status=status.HTTP_200_OK)
+    @action(
+        detail=True,
+        methods=["post"],
+        url_path="import",
+        parser_classes=[MultiPartParser],
+    )
+    def import_file(self, request, pk=None):
+        """Bulk create/update products from a CSV or JSONL upload (``file``)."""
+        shop = self.get_object()
+        upload = request.FILES.get("file")
+        if upload is None:
+            return Response(
+                {"error": "Upload the products as a 'file' field (CSV or JSONL)."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            report = import_products(
+                shop, upload.file, upload.name, request.data.get("format")
+            )
+        except ProductImportError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report, status=status.HTTP_200_OK)
 
     def get_queryset(self):
         user = self.request.user
@@ -72,42 +175,243 @@ class ShopViewSet(viewsets.ModelViewSet):
         if status_param:
             queryset = queryset.filter(status=status_param)
 
-        search = self.request.query_params.get("search")
-        if search:
-            queryset = queryset.filter(
-                models.Q(name__icontains=search)
-                | models.Q(description__icontains=search)
+        query = self.request.query_params.get("search")
+        if query:
+            queryset = search.search(queryset, query)
+
+        # Geospatial filter: ?near=lat,lng&radius_km=5[&ordering=distance]
+        near = self.request.query_params.get("near")
+        if near:
+            latitude, longitude, radius_km = self.parse_near(near)
+            queryset = geo.near(queryset, latitude, longitude, radius_km)
+
+        # Joins, columns and the products prefetch (?expand=products) follow
+        # the requested fields. The reverse prefetch also fills product.shop.
+        return fieldsets.select_fields(self.order_queryset(queryset), self.get_serializer())
+
+    def get_version_stamp(self, request, *args, **kwargs):
+        if self.action != "retrieve":
+            return None
+        try:
+            updated_at = (
+                self.get_queryset()
+                .prefetch_related(None)
+                .filter(pk=kwargs["pk"])
+                .values_list("updated_at", flat=True)
+                .first()
             )
+        except (ValueError, TypeError):
+            return None
+        if updated_at is None:
+            return None
+        return f"shop:{kwargs['pk']}:{updated_at.isoformat()}", updated_at
 
-        return queryset
+    def parse_near(self, near):
+        try:
+            latitude, longitude = (float(value) for value in near.split(","))
+            radius_km = float(
+                self.request.query_params.get("radius_km", self.default_radius_km)
+            )
+        except ValueError:
+            raise ValidationError(
+                {"near": "Expected ?near=<lat>,<lng> and a numeric radius_km."}
+            )
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise ValidationError({"near": "Coordinates out of range."})
+        if not 0 < radius_km <= self.max_radius_km:
+            raise ValidationError(
+                {"radius_km": f"Must be between 0 and {self.max_radius_km} km."}
+            )
+        return latitude, longitude, radius_km
 
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(
+    ConditionalGetMixin,
+    FacetMixin,
+    FastListMixin,
+    AsyncReadMixin,
+    OrderingMixin,
+    DirectUploadMixin,
+    viewsets.ModelViewSet,
+):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
+    read_throttle_scope = "catalog"
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
+    pagination_class = MarketPagination
+    ordering_fields = {"created_at": "created_at", "price": "price", "name": "name"}
 
     def get_queryset(self):
         queryset = Product.objects.all()
         shop_id = self.request.query_params.get("shop_id")
-        search = self.request.query_params.get("search")
+        query = self.request.query_params.get("search")
 
         if shop_id:
             queryset = queryset.filter(shop_id=shop_id)
 
-        if search:
+        if not shop_id:
+            # A correlated EXISTS rather than a join, so the page can be read
+            # off the ordering's index and stop at the page size instead of
+            # sorting every active product (see manage.py explain_queries).
             queryset = queryset.filter(
-                models.Q(name__icontains=search)
-                | models.Q(description__icontains=search)
+                models.Exists(
+                    Shop.objects.filter(pk=models.OuterRef("shop_id"), status="active")
+                )
             )
 
-        if not shop_id:
-            queryset = queryset.filter(shop__status="active")
+        if query:
+            queryset = search.search(queryset, query)
+
+        return fieldsets.select_fields(self.order_queryset(queryset), self.get_serializer())
+
+    def get_facets_cache_key(self, request, names):
+        # Only the whole catalog or one shop's list; searches vary too much.
+        if request.query_params.get("search"):
+            return None
+        shop_id = request.query_params.get("shop_id") or "all"
+        if shop_id != "all" and not shop_id.isdigit():
+            return None
+        return f"facets:products:{shop_id}:{','.join(names)}"
 
-        return queryset
+    # A full-catalog stream costs far more than a page: its own, low rate.
+    @action(detail=False, methods=["get"], read_throttle_scope="export")
+    def export(self, request):
+        """
+        Stream every active product (or every product of ``?shop_id=``) as
+        NDJSON (default) or CSV (``?output=csv``).
+        """
+        fmt = request.query_params.get("output", "ndjson")
+        if fmt not in EXPORT_FORMATS:
+            return Response(
+                {"error": f"Unsupported output. Use one of: {', '.join(EXPORT_FORMATS)}."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        shop_id = request.query_params.get("shop_id")
+        if shop_id and not shop_id.isdigit():
+            return Response(
+                {"error": "shop_id must be an integer."}, status=status.HTTP_400_BAD_REQUEST
+            )
+        response = StreamingHttpResponse(
+            export_products(fmt, shop_id), content_type=EXPORT_FORMATS[fmt]
+        )
+        filename = f"products-{shop_id or 'all'}-{timezone.now():%Y%m%d}.{fmt}"
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
+    def get_version_stamp(self, request, *args, **kwargs):
+        # Per-shop product lists are versioned by the shop's stamp
+        shop_id = request.query_params.get("shop_id")
+        if self.action != "list" or not shop_id:
+            return None
+        try:
+            updated_at = (
+                Shop.objects.filter(pk=shop_id).values_list("updated_at", flat=True).first()
+            )
+        except (ValueError, TypeError):
+            return None
+        if updated_at is None:
+            return None
+        return f"shop:{shop_id}:{updated_at.isoformat()}", updated_at
 
 
-class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
+class CategoryViewSet(ConditionalGetMixin, AsyncReadMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
+    read_throttle_scope = "catalog"
     permission_classes = [permissions.AllowAny]
+    cache_max_age = 3600
+
+    def get_version_stamp(self, request, *args, **kwargs):
+        # Per-table stamp: the count catches deletes, the max catches the rest.
+        stamp = Category.objects.aggregate(
+            count=models.Count("id"), updated_at=models.Max("updated_at")
+        )
+        if stamp["updated_at"] is None:
+            return None
+        return (
+            f"categories:{stamp['count']}:{stamp['updated_at'].isoformat()}",
+            stamp["updated_at"],
+        )
+
+
+class AutocompleteView(APIView):
+    """
+    Typeahead suggestions for ``?q=<prefix>``: up to ``?limit=`` product,
+    shop and category names each, from the in-process index in
+    ``shops.autocomplete`` (no database queries).
+    """
+
+    permission_classes = [permissions.AllowAny]
+    read_throttle_scope = "autocomplete"
+    default_limit = 8
+    max_limit = 20
+
+    def get(self, request):
+        try:
+            limit = int(request.query_params.get("limit", self.default_limit))
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= self.max_limit:
+            raise ValidationError({"limit": f"Must be between 1 and {self.max_limit}."})
+        return Response(autocomplete.suggest(request.query_params.get("q", ""), limit))
+
+
+class StockReservationViewSet(
+    mixins.CreateModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet
+):
+    """
+    Holds stock for a purchase: ``POST`` ``{"items": [{"product": id,
+    "quantity": n}]}`` reserves all the items or none (409 when a product
+    falls short), then ``commit/`` keeps the stock sold and ``release/``
+    gives it back. Uncommitted reservations expire after
+    ``STOCK_RESERVATION_TTL`` seconds. See ``shops.stock``.
+    """
+
+    serializer_class = StockReservationSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_scope = "reservations"
+    error_statuses = {
+        stock.UnknownProducts: status.HTTP_400_BAD_REQUEST,
+        stock.InsufficientStock: status.HTTP_409_CONFLICT,
+        stock.ReservationClosed: status.HTTP_409_CONFLICT,
+    }
+
+    def get_queryset(self):
+        return StockReservation.objects.filter(user=self.request.user).prefetch_related("items")
+
+    def error_response(self, exc):
+        body = {"error": str(exc)}
+        if exc.product_ids:
+            body["products"] = exc.product_ids
+        return Response(body, status=self.error_statuses[type(exc)])
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        items = [
+            (item["product_id"], item["quantity"])
+            for item in serializer.validated_data["items"]
+        ]
+        try:
+            reservation = stock.reserve(request.user, items)
+        except stock.StockError as exc:
+            return self.error_response(exc)
+        reservation = self.get_queryset().get(pk=reservation.pk)
+        return Response(self.get_serializer(reservation).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=["post"])
+    def commit(self, request, pk=None):
+        return self.close(stock.commit)
+
+    @action(detail=True, methods=["post"])
+    def release(self, request, pk=None):
+        return self.close(stock.release)
+
+    def close(self, operation):
+        reservation = self.get_object()
+        try:
+            operation(reservation, self.request.user)
+        except stock.StockError as exc:
+            return self.error_response(exc)
+        reservation.refresh_from_db()
+        return Response(self.get_serializer(reservation).data)
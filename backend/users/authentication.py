@@ -0,0 +1,65 @@
+"""
+JWT authentication that resolves ``request.user`` from the cache.
+
+simplejwt's ``JWTAuthentication`` loads the user row on every authenticated
+request. Here the user is cached for ``AUTH_USER_CACHE_TIMEOUT`` seconds
+under ``auth:user:<id>:<version>``. ``invalidate_user()`` bumps the version
+(so a response racing with the change cannot re-cache stale data) and drops
+the current entry; ``users.signals`` calls it whenever a user is saved or
+deleted, and again once that transaction commits, which covers profile
+edits, password changes and deactivation.
+Bulk ``QuerySet.update()`` calls skip the signals and are only picked up
+when the entry expires.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+
+def version_key(user_id):
+    return f"auth:user-version:{user_id}"
+
+
+def user_key(user_id, version):
+    return f"auth:user:{user_id}:{version}"
+
+
+def invalidate_user(user_id):
+    key = version_key(user_id)
+    version = cache.get(key, 0)
+    cache.set(key, version + 1, None)
+    cache.delete(user_key(user_id, version))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(
+                _("Token contained no recognizable user identification")
+            ) from e
+
+        version = cache.get(version_key(user_id), 0)
+        key = user_key(user_id, version)
+        user = cache.get(key)
+        if user is None:
+            # Loads the row and runs simplejwt's own checks.
+            user = super().get_user(validated_token)
+            cache.set(key, user, settings.AUTH_USER_CACHE_TIMEOUT)
+            return user
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+            api_settings.REVOKE_TOKEN_CLAIM
+        ) != get_md5_hash_password(user.password):
+            raise AuthenticationFailed(
+                _("The user's password has been changed."), code="password_changed"
+            )
+        return user
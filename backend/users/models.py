@@ -14,6 +14,8 @@ def user_avatar_path(instance, filename):
 class User(AbstractUser):
     bio = models.TextField(max_length=500, blank=True)
     avatar = models.ImageField(upload_to=user_avatar_path, null=True, blank=True)
+    # Resized WebP/JPEG derivatives, see api.images
+    avatar_variants = models.JSONField(default=dict, blank=True, editable=False)
 
     def __str__(self):
         return self.username
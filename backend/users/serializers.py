@@ -1,13 +1,26 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from api.fields import ImageVariantsField
+from api.fieldsets import SparseFieldsetMixin
 
 User = get_user_model()
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    avatar_variants = ImageVariantsField()
+
     class Meta:
         model = User
-        fields = ("id", "username", "email", "first_name", "last_name", "bio", "avatar")
+        fields = (
+            "id",
+            "username",
+            "email",
+            "first_name",
+            "last_name",
+            "bio",
+            "avatar",
+            "avatar_variants",
+        )
 
 
 class RegisterSerializer(serializers.ModelSerializer):
@@ -0,0 +1,25 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from api.images import sync_variants
+
+from .authentication import invalidate_user
+from .models import User
+
+
+@receiver(post_save, sender=User)
+def update_avatar_variants(sender, instance, raw=False, **kwargs):
+    if not raw:
+        sync_variants(instance, field="avatar", target="avatar_variants")
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    # Profile edits, password changes and deactivation all end in a save.
+    # Until the transaction commits other requests still read the old row and
+    # may cache it again, so the version is bumped once more afterwards.
+    pk = instance.pk
+    invalidate_user(pk)
+    transaction.on_commit(lambda: invalidate_user(pk))
@@ -1 +1,65 @@
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .authentication import user_key, version_key
+
+User = get_user_model()
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class CachedAuthenticationTestCase(APITestCase):
+    url = "/api/v1/auth/profile/"
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="ana", password="pass1234")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+
+    def get_profile(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        return response, len(queries)
+
+    def test_repeated_requests_skip_the_user_query(self):
+        response, queries = self.get_profile()
+        self.assertEqual((response.status_code, queries), (200, 1))
+        response, queries = self.get_profile()
+        self.assertEqual((response.status_code, queries), (200, 0))
+        self.assertEqual(response.data["username"], "ana")
+
+    def test_profile_update_invalidates(self):
+        self.get_profile()
+        response = self.client.patch(self.url, {"bio": "Hola"}, format="json")
+        self.assertEqual(response.status_code, 200)
+        response, queries = self.get_profile()
+        self.assertEqual((response.data["bio"], queries), ("Hola", 1))
+
+    def test_password_change_invalidates(self):
+        self.get_profile()
+        self.user.set_password("otra-clave")
+        self.user.save()
+        response, queries = self.get_profile()
+        self.assertEqual((response.status_code, queries), (200, 1))
+
+    def test_deactivation_rejects_cached_user(self):
+        self.get_profile()
+        self.user.is_active = False
+        self.user.save(update_fields=["is_active"])
+        response, _ = self.get_profile()
+        self.assertEqual(response.status_code, 401)
+
+    def test_rows_cached_before_the_commit_are_invalidated(self):
+        self.get_profile()
+        stale = User.objects.get(pk=self.user.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save(update_fields=["is_active"])
+            # A concurrent request still sees the committed row and caches it.
+            version = cache.get(version_key(self.user.pk), 0)
+            cache.set(user_key(self.user.pk, version), stale)
+        response, _ = self.get_profile()
+        self.assertEqual(response.status_code, 401)
@@ -1,13 +1,18 @@
 from django.urls import path
-from rest_framework_simplejwt.views import (
-    TokenObtainPairView,
-    TokenRefreshView,
+from rest_framework_simplejwt.views import TokenRefreshView
+from .views import (
+    AvatarConfirmView,
+    AvatarUploadView,
+    LoginView,
+    ProfileView,
+    RegisterView,
 )
-from .views import RegisterView, ProfileView
 
 urlpatterns = [
     path("register/", RegisterView.as_view(), name="auth_register"),
-    path("login/", TokenObtainPairView.as_view(), name="token_obtain_pair"),
+    path("login/", LoginView.as_view(), name="token_obtain_pair"),
     path("token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
     path("profile/", ProfileView.as_view(), name="user_profile"),
+    path("profile/avatar/upload/", AvatarUploadView.as_view(), name="avatar_upload"),
+    path("profile/avatar/confirm/", AvatarConfirmView.as_view(), name="avatar_confirm"),
 ]
@@ -1,6 +1,12 @@
-from rest_framework import generics, permissions
-from .serializers import UserSerializer, RegisterSerializer
 from django.contrib.auth import get_user_model
+from rest_framework import generics, permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework_simplejwt.views import TokenObtainPairView
+
+from api import uploads
+
+from .serializers import RegisterSerializer, UserSerializer
 
 User = get_user_model()
 
@@ -11,9 +17,41 @@ class RegisterView(generics.CreateAPIView):
     serializer_class = RegisterSerializer
 
 
+class LoginView(TokenObtainPairView):
+    throttle_scope = "login"
+
+
 class ProfileView(generics.RetrieveUpdateAPIView):
     serializer_class = UserSerializer
     permission_classes = (permissions.IsAuthenticated,)
 
     def get_object(self):
-        return self.request.user
+        if self.request.method in permissions.SAFE_METHODS:
+            return self.request.user
+        # request.user may come from the auth cache; never save a stale copy.
+        return User.objects.get(pk=self.request.user.pk)
+
+
+class AvatarUploadView(APIView):
+    """Presigned PUT URL for uploading a new avatar straight to storage (api.uploads)."""
+
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def post(self, request):
+        try:
+            data = uploads.presign(request.user, "avatar", request.data.get("filename"))
+        except uploads.UploadError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(data, status=status.HTTP_201_CREATED)
+
+
+class AvatarConfirmView(APIView):
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def post(self, request):
+        user = User.objects.get(pk=request.user.pk)
+        try:
+            uploads.confirm(user, "avatar", request.data.get("upload"))
+        except uploads.UploadError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(UserSerializer(user, context={"request": request}).data)
@@ -163,7 +163,9 @@ export default function EditProductModal({
       data.append("name", formData.name);
       data.append("description", formData.description);
       data.append("price", formData.price || "0");
-      data.append("stock", formData.stock || "0");
+      // Only an edited stock is sent, so units sold since the form opened stay sold.
+      if ((formData.stock || "0") !== product.stock.toString())
+        data.append("stock", formData.stock || "0");
       data.append("is_infinite_stock", isInfinite ? "1" : "0");
       if (formData.category) data.append("category", formData.category);
       if (imageToUpload)
@@ -27,6 +27,6 @@ export interface Shop {
   location: string;
   description: string;
   image: string | null;
-  products: Product[];
+  products?: Product[];
   created_at: string;
 }